@@ -1,15 +1,49 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import subprocess
 import json
 import time
+import hashlib
 import os
 import sys
+import threading
 import traceback
 
+# Make the LitReviewAI modules importable when running from the backend directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from modules.worker import submit_review
+from modules.review_cache import ReviewCache, make_review_key
+from modules.progress import ProgressJobs, FINAL_EVENTS
+from modules.result_store import ResultStore
+
+DEFAULT_MAX_PAPERS = int(os.getenv('MAX_PAPERS', 1))
+# Largest maxPapers a client may request, so one search can't tie up the worker pool
+MAX_PAPERS_LIMIT = int(os.getenv('MAX_PAPERS_LIMIT', 50))
+
+# Seconds between keep-alive comments on idle event streams
+SSE_KEEPALIVE_SECONDS = 15
+
+# Completed reviews, shared by identical concurrent and repeat requests
+review_cache = ReviewCache()
+
+# Progress events of running and recently finished search jobs
+progress_jobs = ProgressJobs()
+
+# Completed reviews indexed for filtering, keyed by result ID
+result_store = ResultStore()
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+def parse_max_papers(data):
+    """Read maxPapers from a request body, capped at MAX_PAPERS_LIMIT; raises ValueError unless it is a positive integer."""
+    try:
+        max_papers = int(data.get('maxPapers', DEFAULT_MAX_PAPERS))
+    except (TypeError, ValueError):
+        raise ValueError("maxPapers must be an integer")
+    if max_papers < 1:
+        raise ValueError("maxPapers must be at least 1")
+    return min(max_papers, MAX_PAPERS_LIMIT)
+
 @app.route('/api/search', methods=['POST'])
 def search():
     # Get search query from request
@@ -19,109 +53,32 @@ def search():
     if not query.strip():
         return jsonify({"error": "Please provide a search query"}), 400
     
+    try:
+        max_papers = parse_max_papers(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     # Track execution time
     start_time = time.time()
     
     try:
         # Print debugging information
         print(f"Received search query: {query}")
-        print(f"Current working directory: {os.getcwd()}")
-        
-        # First, check if litreview.py exists
-        script_path = 'litreview.py'
-        if not os.path.exists(script_path):
-            script_path = '../litreview.py'
-            if not os.path.exists(script_path):
-                raise FileNotFoundError(f"Could not find litreview.py in current or parent directory")
-        
-        print(f"Using script at: {script_path}")
         
-        # Safe query formatting
-        safe_query = query.replace('"', '\\"')
-        cmd = f'python3 {script_path} search --topic "{safe_query}"'
-        
-        print(f"Executing command: {cmd}")
-        
-        # Run the script
-        result = subprocess.run(
-            cmd, 
-            shell=True, 
-            capture_output=True, 
-            text=True
+        # Run the review on a warm worker, reusing any identical in-flight or cached review
+        cache_key = make_review_key(query, max_papers=max_papers)
+        review, source = review_cache.get_or_run(
+            cache_key, lambda: submit_review(query, max_papers=max_papers)
         )
-        
-        # Check if there was an error
-        if result.returncode != 0:
-            print(f"Script returned error code: {result.returncode}")
-            print(f"STDERR: {result.stderr}")
-            return jsonify({
-                "error": f"Script execution failed: {result.stderr}",
-                "query": query,
-                "queryTime": round(time.time() - start_time, 1),
-                "totalResults": 0,
-                "results": []
-            }), 500
+        print(f"Review served from: {source}")
         
         # Calculate execution time
         execution_time = round(time.time() - start_time, 1)
+        print(f"Review finished with {len(review['papers'])} relevant papers")
         
-        # Print the output for debugging
-        print(f"Script output: {result.stdout[:200]}...")  # Print first 200 chars
-        final_report = result.split("printing_final_report")[-1]
-        # Parse the output to JSON
-        try:
-            final_report = results.split("<final_report>")[1].split("</final_report>")[0]
-            papers = results.split("<papers>")[1].split("</papers>")
-            results = {
-                "final_report": final_report,
-                "papers": papers
-            } 
-            print(f"Successfully parsed JSON with {len(results.get('results', []))} results")
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {str(e)}")
-            print(f"Raw output: {result.stdout}")
-            # If not JSON, wrap the text output in a basic structure
-            results = {
-                "results": [
-                    {
-                        "id": 1,
-                        "title": "Search Results",
-                        "abstract": result.stdout,
-                        "authors": "System",
-                        "journal": "Terminal Output",
-                        "year": 2023,
-                        "relevanceScore": 100,
-                        "keyFindings": ["Output from script"],
-                        "methodology": "Command line execution",
-                        "prismaElements": []
-                    }
-                ]
-            }
-        
-        # Build formatted query for display
-        formatted_query = f'(("{query}"))'
-        
-        # Create response
-        response = {
-            "query": query,
-            "formattedQuery": formatted_query,
-            "queryTime": execution_time,
-            "totalResults": len(results),
-            "results": results
-        }
-        
-        return jsonify(response)
+        result_id = store_result(cache_key, review, source)
+        return jsonify(build_search_response(query, review, execution_time, source, result_id))
     
-    except subprocess.CalledProcessError as e:
-        print(f"Subprocess error: {str(e)}")
-        print(f"STDERR: {e.stderr}")
-        return jsonify({
-            "error": f"Script execution failed: {e.stderr}",
-            "query": query,
-            "queryTime": round(time.time() - start_time, 1),
-            "totalResults": 0,
-            "results": []
-        }), 500
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         print(traceback.format_exc())
@@ -133,66 +90,182 @@ def search():
             "results": []
         }), 500
 
-@app.route('/api/filters', methods=['POST'])
-def apply_filters():
-    # Get filter parameters
+def store_result(cache_key, review, source):
+    """Index a review for /api/filters and return its result ID; a freshly computed review replaces the stored one."""
+    result_id = hashlib.sha256(cache_key.encode("utf-8")).hexdigest()[:16]
+    if source == "computed" or result_store.get(result_id) is None:
+        result_store.put(result_id, review)
+    return result_id
+
+def build_search_response(query, review, execution_time, source, result_id=None):
+    """Build the /api/search response body for a completed review."""
+    results = {
+        "final_report": review["final_report"],
+        "papers": review["papers"]
+    }
+    
+    # Build formatted query for display
+    formatted_query = f'(("{query}"))'
+    
+    return {
+        "query": query,
+        "formattedQuery": formatted_query,
+        "queryTime": execution_time,
+        "totalResults": len(results["papers"]),
+        "results": results,
+        "cached": source != "computed",
+        "resultId": result_id
+    }
+
+@app.route('/api/search/jobs', methods=['POST'])
+def start_search_job():
+    """Start a search in the background and return the job whose progress can be streamed."""
     data = request.json
     query = data.get('query', '')
     
-    # This endpoint would normally apply filters to existing results
-    # For now, we'll just pass the filters to the search script if possible
+    if not query.strip():
+        return jsonify({"error": "Please provide a search query"}), 400
     
     try:
-        # Construct filter options for the script
-        safe_query = query.replace('"', '\\"')
-        cmd = f'python3 litreview.py search --topic "{safe_query}"'
-        
-        # Add year filter if provided
-        if 'yearFrom' in data and 'yearTo' in data:
-            cmd += f' --year-range {data["yearFrom"]}-{data["yearTo"]}'
-        
-        # Run the command
-        result = subprocess.run(
-            cmd, 
-            shell=True, 
-            check=True,
-            capture_output=True, 
-            text=True
-        )
+        max_papers = parse_max_papers(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    cache_key = make_review_key(query, max_papers=max_papers)
+    
+    # A resubmitted search follows the job already running for it
+    job_id, log, created = progress_jobs.start(cache_key)
+    if created:
+        def run():
+            start_time = time.time()
+            log.append({"type": "stage", "stage": "queued", "time": start_time})
+            try:
+                review, source = review_cache.get_or_run(
+                    cache_key, lambda: submit_review(query, max_papers=max_papers, on_progress=log.append)
+                )
+                execution_time = round(time.time() - start_time, 1)
+                result_id = store_result(cache_key, review, source)
+                log.append({"type": "complete", "time": time.time(),
+                            **build_search_response(query, review, execution_time, source, result_id)})
+            except Exception as e:
+                print(traceback.format_exc())
+                log.append({"type": "error", "time": time.time(), "error": f"An error occurred: {str(e)}"})
         
-        # Parse results as in the search endpoint
+        threading.Thread(target=run, daemon=True).start()
+    
+    return jsonify({
+        "jobId": job_id,
+        "eventsUrl": f"/api/search/jobs/{job_id}/events",
+        "existing": not created
+    }), 202
+
+@app.route('/api/search/jobs/<job_id>/events', methods=['GET'])
+def search_job_events(job_id):
+    """
+    Stream a search job's progress as server-sent events.
+    
+    Every event has an increasing ID. A reconnecting client sends the last ID it
+    received (Last-Event-ID header, or lastEventId query parameter) and receives
+    every later event. The stream ends after the "complete" or "error" event.
+    """
+    log = progress_jobs.get(job_id)
+    if log is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+    
+    def generate():
+        after_id = last_event_id
+        yield "retry: 3000\n\n"
+        while True:
+            events = log.read(after_id, timeout=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                if log.finished:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event_id, event in events:
+                after_id = event_id
+                yield f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if event["type"] in FINAL_EVENTS:
+                    return
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route('/api/filters', methods=['POST'])
+def apply_filters():
+    """
+    Filter and paginate the papers of a completed search without re-running it.
+    
+    The search is identified by the resultId returned with its results, or by
+    the same query and maxPapers. Filters: yearFrom, yearTo, categories,
+    authors, relevant; pagination: page, pageSize.
+    """
+    data = request.json or {}
+    
+    result_id = data.get('resultId')
+    query = (data.get('query') or '').strip()
+    if not result_id and query:
         try:
-            results = json.loads(result.stdout)
-        except json.JSONDecodeError:
-            # Fallback for non-JSON output
-            results = {
-                "results": [
-                    {
-                        "id": 1,
-                        "title": "Filtered Results",
-                        "abstract": result.stdout,
-                        "authors": "System",
-                        "journal": "Terminal Output",
-                        "year": 2023,
-                        "relevanceScore": 100,
-                        "keyFindings": ["Output from script with filters"],
-                        "methodology": "Command line execution with filters",
-                        "prismaElements": []
-                    }
-                ]
-            }
-            
-        return jsonify({
-            "totalResults": len(results.get("results", [])),
-            "results": results.get("results", [])
-        })
+            max_papers = parse_max_papers(data)
+        except ValueError as e:
+            return jsonify({"error": str(e), "totalResults": 0, "results": []}), 400
+        cache_key = make_review_key(query, max_papers=max_papers)
+        result_id = hashlib.sha256(cache_key.encode("utf-8")).hexdigest()[:16]
     
-    except Exception as e:
+    indexed = result_store.get(result_id) if result_id else None
+    if indexed is None:
         return jsonify({
-            "error": f"Failed to apply filters: {str(e)}",
+            "error": "No stored results for this search; run the search again",
             "totalResults": 0,
             "results": []
-        }), 500
+        }), 404
+    
+    def as_bool(value):
+        if value is None or value == "":
+            return None
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        raise ValueError("relevant must be true or false")
+    
+    def as_list(value):
+        if value is None or value == "":
+            return None
+        return value if isinstance(value, list) else [value]
+    
+    try:
+        year_from = int(data['yearFrom']) if data.get('yearFrom') not in (None, "") else None
+        year_to = int(data['yearTo']) if data.get('yearTo') not in (None, "") else None
+        page = int(data.get('page', 1))
+        page_size = min(int(data.get('pageSize', 20)), 100)
+    except (TypeError, ValueError):
+        return jsonify({"error": "yearFrom, yearTo, page and pageSize must be integers", "totalResults": 0, "results": []}), 400
+    try:
+        relevant = as_bool(data.get('relevant'))
+    except ValueError as e:
+        return jsonify({"error": str(e), "totalResults": 0, "results": []}), 400
+    
+    start_time = time.time()
+    filtered = indexed.filter(
+        year_from=year_from,
+        year_to=year_to,
+        categories=as_list(data.get('categories')),
+        authors=as_list(data.get('authors')),
+        relevant=relevant,
+        page=page,
+        page_size=page_size
+    )
+    filtered["resultId"] = result_id
+    filtered["queryTime"] = round((time.time() - start_time) * 1000, 2)
+    return jsonify(filtered)
 
 # Create a test endpoint to verify basic Flask functionality
 @app.route('/api/test', methods=['GET'])
@@ -337,6 +337,7 @@ export default function SearchPage() {
                     onClick={() => {
                       // Collect filter values and call applyFilters
                       const filters = {
+                        query: searchQuery,
                         yearFrom: "2018",
                         yearTo: "2023",
                         // Add other filter values here
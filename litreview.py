@@ -4,19 +4,21 @@ LitReviewAI: An AI-powered tool for conducting thorough literature reviews.
 """
 
 import os
+import time
 import click
 import dotenv
 # Load environment variables
 dotenv.load_dotenv()
 
-from modules.arxiv_search import fetch_papers
-from modules.paper_processor import upload_papers
-from modules.ai_analyzer import filter_papers, client, generate_queries_gemini, get_inclusion_exclusion_criteria
-from modules.outline_generator import generate_literature_review_outline
-from modules.paper import Paper
-from modules.rag import create_index, write_lit_review_section
-from modules.generate_report import generate_full_report
-from modules.compile_report import compile_markdown_report
+from modules.pipeline import run_review, update_review, run_reviews
+from modules.rate_limit import gemini_limiter, GEMINI_REQUESTS_PER_MINUTE
+from modules.task_queue import open_task_queue, TASK_QUEUE_DB, TASK_KINDS, TASK_LEASE_SECONDS
+from modules.paper_tasks import enqueue_review, run_task_worker, finish_queued_review
+from modules.run_store import get_run_dir, RUNS_DIR
+from modules.arxiv_search import ARXIV_SOURCE
+from modules.arxiv_mirror import ingest_snapshot, ARXIV_MIRROR_DB
+from modules.tracing import record_trace
+from modules.ai_analyzer import router, relevance_classifier
 import json
 
 @click.group()
@@ -28,75 +30,176 @@ def cli():
 @click.option('--topic', required=True, help='Main research topic')
 @click.option('--max-papers', default=int(os.getenv('MAX_PAPERS', 1)), 
               help='Maximum number of papers to retrieve')
-def search(topic, max_papers):
+@click.option('--batch', is_flag=True, default=False,
+              help='Screen papers with a Gemini batch job (for large, non-interactive runs)')
+@click.option('--source', type=click.Choice(['api', 'local', 'hybrid']), default=ARXIV_SOURCE,
+              help='Search the arXiv API, the local metadata mirror, or the mirror plus fresh API results')
+@click.option('--target-relevant', type=click.IntRange(min=1), default=None,
+              help='Stop screening once this many relevant papers are found')
+@click.option('--streaming', is_flag=True, default=False,
+              help='Move each paper through download, upload, screening and indexing independently')
+@click.option('--trace', 'trace_path', type=click.Path(dir_okay=False), default=None,
+              help='Write a timeline of downloads, uploads, Gemini calls, indexing and sections '
+                   'to this file in Chrome trace format')
+def search(topic, max_papers, batch, source, target_relevant, streaming, trace_path):
     """Run a literature review with the given parameters."""
+    if streaming and (batch or target_relevant is not None):
+        raise click.UsageError("--streaming can't be combined with --batch or --target-relevant")
+    if batch and target_relevant is not None:
+        raise click.UsageError("--batch can't be combined with --target-relevant")
     click.echo(f"Starting literature review on: {topic}")
-    
-    # Step 1: Generate search query
-    click.echo("Generating optimized search query...")
-    include, exclude = get_inclusion_exclusion_criteria(topic, num_criteria=5)
-    queries = generate_queries_gemini(topic, num_queries=5)
-
-    query = " OR ".join([f"({q})" for q in queries])
-
-    click.echo(f"Search query: {query}")
-
-    # Step 2: Fetch paper metadata from arXiv
-    click.echo(f"Fetching up to {max_papers} papers from arXiv...")
-    papers = fetch_papers(query, max_results=max_papers)
-    click.echo(f"Found {len(papers)} papers matching criteria")
-    
-    # Step 3: Upload papers to Google AI
-    click.echo("Uploading papers to Google AI...")
-    papers = upload_papers(papers, client)
-    click.echo(f"Uploaded {len(papers)} papers")
-    
-    # Step 4: Analyze relevance with AI and extract relevant content
-    click.echo("Analyzing and filtering papers with Gemini...")
-    results = filter_papers(papers, topic, include, exclude)
-    click.echo("\nFiltered papers")
-    for paper in papers:
-        if paper.is_relevant:
-            print(paper.relevant_content)
-
-    # Step 5: Generate outline
-    click.echo("Generating outline...")
-    print(f"<papers>")
-    relevant_papers = []
-    for paper in papers:
-        if paper.is_relevant:
-            paper_data = {
-                "title": paper.title,
-                "authors": paper.authors,
-                "abstract": paper.abstract,
-                "year": paper.published_date.year if paper.published_date else None,
-                "url": paper.pdf_url
-            }
-            relevant_papers.append(paper_data)
-    print(json.dumps(relevant_papers, indent=2))
-    print(f"</papers>")
-    outline = generate_literature_review_outline(topic, papers)
-    print(outline)
-    click.echo("Outline generated successfully!")
 
-    # For each section, write it
-    # TODO: logic to recursively go through outline
-    index = create_index(papers)
-    # write_lit_review_section(index, query)
+    with record_trace(trace_path):
+        review = run_review(topic, max_papers=max_papers, batch=batch, source=source,
+                            target_relevant=target_relevant, streaming=streaming)
+    print_review(review)
+    router.report()
 
-    full_outline = generate_full_report(outline, index)
-    # print(full_outline)
+    click.echo("Full report generated successfully!")
 
-    print("<final_report>")
-    print(compile_markdown_report(full_outline))
-    print("</final_report>")
+    click.echo("\nLiterature review complete!")
 
+@cli.command()
+@click.option('--topic', required=True, help='Main research topic')
+@click.option('--max-papers', default=int(os.getenv('MAX_PAPERS', 1)), 
+              help='Maximum number of new papers to retrieve per refresh')
+@click.option('--runs-dir', default=RUNS_DIR, help='Directory where review runs are saved')
+@click.option('--batch', is_flag=True, default=False,
+              help='Screen papers with a Gemini batch job (for large, non-interactive runs)')
+@click.option('--interval', type=int, default=None,
+              help='Keep refreshing every INTERVAL seconds instead of exiting after one refresh')
+@click.option('--source', type=click.Choice(['api', 'local', 'hybrid']), default=ARXIV_SOURCE,
+              help='Search the arXiv API, the local metadata mirror, or the mirror plus fresh API results')
+def watch(topic, max_papers, runs_dir, batch, interval, source):
+    """Refresh a living review with papers published since its last run."""
+    run_dir = get_run_dir(topic, runs_dir)
+    click.echo(f"Refreshing literature review on: {topic} ({run_dir})")
+
+    while True:
+        review = update_review(topic, run_dir, max_papers=max_papers, batch=batch, source=source)
+        print_review(review)
+        click.echo("\nLiterature review refreshed!")
+
+        if interval is None:
+            break
+        time.sleep(interval)
 
-    click.echo("Full report generated successfully!")
+@cli.command()
+@click.argument('topics_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--max-papers', default=int(os.getenv('MAX_PAPERS', 1)), 
+              help='Maximum number of papers to retrieve for topics that do not set max_papers')
+@click.option('--runs-dir', default=RUNS_DIR, help='Directory where review runs are saved')
+@click.option('--source', type=click.Choice(['api', 'local', 'hybrid']), default=ARXIV_SOURCE,
+              help='Search the arXiv API, the local metadata mirror, or the mirror plus fresh API results')
+@click.option('--rpm', type=float, default=GEMINI_REQUESTS_PER_MINUTE,
+              help='Gemini requests per minute shared by all topics (0 for no limit)')
+def batch(topics_file, max_papers, runs_dir, source, rpm):
+    """Run reviews for every topic in a YAML file, sharing papers and API quota."""
+    topics = load_topics(topics_file, max_papers)
+    gemini_limiter.set_rate(rpm)
+    click.echo(f"Starting {len(topics)} literature reviews from {topics_file}")
+
+    reviews = run_reviews(topics, runs_dir=runs_dir, source=source)
+
+    for review in reviews:
+        if "error" in review:
+            click.echo(f"FAILED  {review['topic']}: {review['error']}")
+        else:
+            click.echo(f"OK      {review['topic']}: {len(review['papers'])} papers -> {review['run_dir']}")
+    router.report()
+
+@cli.command()
+@click.option('--topic', required=True, help='Main research topic')
+@click.option('--max-papers', default=int(os.getenv('MAX_PAPERS', 1)), 
+              help='Maximum number of papers to retrieve')
+@click.option('--runs-dir', default=RUNS_DIR, help='Directory where review runs are saved')
+@click.option('--source', type=click.Choice(['api', 'local', 'hybrid']), default=ARXIV_SOURCE,
+              help='Search the arXiv API, the local metadata mirror, or the mirror plus fresh API results')
+@click.option('--queue-db', default=TASK_QUEUE_DB,
+              help='Path of the task queue database, or a postgresql:// URL shared between hosts')
+def enqueue(topic, max_papers, runs_dir, source, queue_db):
+    """Queue a review's per-paper tasks for worker processes."""
+    run_id = enqueue_review(topic, max_papers, queue=open_task_queue(queue_db), runs_dir=runs_dir, source=source)
+    click.echo(f"Queued run {run_id}. Start workers, then run: litreview.py finish {run_id}")
 
+@cli.command()
+@click.option('--queue-db', default=TASK_QUEUE_DB,
+              help='Path of the task queue database, or a postgresql:// URL shared between hosts')
+@click.option('--kinds', default=','.join(TASK_KINDS), help='Comma-separated task kinds this worker runs')
+@click.option('--concurrency', default=1, help='Number of tasks run at the same time')
+@click.option('--lease-seconds', default=TASK_LEASE_SECONDS, help='Lease length, renewed by heartbeats')
+@click.option('--exit-when-idle', is_flag=True, default=False, help='Exit once the queue is empty')
+def worker(queue_db, kinds, concurrency, lease_seconds, exit_when_idle):
+    """Run queued per-paper tasks (download, upload, screen, extract)."""
+    kinds = [kind.strip() for kind in kinds.split(',') if kind.strip()]
+    unknown = set(kinds) - set(TASK_KINDS)
+    if unknown:
+        raise click.BadParameter(f"Unknown task kinds: {', '.join(sorted(unknown))}", param_hint='--kinds')
+    recorded = run_task_worker(open_task_queue(queue_db), kinds=kinds, concurrency=concurrency,
+                               lease_seconds=lease_seconds, exit_when_idle=exit_when_idle)
+    click.echo(f"Worker recorded {recorded} task results")
 
+@cli.command()
+@click.argument('run_id')
+@click.option('--queue-db', default=TASK_QUEUE_DB,
+              help='Path of the task queue database, or a postgresql:// URL shared between hosts')
+def finish(run_id, queue_db):
+    """Wait for a queued run's tasks, then write and save its report."""
+    review, counts = finish_queued_review(run_id, queue=open_task_queue(queue_db))
+    if counts.get("failed"):
+        click.echo(f"{counts['failed']} tasks failed after their last attempt")
+    print_review(review)
+
+def load_topics(path, max_papers):
+    """
+    Read topics from a YAML file.
+
+    The file is either a list of topics or a mapping with a "topics" list and
+    defaults such as max_papers. Each topic is a string or a mapping with a
+    "topic" and an optional "max_papers".
+    """
+    import yaml
+
+    with open(path) as f:
+        data = yaml.safe_load(f) or {}
+    if isinstance(data, list):
+        data = {"topics": data}
+    max_papers = data.get("max_papers", max_papers)
+
+    topics = []
+    for entry in data.get("topics") or []:
+        if isinstance(entry, str):
+            entry = {"topic": entry}
+        if not isinstance(entry, dict) or not entry.get("topic"):
+            raise click.BadParameter(f"Invalid topic entry: {entry!r}", param_hint="TOPICS_FILE")
+        topics.append({"topic": entry["topic"], "max_papers": int(entry.get("max_papers", max_papers))})
+    if not topics:
+        raise click.BadParameter("No topics found", param_hint="TOPICS_FILE")
+    return topics
+
+def print_review(review):
+    """Print the relevant papers and final report in the format parsed by the backend."""
+    print(f"<papers>")
+    print(json.dumps(review["papers"], indent=2))
+    print(f"</papers>")
 
-    click.echo("\nLiterature review complete!")
+    print("<final_report>")
+    print(review["final_report"])
+    print("</final_report>")
+
+@cli.command('ingest-arxiv')
+@click.argument('snapshot', type=click.Path(exists=True, dir_okay=False))
+@click.option('--db', default=ARXIV_MIRROR_DB, help='Path of the local arXiv mirror database')
+def ingest_arxiv(snapshot, db):
+    """Load an arXiv metadata snapshot (JSON lines) into the local search mirror."""
+    click.echo(f"Ingesting {snapshot} into {db}...")
+    count = ingest_snapshot(snapshot, db_path=db)
+    click.echo(f"Ingested {count} papers")
+
+@cli.command('classifier-report')
+def classifier_report():
+    """Show how well the local relevance classifier matches recorded Gemini verdicts."""
+    click.echo(json.dumps(relevance_classifier.report(), indent=2))
 
 if __name__ == '__main__':
-    cli() 
\ No newline at end of file
+    cli() 
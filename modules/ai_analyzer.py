@@ -2,9 +2,16 @@
 Module for analyzing paper relevance using Google's Gemini AI.
 """
 import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from google import genai
 import json
 from modules.paper import Paper
+from modules.pdf_text import build_screening_text
+from modules.rate_limit import RateLimitedClient, gemini_limiter
+from modules.progress import emit
+from modules.tracing import span
+from modules.model_router import ModelRouter, is_low_confidence
+from modules.relevance_classifier import RelevanceClassifier
 from typing import Dict, List, Optional, Any
 
 # Configure the Gemini API
@@ -12,7 +19,17 @@ api_key = os.getenv("GOOGLE_API_KEY")
 if not api_key:
     raise ValueError("GOOGLE_API_KEY environment variable not set. Please add it to your .env file.")
     
-client = genai.Client(api_key=api_key)
+# Every Gemini request in the process shares one rate-limit budget
+client = RateLimitedClient(genai.Client(api_key=api_key), gemini_limiter)
+
+# Picks the model for each kind of request and records per-route stats
+router = ModelRouter(client)
+
+# Learns from screening verdicts to decide confident cases without Gemini
+relevance_classifier = RelevanceClassifier()
+
+# Number of papers screened concurrently by target-driven screening
+SCREENING_WAVE_SIZE = int(os.getenv("SCREENING_WAVE_SIZE", 4))
 
 def get_inclusion_exclusion_criteria(topic, num_criteria=5):
     """
@@ -40,10 +57,7 @@ def get_inclusion_exclusion_criteria(topic, num_criteria=5):
     """
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[{"text": prompt}]
-        )
+        response = router.generate("criteria", [{"text": prompt}])
         content = response.text.strip()
 
         # Handle optional markdown formatting
@@ -88,10 +102,7 @@ def generate_queries_gemini(topic, num_queries=5):
     """
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[{"text": prompt}]
-        )
+        response = router.generate("queries", [{"text": prompt}])
         content = response.text.strip()
 
         # Clean up possible markdown formatting
@@ -109,9 +120,19 @@ def generate_queries_gemini(topic, num_queries=5):
         return []
     
 
-def analyze_paper_relevance(paper: Paper, topic: str, include_terms: List[str], exclude_terms: List[str]) -> Dict[str, Any]:
+def can_screen(paper: Paper) -> bool:
+    """
+    Check whether a paper has either local section text or an uploaded PDF to screen.
+    """
+    return bool(build_screening_text(paper)) or bool(paper.uploaded and paper.file_uri)
+
+
+def build_relevance_contents(paper: Paper, topic: str, include_terms: List[str], exclude_terms: List[str]) -> List[Dict[str, Any]]:
     """
-    Analyze the relevance of a paper using Gemini with direct PDF access.
+    Build the content parts for a relevance screening request.
+
+    Screening uses the locally extracted abstract, introduction and conclusion when
+    available, and falls back to direct PDF access otherwise.
     
     Args:
         paper (Paper): Paper object containing metadata and file URI
@@ -120,10 +141,11 @@ def analyze_paper_relevance(paper: Paper, topic: str, include_terms: List[str],
         exclude_terms (list): Terms that should be excluded
         
     Returns:
-        dict: Analysis results containing summary, relevance, and reasoning
+        list: Content parts with the paper and the screening prompt
     """
-    if not paper.uploaded or not paper.file_uri:
-        raise ValueError("Paper must be uploaded with a valid file URI")
+    screening_text = build_screening_text(paper)
+    if not screening_text and (not paper.uploaded or not paper.file_uri):
+        raise ValueError("Paper must have extracted sections or be uploaded with a valid file URI")
         
     # Format inclusion and exclusion terms
     include_str = ", ".join([f'"{term}"' for term in include_terms]) if include_terms else "none specified"
@@ -148,59 +170,163 @@ def analyze_paper_relevance(paper: Paper, topic: str, include_terms: List[str],
     Respond with a JSON object having the following fields:
     - summary: A short summary of the paper (100 words max)
     - is_relevant: "yes" or "no" indicating whether the paper is relevant
+    - confidence: A number from 0 to 1 indicating how certain you are of the relevance decision
     - reasoning: Brief explanation for your decision (50 words max)
     """
     
-    try:
-        # Create content parts with both the text prompt and the PDF file
-        contents = [
-            {"file_data": {
-                "mime_type": paper.mime_type,
-                "file_uri": paper.file_uri
-            }},
+    if screening_text:
+        # Send only the selected sections as text
+        return [
+            {"text": f"<paper>\n{screening_text}\n</paper>"},
             {"text": prompt}
         ]
+
+    # Create content parts with both the text prompt and the PDF file
+    return [
+        {"file_data": {
+            "mime_type": paper.mime_type,
+            "file_uri": paper.file_uri
+        }},
+        {"text": prompt}
+    ]
+
+
+def apply_relevance_response(paper: Paper, content: str) -> Dict[str, Any]:
+    """
+    Parse a screening response and store the verdict on the paper.
+    
+    Args:
+        paper (Paper): Paper object that was screened
+        content (str): Raw text of the model response
         
-        # Generate content with the prompt and PDF
-        response = client.models.generate_content(
-            model="gemini-2.0-flash", 
-            contents=contents
-        )
-        
-        # Extract the JSON response
-        content = response.text
+    Returns:
+        dict: Parsed analysis results containing summary, relevance, and reasoning
+    """
+    # Find JSON block if it's embedded in markdown
+    if "```json" in content:
+        json_content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        json_content = content.split("```")[1].strip()
+    else:
+        json_content = content
         
-        # Find JSON block if it's embedded in markdown
-        if "```json" in content:
-            json_content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            json_content = content.split("```")[1].strip()
-        else:
-            json_content = content
-            
-        # Parse the JSON
-        result = json.loads(json_content)
+    # Parse the JSON
+    result = json.loads(json_content)
+    
+    # Update the paper object with analysis results
+    paper.is_relevant = True if result.get("is_relevant", "no").lower() == "yes" else False
+    paper.relevance_reasoning = result.get("reasoning")
+    paper.summary = result.get("summary")
+    
+    return result
+
+
+def record_verdict(paper: Paper, topic: str, include_terms: List[str], exclude_terms: List[str],
+                   predicted: Optional[float] = None) -> None:
+    """
+    Record a Gemini screening verdict as training data for the local relevance classifier.
+    
+    Papers without a parsed verdict are skipped so failures aren't learned as exclusions.
+    """
+    if paper.is_relevant is None:
+        return
+    try:
+        relevance_classifier.record(paper, topic, include_terms, exclude_terms, bool(paper.is_relevant), predicted)
+    except Exception as e:
+        print(f"Error recording screening verdict for {paper.id}: {e}")
+
+
+def predict_relevance(paper: Paper, topic: str, include_terms: List[str], exclude_terms: List[str]) -> Optional[float]:
+    """
+    Predict the probability that screening includes a paper, or None if the local classifier can't tell.
+    """
+    try:
+        return relevance_classifier.predict(paper, topic, include_terms, exclude_terms)
+    except Exception as e:
+        print(f"Error predicting relevance of {paper.id} locally: {e}")
+        return None
+
+
+def apply_local_verdict(paper: Paper, relevant: bool, probability: float) -> Dict[str, Any]:
+    """
+    Store a verdict made by the local relevance classifier on the paper.
+    """
+    paper.is_relevant = relevant
+    paper.relevance_reasoning = f"Decided by the local relevance classifier (p={probability:.2f})"
+    paper.summary = paper.abstract
+    return {
+        "summary": paper.summary,
+        "is_relevant": "yes" if relevant else "no",
+        "confidence": probability,
+        "reasoning": paper.relevance_reasoning
+    }
+
+
+def emit_screened(paper: Paper) -> None:
+    """
+    Report a screening verdict, including the paper's summary when it is included.
+    """
+    emit("paper_screened", paper_id=paper.id, title=paper.title, relevant=bool(paper.is_relevant),
+         summary=paper.summary if paper.is_relevant else None)
+
+
+def analyze_paper_relevance(paper: Paper, topic: str, include_terms: List[str], exclude_terms: List[str]) -> Dict[str, Any]:
+    """
+    Analyze the relevance of a paper using Gemini.
+    
+    Papers the local relevance classifier is confident about are decided without
+    Gemini. Others are screened on the screening route's model first and screened
+    again on its escalation model if the verdict is low-confidence or can't be
+    parsed; every Gemini verdict is recorded to train the classifier.
+    
+    Args:
+        paper (Paper): Paper object containing metadata and file URI
+        topic (str): The main research topic
+        include_terms (list): Terms that should be included
+        exclude_terms (list): Terms that should be excluded
         
-        # Update the paper object with analysis results
-        paper.is_relevant = True if result.get("is_relevant", "no").lower() == "yes" else False
-        paper.relevance_reasoning = result.get("reasoning")
-        paper.summary = result.get("summary")
+    Returns:
+        dict: Analysis results containing summary, relevance, and reasoning, plus
+        an "error" message if screening failed
+    """
+    contents = build_relevance_contents(paper, topic, include_terms, exclude_terms)
+
+    probability = predict_relevance(paper, topic, include_terms, exclude_terms)
+    verdict = relevance_classifier.decide(probability)
+    if verdict is not None:
+        return apply_local_verdict(paper, verdict, probability)
+    
+    try:
+        # Generate content with the prompt and paper
+        with span("screen", "paper", paper_id=paper.id):
+            response = router.generate("screen", contents)
+            try:
+                result = apply_relevance_response(paper, response.text)
+            except ValueError:
+                result = None
+            if router.can_escalate("screen") and (result is None or is_low_confidence(result)):
+                print(f"  Escalating screening of {paper.id}")
+                response = router.generate("screen", contents, escalate=True)
+                result = apply_relevance_response(paper, response.text)
+            if result is None:
+                raise ValueError(f"Could not parse screening verdict: {response.text[:200]}")
+        record_verdict(paper, topic, include_terms, exclude_terms, probability)
         
         return result
     
     except Exception as e:
         print(f"Error analyzing paper {paper.id}: {e}")
-        return {"is_relevant": "no", "reasoning": f"Error: {str(e)}", "summary": None}
+        return {"is_relevant": "no", "reasoning": f"Error: {str(e)}", "summary": None, "error": str(e)}
 
 
-def extract_paper_content(paper: Paper, topic: str, model="gemini-2.0-flash") -> Optional[str]:
+def extract_paper_content(paper: Paper, topic: str, model: Optional[str] = None) -> Optional[str]:
     """
     Extract relevant content from a paper.
     
     Args:
         paper (Paper): Paper object containing metadata and file URI
         topic (str): The main research topic
-        model (str): Gemini model to use
+        model (str): Gemini model to use instead of the routed one
         
     Returns:
         str: Extracted content or None if error
@@ -226,10 +352,8 @@ The paper ID is: {paper.id}
         ]
         
         # Generate content with the prompt and PDF
-        response = client.models.generate_content(
-            model=model, 
-            contents=contents
-        )
+        with span("extract", "paper", paper_id=paper.id):
+            response = router.generate("extract", contents, model=model)
         
         content = response.text 
         paper.relevant_content = content
@@ -239,7 +363,8 @@ The paper ID is: {paper.id}
         return None
 
 
-def filter_papers(papers: List[Paper], topic: str, include_terms: List[str], exclude_terms: List[str]) -> Dict[str, Dict]:
+def filter_papers(papers: List[Paper], topic: str, include_terms: List[str], exclude_terms: List[str], batch_backend=None,
+                  target: Optional[int] = None) -> Dict[str, Dict]:
     """
     Analyze multiple papers for relevance.
     
@@ -248,14 +373,31 @@ def filter_papers(papers: List[Paper], topic: str, include_terms: List[str], exc
         topic (str): The main research topic
         include_terms (list): Terms that should be included
         exclude_terms (list): Terms that should be excluded
+        batch_backend (BatchBackend): If given, screen all papers in one batch job through this backend
+        target (int): If given, stop screening once this many papers are included; can't be
+            combined with batch_backend
         
     Returns:
         dict: Mapping of paper titles to relevance results
     """
+    if target is not None and batch_backend is not None:
+        raise ValueError("Batch screening screens every paper in one job and can't stop at a target")
+    if target is not None:
+        return filter_papers_until(papers, topic, include_terms, exclude_terms, target)
+
+    if batch_backend is not None:
+        # Imported here because batch_screening builds on this module
+        from modules.batch_screening import screen_papers_batch
+        results = screen_papers_batch(papers, topic, include_terms, exclude_terms, backend=batch_backend)
+        for paper in papers:
+            if paper.is_relevant and paper.uploaded and paper.file_uri:
+                extract_paper_content(paper, topic)
+        return results
+
     results = {}
     
     for paper in papers:
-        if not paper.uploaded or not paper.file_uri:
+        if not can_screen(paper):
             print(f"Skipping {paper.id} - not uploaded or missing file URI")
             continue
             
@@ -266,10 +408,89 @@ def filter_papers(papers: List[Paper], topic: str, include_terms: List[str], exc
         
         # Use the paper title as the key for better user readability
         results[paper.title] = result 
+        emit_screened(paper)
 
         if paper.is_relevant:
-            extract_paper_content(paper, topic)
+            if paper.uploaded and paper.file_uri:
+                extract_paper_content(paper, topic)
+            else:
+                print(f"  Skipping extraction for {paper.id} - not uploaded")
         
         print(f"  Relevant: {result.get('is_relevant', 'unknown')}")
         
     return results
+
+
+def filter_papers_until(papers: List[Paper], topic: str, include_terms: List[str], exclude_terms: List[str],
+                        target: int, wave_size: int = SCREENING_WAVE_SIZE) -> Dict[str, Dict]:
+    """
+    Screen papers in rank order, a few at a time, until enough are included.
+    
+    At most wave_size screenings are in flight, and the next paper is only
+    submitted while the target hasn't been reached, so no model call starts
+    after that. Screenings already in flight finish; of all included papers,
+    only the best-ranked `target` keep their verdict and get their content
+    extracted, and the rest are left unscreened (is_relevant is None) so a later
+    run can continue from them. Excluded papers are reported as they are
+    screened, included ones once the kept set is known.
+    
+    Args:
+        papers (List[Paper]): List of Paper objects in rank order
+        topic (str): The main research topic
+        include_terms (list): Terms that should be included
+        exclude_terms (list): Terms that should be excluded
+        target (int): Number of included papers to stop at
+        wave_size (int): Number of papers screened concurrently
+        
+    Returns:
+        dict: Mapping of paper titles to relevance results for the screened papers
+    """
+    if target <= 0:
+        raise ValueError("The target number of included papers must be at least 1")
+    candidates = iter([paper for paper in papers if can_screen(paper)])
+    results = {}
+    included = 0
+
+    with ThreadPoolExecutor(max_workers=wave_size) as executor:
+        in_flight = {}
+
+        def submit_next():
+            paper = next(candidates, None)
+            if paper is not None:
+                in_flight[executor.submit(analyze_paper_relevance, paper, topic, include_terms, exclude_terms)] = paper
+
+        for _ in range(wave_size):
+            submit_next()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                paper = in_flight.pop(future)
+                result = future.result()
+                results[paper.title] = result
+                print(f"  {paper.id} relevant: {result.get('is_relevant', 'unknown')}")
+                if paper.is_relevant:
+                    included += 1
+                else:
+                    emit_screened(paper)
+                if included < target:
+                    submit_next()
+                elif not in_flight:
+                    print(f"Reached {target} included papers, stopping screening")
+
+    # Keep the best-ranked included papers; extra verdicts from screenings still in flight are dropped
+    kept = 0
+    for paper in papers:
+        if not paper.is_relevant:
+            continue
+        if kept < target:
+            kept += 1
+            emit_screened(paper)
+            if paper.uploaded and paper.file_uri:
+                extract_paper_content(paper, topic)
+        else:
+            paper.is_relevant = None
+            results.pop(paper.title, None)
+
+    unscreened = [paper.id for paper in papers if paper.is_relevant is None]
+    print(f"Included {kept} papers; {len(unscreened)} candidates left unscreened")
+    return results
@@ -0,0 +1,217 @@
+"""
+Module for fetching arXiv API result pages with an on-disk response cache.
+
+Pages are cached per (query, sort, start, page size), so re-running a query, or
+raising max_results on a query that was already run, only requests the pages
+that are missing. Stale pages are revalidated with conditional requests.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import feedparser
+import requests
+
+from modules.tracing import span
+
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+
+# Response cache location and freshness
+ARXIV_CACHE_DIR = os.getenv("ARXIV_CACHE_DIR", os.path.join(".cache", "arxiv"))
+ARXIV_CACHE_TTL = int(os.getenv("ARXIV_CACHE_TTL", 24 * 60 * 60))
+
+# Paging and politeness settings (arXiv asks for at most one request every 3 seconds)
+ARXIV_PAGE_SIZE = int(os.getenv("ARXIV_PAGE_SIZE", 100))
+ARXIV_REQUEST_INTERVAL = float(os.getenv("ARXIV_REQUEST_INTERVAL", 3))
+ARXIV_MAX_CONNECTIONS = int(os.getenv("ARXIV_MAX_CONNECTIONS", 2))
+ARXIV_TIMEOUT = float(os.getenv("ARXIV_TIMEOUT", 30))
+ARXIV_RETRIES = int(os.getenv("ARXIV_RETRIES", 3))
+
+
+class CachedArxivClient:
+    """
+    arXiv API client with an on-disk page cache, conditional requests and
+    rate-limited parallel page fetching.
+    """
+
+    def __init__(self, cache_dir: str = ARXIV_CACHE_DIR, page_size: int = ARXIV_PAGE_SIZE,
+                 ttl: int = ARXIV_CACHE_TTL, request_interval: float = ARXIV_REQUEST_INTERVAL,
+                 max_connections: int = ARXIV_MAX_CONNECTIONS):
+        self.cache_dir = cache_dir
+        self.page_size = page_size
+        self.ttl = ttl
+        self.request_interval = request_interval
+        self.max_connections = max_connections
+        self.session = requests.Session()
+        self._rate_lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        self._next_request_at = 0.0
+        os.makedirs(os.path.join(cache_dir, "pages"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "progress"), exist_ok=True)
+
+    def fetch(self, query: str, max_results: int, sort_by: str = "relevance") -> List[Any]:
+        """
+        Fetch up to max_results feed entries for a query.
+
+        Args:
+            query (str): arXiv search query
+            max_results (int): Maximum number of entries to return
+            sort_by (str): arXiv sort criterion ("relevance", "lastUpdatedDate" or "submittedDate")
+
+        Returns:
+            list: feedparser entries in result order
+        """
+        progress = self._load_progress(query, sort_by)
+        first_page, total = self._get_page(query, sort_by, 0)
+
+        starts = [start for start in range(self.page_size, min(max_results, total), self.page_size)]
+        cached = sum(1 for start in starts if str(start) in progress.get("pages", {}))
+        if starts:
+            print(f"arXiv: {total} results, {cached}/{len(starts) + 1} pages cached")
+
+        # Cached pages return immediately; missing ones are fetched in parallel under the rate limit
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            pages = list(executor.map(lambda start: self._get_page(query, sort_by, start)[0], starts))
+
+        entries = list(first_page)
+        for page in pages:
+            entries.extend(page)
+        return entries[:max_results]
+
+    def iter_entries(self, query: str, sort_by: str = "relevance", max_results: Optional[int] = None) -> Iterator[Any]:
+        """
+        Yield feed entries for a query one page at a time, so callers can stop early.
+
+        Args:
+            query (str): arXiv search query
+            sort_by (str): arXiv sort criterion
+            max_results (int): Maximum number of entries to yield, or None for all
+
+        Yields:
+            feedparser entries in result order
+        """
+        start = 0
+        yielded = 0
+        while True:
+            entries, total = self._get_page(query, sort_by, start)
+            for entry in entries:
+                if max_results is not None and yielded >= max_results:
+                    return
+                yield entry
+                yielded += 1
+            start += self.page_size
+            if not entries or start >= total:
+                return
+
+    def _get_page(self, query: str, sort_by: str, start: int) -> Tuple[List[Any], int]:
+        """
+        Get one result page from the cache or the API.
+
+        Returns:
+            tuple: (entries, total_results)
+        """
+        params = {
+            "search_query": query,
+            "start": start,
+            "max_results": self.page_size,
+            "sortBy": sort_by,
+            "sortOrder": "descending"
+        }
+        key = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+        body_path = os.path.join(self.cache_dir, "pages", f"{key}.xml")
+        meta_path = os.path.join(self.cache_dir, "pages", f"{key}.json")
+
+        meta = None
+        if os.path.exists(body_path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if time.time() - meta["fetched_at"] < self.ttl:
+                return self._parse(body_path)
+
+        for attempt in range(ARXIV_RETRIES + 1):
+            headers = {}
+            if meta:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+            self._wait_for_turn()
+            try:
+                with span("arxiv_page", "search", start=start, attempt=attempt + 1):
+                    response = self.session.get(ARXIV_API_URL, params=params, headers=headers, timeout=ARXIV_TIMEOUT)
+                if response.status_code == 304:
+                    meta["fetched_at"] = time.time()
+                    self._write_json(meta_path, meta)
+                    return self._parse(body_path)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print(f"arXiv request for page {start} failed: {e}")
+                continue
+
+            feed = feedparser.parse(response.content)
+            total = int(feed.feed.get("opensearch_totalresults", 0))
+            # The API occasionally returns an empty page mid-result; retry rather than cache it
+            if not feed.entries and start < total:
+                print(f"arXiv returned an empty page at {start}, retrying")
+                continue
+
+            with open(body_path, "wb") as f:
+                f.write(response.content)
+            self._write_json(meta_path, {
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            })
+            self._record_progress(query, sort_by, start, len(feed.entries), total)
+            return feed.entries, total
+
+        # Fall back to a stale copy rather than failing the whole search
+        if meta:
+            return self._parse(body_path)
+        raise RuntimeError(f"Failed to fetch arXiv results page at {start} for query: {query}")
+
+    def _parse(self, body_path: str) -> Tuple[List[Any], int]:
+        feed = feedparser.parse(body_path)
+        return feed.entries, int(feed.feed.get("opensearch_totalresults", 0))
+
+    def _wait_for_turn(self) -> None:
+        """
+        Block until the minimum interval since the previous request has passed.
+        """
+        with self._rate_lock:
+            wait = self._next_request_at - time.time()
+            self._next_request_at = max(time.time(), self._next_request_at) + self.request_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def _progress_path(self, query: str, sort_by: str) -> str:
+        key = hashlib.sha256(json.dumps([query, sort_by, self.page_size]).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "progress", f"{key}.json")
+
+    def _load_progress(self, query: str, sort_by: str) -> Dict[str, Any]:
+        path = self._progress_path(query, sort_by)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _record_progress(self, query: str, sort_by: str, start: int, count: int, total: int) -> None:
+        """
+        Record which pages of a query have been fetched and the total result count.
+        """
+        with self._progress_lock:
+            progress = self._load_progress(query, sort_by)
+            progress.update({"query": query, "sort_by": sort_by, "total_results": total})
+            progress.setdefault("pages", {})[str(start)] = count
+            self._write_json(self._progress_path(query, sort_by), progress)
+
+    def _write_json(self, path: str, data: Dict[str, Any]) -> None:
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
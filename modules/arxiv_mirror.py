@@ -0,0 +1,334 @@
+"""
+Module for a local arXiv metadata mirror backed by a SQLite FTS5 index.
+
+The mirror is loaded from the arXiv metadata snapshot (one JSON object per
+line, as distributed on Kaggle) and answers the same ti:/abs:/au:/cat: query
+syntax produced by generate_search_query without calling the arXiv API.
+"""
+import os
+import re
+import gzip
+import json
+import sqlite3
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterator, List, Optional, Tuple
+
+from modules.paper import Paper
+
+ARXIV_MIRROR_DB = os.getenv("ARXIV_MIRROR_DB", os.path.join(".cache", "arxiv_mirror.sqlite"))
+
+# Map arXiv query fields to FTS columns; fields not listed search all columns
+FIELD_COLUMNS = {
+    "ti": "title",
+    "abs": "abstract",
+    "au": "authors",
+    "cat": "categories",
+}
+OPERATORS = {"AND", "OR", "ANDNOT", "NOT"}
+
+# Sort criteria supported by the API, mapped to ORDER BY clauses
+SORT_ORDERS = {
+    "relevance": "bm25(papers_fts, 10.0, 5.0, 2.0, 1.0)",
+    "submittedDate": "papers.published DESC",
+    "lastUpdatedDate": "papers.updated DESC",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id TEXT PRIMARY KEY,
+    version TEXT,
+    title TEXT,
+    authors TEXT,
+    abstract TEXT,
+    categories TEXT,
+    published TEXT,
+    updated TEXT
+);
+-- Text index rows share the rowid of their papers row, so they are found without a scan
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(title, abstract, authors, categories);
+CREATE INDEX IF NOT EXISTS papers_published ON papers (published);
+"""
+
+
+def connect(db_path: str = ARXIV_MIRROR_DB) -> sqlite3.Connection:
+    """
+    Open the mirror database, creating the schema if needed.
+    """
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _read_snapshot(snapshot_path: str) -> Iterator[dict]:
+    opener = gzip.open if snapshot_path.endswith(".gz") else open
+    with opener(snapshot_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _snapshot_row(record: dict) -> Tuple:
+    """
+    Convert a snapshot record into a papers table row.
+    """
+    versions = record.get("versions") or [{"version": "v1", "created": None}]
+    published = versions[0].get("created")
+    published = parsedate_to_datetime(published).isoformat() if published else None
+
+    if record.get("authors_parsed"):
+        authors = [" ".join(part for part in (name[1], name[0]) if part) for name in record["authors_parsed"]]
+    else:
+        authors = [name.strip() for name in re.split(r",| and ", record.get("authors", "")) if name.strip()]
+
+    return (
+        record["id"],
+        versions[-1].get("version", "v1"),
+        " ".join(record.get("title", "").split()),
+        json.dumps(authors),
+        record.get("abstract", "").strip(),
+        record.get("categories", ""),
+        published,
+        record.get("update_date"),
+    )
+
+
+def ingest_snapshot(snapshot_path: str, db_path: str = ARXIV_MIRROR_DB, batch_size: int = 5000) -> int:
+    """
+    Load an arXiv metadata snapshot into the mirror, replacing existing records.
+
+    Args:
+        snapshot_path (str): Path to the JSON-lines snapshot (optionally gzipped)
+        db_path (str): Path to the mirror database
+        batch_size (int): Number of records written per transaction
+
+    Returns:
+        int: Number of records ingested
+    """
+    connection = connect(db_path)
+    # Into an empty mirror every record is new, so there are no old index rows to delete
+    fresh = connection.execute("SELECT 1 FROM papers LIMIT 1").fetchone() is None
+    count = 0
+    batch = []
+
+    def flush():
+        with connection:
+            if not fresh:
+                connection.executemany(
+                    "DELETE FROM papers_fts WHERE rowid = (SELECT rowid FROM papers WHERE id = ?)",
+                    [(row[0],) for row in batch]
+                )
+            # An upsert keeps the rowid of a replaced record, which the text index is keyed by
+            connection.executemany(
+                "INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                "version = excluded.version, title = excluded.title, authors = excluded.authors, "
+                "abstract = excluded.abstract, categories = excluded.categories, "
+                "published = excluded.published, updated = excluded.updated",
+                batch
+            )
+            connection.executemany(
+                "INSERT INTO papers_fts (rowid, title, abstract, authors, categories) "
+                "SELECT rowid, ?, ?, ?, ? FROM papers WHERE id = ?",
+                [(row[2], row[4], " ".join(json.loads(row[3])), row[5], row[0]) for row in batch]
+            )
+        batch.clear()
+
+    for record in _read_snapshot(snapshot_path):
+        batch.append(_snapshot_row(record))
+        count += 1
+        if len(batch) >= batch_size:
+            flush()
+            print(f"Ingested {count} records")
+    if batch:
+        flush()
+
+    with connection:
+        connection.execute("INSERT INTO papers_fts (papers_fts) VALUES ('optimize')")
+    connection.close()
+    return count
+
+
+def _tokenize(query: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Split an arXiv query into (kind, field, value) tokens.
+    """
+    token_pattern = re.compile(
+        r'\s*(?:(?P<paren>[()])|(?P<group>[A-Za-z_]+):(?=\()|[A-Za-z_]+:(?P<range>\[[^\]]*\])'
+        r'|(?:(?P<prefix>[A-Za-z_]+):)?(?P<term>"[^"]*"|[^\s()"]+))'
+    )
+    tokens = []
+    position = 0
+    query = query.strip()
+    if query.count('"') % 2:
+        query += '"'
+
+    while position < len(query):
+        match = token_pattern.match(query, position)
+        if not match:
+            # Unbalanced quote or stray character; skip it
+            position += 1
+            continue
+        position = match.end()
+        if match.group("paren"):
+            tokens.append(("paren", None, match.group("paren")))
+        elif match.group("group"):
+            tokens.append(("group", match.group("group").lower(), None))
+        elif match.group("range"):
+            # Date ranges are not searchable in the text index
+            continue
+        elif match.group("prefix") is None and match.group("term") in OPERATORS:
+            tokens.append(("op", None, "ANDNOT" if match.group("term") == "NOT" else match.group("term")))
+        else:
+            field = match.group("prefix").lower() if match.group("prefix") else None
+            tokens.append(("term", field, match.group("term")))
+    return tokens
+
+
+def to_fts_query(query: str) -> Optional[str]:
+    """
+    Translate an arXiv API search query into an FTS5 MATCH expression.
+
+    OR binds loosest; AND and ANDNOT bind tighter and associate left. Adjacent
+    terms without an operator are combined with AND, as the arXiv API does.
+
+    Args:
+        query (str): arXiv search query, e.g. '(ti:quantum OR abs:quantum) ANDNOT ti:finance'
+
+    Returns:
+        str: FTS5 expression, or None if the query has no searchable terms
+    """
+    tokens = _tokenize(query)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else (None, None, None)
+
+    def parse_or(field):
+        nonlocal position
+        left = parse_and(field)
+        while peek() == ("op", None, "OR"):
+            position += 1
+            right = parse_and(field)
+            left = f"({left} OR {right})" if left and right else left or right
+        return left
+
+    def parse_and(field):
+        nonlocal position
+        left = parse_primary(field)
+        while True:
+            kind, _, value = peek()
+            if kind == "op" and value in ("AND", "ANDNOT"):
+                position += 1
+                right = parse_primary(field)
+            elif kind in ("term", "group") or (kind == "paren" and value == "("):
+                value = "AND"
+                right = parse_primary(field)
+            else:
+                return left
+            if not right:
+                continue
+            if not left:
+                # NOT needs a left operand in FTS5; a leading ANDNOT can't be expressed
+                left = right if value == "AND" else left
+                continue
+            operator = "NOT" if value == "ANDNOT" else "AND"
+            left = f"({left} {operator} {right})"
+
+    def parse_primary(field):
+        nonlocal position
+        kind, term_field, value = peek()
+        if kind is None or kind == "op" or value == ")":
+            return None
+        position += 1
+        if kind == "paren" and value == "(":
+            inner = parse_or(field)
+            if peek() == ("paren", None, ")"):
+                position += 1
+            return inner
+        if kind == "group":
+            # A field followed by a group applies to every term in it, e.g. ti:(a OR b)
+            return parse_primary(term_field)
+        if kind == "term":
+            return _fts_term(value, term_field or field)
+        return None
+
+    expression = parse_or(None)
+    while position < len(tokens):
+        # Skip a stray closing parenthesis or operator and keep parsing
+        position += 1
+        rest = parse_or(None)
+        if rest:
+            expression = f"({expression} AND {rest})" if expression else rest
+    return expression or None
+
+
+def _fts_term(value: str, field: Optional[str]) -> Optional[str]:
+    """
+    Quote a single term or phrase for FTS5, keeping a trailing wildcard as a prefix query.
+    """
+    prefix = value.endswith("*")
+    text = value.strip('"').rstrip("*").strip()
+    if not text:
+        return None
+    term = '"' + text.replace('"', '""') + '"' + (" *" if prefix else "")
+    column = FIELD_COLUMNS.get(field) if field else None
+    return f"{column} : {term}" if column else term
+
+
+def latest_published(db_path: str = ARXIV_MIRROR_DB) -> Optional[datetime]:
+    """
+    Get the submission date of the newest paper in the mirror.
+    """
+    connection = connect(db_path)
+    row = connection.execute("SELECT MAX(published) FROM papers").fetchone()
+    connection.close()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+
+def search_mirror(query: str, max_results: int = 50, sort_by: str = "relevance",
+                  db_path: str = ARXIV_MIRROR_DB) -> List[Paper]:
+    """
+    Run an arXiv-syntax query against the local mirror.
+
+    Args:
+        query (str): arXiv search query
+        max_results (int): Maximum number of papers to return
+        sort_by (str): "relevance", "submittedDate" or "lastUpdatedDate"
+        db_path (str): Path to the mirror database
+
+    Returns:
+        list: Matching Paper objects
+    """
+    fts_query = to_fts_query(query)
+    if not fts_query:
+        return []
+
+    connection = connect(db_path)
+    rows = connection.execute(
+        f"""
+        SELECT papers.id, papers.version, papers.title, papers.authors, papers.abstract,
+               papers.categories, papers.published
+        FROM papers_fts JOIN papers ON papers.rowid = papers_fts.rowid
+        WHERE papers_fts MATCH ?
+        ORDER BY {SORT_ORDERS.get(sort_by, SORT_ORDERS['relevance'])}
+        LIMIT ?
+        """,
+        (fts_query, max_results)
+    ).fetchall()
+    connection.close()
+
+    papers = []
+    for paper_id, version, title, authors, abstract, categories, published in rows:
+        papers.append(Paper(
+            id=f"{paper_id}{version}",
+            title=title,
+            authors=json.loads(authors),
+            abstract=abstract,
+            published_date=datetime.fromisoformat(published) if published else datetime.now(timezone.utc),
+            pdf_url=f"https://arxiv.org/pdf/{paper_id}{version}",
+            entry_id=f"http://arxiv.org/abs/{paper_id}{version}",
+            categories=categories.split()
+        ))
+    return papers
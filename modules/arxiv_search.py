@@ -1,8 +1,25 @@
 """
 Module for generating optimized arXiv search queries and fetching paper metadata.
 """
+import os
+import re
 import arxiv
 from modules.paper import Paper
+from modules.arxiv_client import CachedArxivClient, ARXIV_PAGE_SIZE, ARXIV_CACHE_TTL
+from modules.arxiv_mirror import search_mirror, latest_published
+
+# Where fetch_papers looks for papers: "api", "local" (mirror only) or "hybrid"
+ARXIV_SOURCE = os.getenv("ARXIV_SOURCE", "api")
+
+_clients = {}
+
+def get_arxiv_client(page_size=ARXIV_PAGE_SIZE, ttl=ARXIV_CACHE_TTL):
+    """
+    Get a shared cached arXiv client for the given page size and cache TTL.
+    """
+    if (page_size, ttl) not in _clients:
+        _clients[(page_size, ttl)] = CachedArxivClient(page_size=page_size, ttl=ttl)
+    return _clients[(page_size, ttl)]
 
 def generate_search_query(topic, include_terms=None, exclude_terms=None):
     """
@@ -34,35 +51,163 @@ def generate_search_query(topic, include_terms=None, exclude_terms=None):
  
     return query
 
-def fetch_papers(query, max_results=50, sort_by=arxiv.SortCriterion.Relevance):
+def fetch_papers(query, max_results=50, sort_by=arxiv.SortCriterion.Relevance, page_size=ARXIV_PAGE_SIZE, source=ARXIV_SOURCE):
     """
     Fetch papers from arXiv based on the search query.
     
+    Result pages from the API are cached on disk, so repeated or extended queries
+    only fetch the pages that have not been seen yet. With the "local" source the
+    query runs against the local metadata mirror instead, and "hybrid" adds papers
+    submitted after the mirror snapshot from the live API.
+    
     Args:
         query (str): The formatted arXiv search query
         max_results (int): Maximum number of results to return
         sort_by: Sorting criteria for results
+        page_size (int): Number of results requested per API call
+        source (str): "api", "local" or "hybrid"
         
     Returns:
-        list: List of arxiv.Result objects containing paper metadata
-    """
-    client = arxiv.Client()
-    search = arxiv.Search(
-        query=query,
-        max_results=max_results,
-        sort_by=sort_by
-    )
-    
-    results = list(client.results(search))
-    # Convert arxiv.Result objects to Paper objects
+        list: List of Paper objects containing paper metadata
+    """
+    sort_value = sort_by.value if isinstance(sort_by, arxiv.SortCriterion) else sort_by
+
+    if source == "api":
+        results = fetch_papers_api(query, max_results, sort_value, page_size)
+    else:
+        results = search_mirror(query, max_results=max_results, sort_by=sort_value)
+        if source == "hybrid":
+            results = fetch_fresh_papers(query, max_results, page_size) + results
+            results = dedupe_versions(results)[:max_results]
 
-    results = [Paper.from_arxiv_result(paper) for paper in results]
     for paper in results:
         paper.bibtex = populate_bibtex(paper)
         print(paper.bibtex)
 
     return results
 
+def iter_papers(query, max_results=50, page_size=ARXIV_PAGE_SIZE, source=ARXIV_SOURCE):
+    """
+    Yield papers for a search query as result pages arrive, in rank order.
+    
+    Only the API source is paged; mirror searches run locally and are yielded
+    once the query completes.
+    
+    Args:
+        query (str): The formatted arXiv search query
+        max_results (int): Maximum number of results to yield
+        page_size (int): Number of results requested per API call
+        source (str): "api", "local" or "hybrid"
+        
+    Yields:
+        Paper objects with BibTeX entries
+    """
+    if source != "api":
+        yield from fetch_papers(query, max_results=max_results, page_size=page_size, source=source)
+        return
+
+    client = get_arxiv_client(page_size)
+    for entry in client.iter_entries(query, sort_by="relevance", max_results=max_results):
+        paper = Paper.from_feed_entry(entry)
+        paper.bibtex = populate_bibtex(paper)
+        yield paper
+
+def fetch_papers_api(query, max_results, sort_by="relevance", page_size=ARXIV_PAGE_SIZE):
+    """
+    Fetch papers from the arXiv API through the cached client.
+    
+    Args:
+        query (str): The formatted arXiv search query
+        max_results (int): Maximum number of results to return
+        sort_by (str): arXiv sort criterion
+        page_size (int): Number of results requested per API call
+        
+    Returns:
+        list: List of Paper objects
+    """
+    client = get_arxiv_client(page_size)
+    entries = client.fetch(query, max_results=max_results, sort_by=sort_by)
+
+    # Convert feed entries to Paper objects
+    return [Paper.from_feed_entry(entry) for entry in entries]
+
+def fetch_fresh_papers(query, max_results, page_size=ARXIV_PAGE_SIZE):
+    """
+    Fetch papers submitted after the newest paper in the local mirror from the live API.
+    
+    Args:
+        query (str): The formatted arXiv search query
+        max_results (int): Maximum number of results to return
+        page_size (int): Number of results requested per API call
+        
+    Returns:
+        list: List of Paper objects, newest first
+    """
+    newest = latest_published()
+    if newest is None:
+        return fetch_papers_api(query, max_results, "relevance", page_size)
+
+    fresh_query = f"({query}) AND submittedDate:[{newest.strftime('%Y%m%d%H%M')} TO 999912312359]"
+    papers = fetch_papers_api(fresh_query, max_results, "submittedDate", page_size)
+    print(f"Found {len(papers)} papers newer than the local mirror")
+    return papers
+
+def fetch_new_papers(query, since, max_results=50, page_size=ARXIV_PAGE_SIZE, source=ARXIV_SOURCE):
+    """
+    Fetch papers submitted after a given date, newest first.
+    
+    API pages are always revalidated, since the newest results change between
+    runs. The "local" source searches only the mirror; "hybrid" uses the API,
+    which also covers papers newer than the mirror snapshot.
+    
+    Args:
+        query (str): The formatted arXiv search query
+        since (datetime): Only papers submitted after this date are returned (None for no limit)
+        max_results (int): Maximum number of results to return
+        page_size (int): Number of results requested per API call
+        source (str): "api", "local" or "hybrid"
+        
+    Returns:
+        list: List of Paper objects, newest first
+    """
+    results = []
+    if source == "local":
+        for paper in search_mirror(query, max_results=max_results, sort_by="submittedDate"):
+            if since is not None and paper.published_date <= since:
+                break
+            results.append(paper)
+    else:
+        client = get_arxiv_client(page_size, ttl=0)
+        for entry in client.iter_entries(query, sort_by="submittedDate", max_results=max_results):
+            paper = Paper.from_feed_entry(entry)
+            if since is not None and paper.published_date <= since:
+                break
+            results.append(paper)
+
+    for paper in results:
+        paper.bibtex = populate_bibtex(paper)
+
+    return results
+
+def base_arxiv_id(paper_id):
+    """
+    Strip the version suffix from an arXiv ID or entry URL (e.g. "2101.00001v2" -> "2101.00001").
+    """
+    return re.sub(r"v\d+$", "", paper_id.split("/abs/")[-1])
+
+def dedupe_versions(papers):
+    """
+    Keep the first occurrence of each arXiv paper, ignoring version suffixes.
+    """
+    seen = set()
+    unique = []
+    for paper in papers:
+        base_id = base_arxiv_id(paper.id)
+        if base_id not in seen:
+            seen.add(base_id)
+            unique.append(paper)
+    return unique
+
 def populate_bibtex(paper):
     """
     Populate BibTeX entry for a given paper.
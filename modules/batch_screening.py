@@ -0,0 +1,195 @@
+"""
+Module for screening large candidate sets through asynchronous batch jobs.
+"""
+import os
+import json
+import time
+import tempfile
+from typing import Dict, List, Any, Callable, Optional
+
+from modules.paper import Paper
+from modules.ai_analyzer import (client, router, can_screen, build_relevance_contents, apply_relevance_response,
+                                 emit_screened, record_verdict)
+
+# Seconds between batch job status checks
+BATCH_POLL_INTERVAL = int(os.getenv("BATCH_POLL_INTERVAL", 30))
+
+# Terminal states reported by the Gemini batch API
+GEMINI_BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+class BatchBackend:
+    """
+    Interface for services that run a JSONL file of generate_content requests.
+    """
+
+    def submit(self, requests_path: str, model: str) -> str:
+        """Submit a JSONL request file and return a job ID."""
+        raise NotImplementedError
+
+    def is_done(self, job_id: str) -> bool:
+        """Check whether the job has reached a terminal state."""
+        raise NotImplementedError
+
+    def results(self, job_id: str) -> Dict[str, str]:
+        """Return a mapping of request keys to response text for a finished job."""
+        raise NotImplementedError
+
+
+class GeminiBatchBackend(BatchBackend):
+    """
+    Batch backend using Gemini batch jobs.
+    """
+
+    def __init__(self, client=client):
+        self.client = client
+
+    def submit(self, requests_path: str, model: str) -> str:
+        uploaded = self.client.files.upload(
+            file=requests_path,
+            config={"display_name": os.path.basename(requests_path), "mime_type": "jsonl"}
+        )
+        job = self.client.batches.create(
+            model=model,
+            src=uploaded.name,
+            config={"display_name": os.path.basename(requests_path)}
+        )
+        return job.name
+
+    def is_done(self, job_id: str) -> bool:
+        job = self.client.batches.get(name=job_id)
+        return job.state.name in GEMINI_BATCH_DONE_STATES
+
+    def results(self, job_id: str) -> Dict[str, str]:
+        job = self.client.batches.get(name=job_id)
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            raise RuntimeError(f"Batch job {job_id} finished with state {job.state.name}")
+
+        content = self.client.files.download(file=job.dest.file_name).decode("utf-8")
+        results = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "response" not in entry:
+                print(f"Batch request {entry.get('key')} failed: {entry.get('error')}")
+                continue
+            candidates = entry["response"].get("candidates") or [{}]
+            parts = candidates[0].get("content", {}).get("parts", [])
+            results[entry["key"]] = "".join(part.get("text", "") for part in parts)
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Batch backend that runs each request immediately, for tests and small runs.
+
+    Args:
+        generate (Callable): Function taking (model, contents) and returning response text
+    """
+
+    def __init__(self, generate: Optional[Callable[[str, List[Dict[str, Any]]], str]] = None):
+        self.generate = generate or (lambda model, contents: client.models.generate_content(model=model, contents=contents).text)
+        self._jobs: Dict[str, Dict[str, str]] = {}
+
+    def submit(self, requests_path: str, model: str) -> str:
+        results = {}
+        with open(requests_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                try:
+                    results[entry["key"]] = self.generate(model, entry["request"]["contents"])
+                except Exception as e:
+                    print(f"Batch request {entry['key']} failed: {e}")
+        job_id = f"local-{len(self._jobs)}"
+        self._jobs[job_id] = results
+        return job_id
+
+    def is_done(self, job_id: str) -> bool:
+        return True
+
+    def results(self, job_id: str) -> Dict[str, str]:
+        return self._jobs[job_id]
+
+
+def write_batch_requests(papers: List[Paper], topic: str, include_terms: List[str], exclude_terms: List[str], requests_path: str) -> Dict[str, Paper]:
+    """
+    Write one screening request per paper to a JSONL batch file.
+
+    Args:
+        papers (List[Paper]): Papers to screen
+        topic (str): The main research topic
+        include_terms (list): Terms that should be included
+        exclude_terms (list): Terms that should be excluded
+        requests_path (str): Path of the JSONL file to write
+
+    Returns:
+        dict: Mapping of request keys to the papers they screen
+    """
+    keyed_papers = {}
+    with open(requests_path, "w") as f:
+        for paper in papers:
+            if not can_screen(paper):
+                print(f"Skipping {paper.id} - not uploaded or missing file URI")
+                continue
+            key = f"paper-{paper.id}"
+            contents = build_relevance_contents(paper, topic, include_terms, exclude_terms)
+            request = {"contents": [{"role": "user", "parts": contents}]}
+            f.write(json.dumps({"key": key, "request": request}) + "\n")
+            keyed_papers[key] = paper
+    return keyed_papers
+
+
+def screen_papers_batch(papers: List[Paper], topic: str, include_terms: List[str], exclude_terms: List[str],
+                        backend: Optional[BatchBackend] = None, model: Optional[str] = None,
+                        poll_interval: int = BATCH_POLL_INTERVAL) -> Dict[str, Dict]:
+    """
+    Screen papers for relevance with a single batch job.
+
+    Args:
+        papers (List[Paper]): Papers to screen
+        topic (str): The main research topic
+        include_terms (list): Terms that should be included
+        exclude_terms (list): Terms that should be excluded
+        backend (BatchBackend): Batch service to use, Gemini batch jobs by default
+        model (str): Gemini model to use, the screening route's escalation model by default
+        poll_interval (int): Seconds between job status checks
+
+    Returns:
+        dict: Mapping of paper titles to relevance results
+    """
+    backend = backend or GeminiBatchBackend()
+    # Batch verdicts can't be escalated one at a time, so use the stronger screening model up front
+    model = model or router.model_for("screen", escalate=True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        requests_path = os.path.join(temp_dir, "screening_requests.jsonl")
+        keyed_papers = write_batch_requests(papers, topic, include_terms, exclude_terms, requests_path)
+        if not keyed_papers:
+            return {}
+
+        print(f"Submitting batch of {len(keyed_papers)} screening requests")
+        job_id = backend.submit(requests_path, model)
+
+    while not backend.is_done(job_id):
+        print(f"  Waiting for batch job {job_id}...")
+        time.sleep(poll_interval)
+
+    responses = backend.results(job_id)
+
+    # Map the responses back onto the papers
+    results = {}
+    for key, paper in keyed_papers.items():
+        try:
+            if key not in responses:
+                raise ValueError("No response in batch output")
+            result = apply_relevance_response(paper, responses[key])
+            record_verdict(paper, topic, include_terms, exclude_terms)
+        except Exception as e:
+            print(f"Error analyzing paper {paper.id}: {e}")
+            result = {"is_relevant": "no", "reasoning": f"Error: {str(e)}", "summary": None, "error": str(e)}
+        results[paper.title] = result
+        print(f"  {paper.id} relevant: {result.get('is_relevant', 'unknown')}")
+        emit_screened(paper)
+
+    return results
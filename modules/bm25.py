@@ -0,0 +1,102 @@
+"""
+Module for a small in-memory BM25 keyword index.
+
+Documents are added one at a time, so the index grows with the vector index
+instead of being rebuilt. Exact terms such as method names, acronyms and
+dataset names, which dense retrieval tends to miss, match directly.
+"""
+import os
+import re
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = float(os.getenv("BM25_K1", 1.5))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "how", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "which",
+    "with", "we", "our", "their", "these", "those", "can", "do", "does", "between", "into",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase alphanumeric tokens without stopwords.
+    """
+    return [token for token in re.findall(r"[a-z0-9]+", (text or "").lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incrementally built BM25 index over documents identified by string IDs.
+
+    Args:
+        k1 (float): Term-frequency saturation
+        b (float): Document length normalization
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str) -> None:
+        """
+        Add a document, replacing any earlier document with the same ID.
+        """
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        for term, count in Counter(tokens).items():
+            self.postings[term][doc_id] = count
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: str) -> None:
+        """
+        Remove a document from the index.
+        """
+        if doc_id not in self.doc_lengths:
+            return
+        for term in [term for term, docs in self.postings.items() if doc_id in docs]:
+            del self.postings[term][doc_id]
+            if not self.postings[term]:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Score documents against a query.
+
+        Args:
+            query (str): Free-text query
+            top_k (int): Maximum number of results
+
+        Returns:
+            list: (doc_id, score) pairs, best first
+        """
+        if not self.doc_lengths:
+            return []
+        num_docs = len(self.doc_lengths)
+        average_length = self.total_length / num_docs or 1.0
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, frequency in docs.items():
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / average_length
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
@@ -4,7 +4,7 @@ import json
 from typing import Dict, Any, List
 import dotenv
 from modules.paper import Paper
-from modules.ai_analyzer import client
+from modules.ai_analyzer import router
 
 """
 Module for compiling the final report in Markdown format using Google's Gemini AI.
@@ -13,6 +13,21 @@ Module for compiling the final report in Markdown format using Google's Gemini A
 # Load environment variables
 dotenv.load_dotenv()
 
+def strip_report_metadata(section: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Remove the regeneration bookkeeping fields from a report before it is sent to the model.
+    
+    Args:
+        section (Dict[str, Any]): A report or section from generate_full_report
+        
+    Returns:
+        Dict[str, Any]: Copy of the section without input hashes and retrieved paper IDs
+    """
+    stripped = {key: value for key, value in section.items() if key not in ("input_hash", "paper_ids")}
+    if isinstance(stripped.get("sections"), list):
+        stripped["sections"] = [strip_report_metadata(subsection) for subsection in stripped["sections"]]
+    return stripped
+
 def compile_markdown_report(report_data: Dict[str, Any]) -> str:
     """
     Convert the generated report data into a complete Markdown document.
@@ -23,8 +38,8 @@ def compile_markdown_report(report_data: Dict[str, Any]) -> str:
     Returns:
         str: Complete Markdown document
     """
-    # Convert the report_data to a JSON string for the prompt
-    report_json = json.dumps(report_data, indent=2)
+    # Convert the report_data to a JSON string for the prompt, without bookkeeping fields
+    report_json = json.dumps(strip_report_metadata(report_data), indent=2)
     
     prompt = f"""
     You are a scientific document preparation expert. Convert the following JSON structured literature review 
@@ -34,14 +49,15 @@ def compile_markdown_report(report_data: Dict[str, Any]) -> str:
     Each section in the JSON may contain:
     - title: The section heading
     - text: The content for that section
+    - references: The citation keys used in the text, mapped to their full references
     - sections: An array of subsections with the same structure
 
     Create a professionally formatted Markdown document that:
     1. Has a proper title at the top with the main title
     2. Includes a table of contents
     3. Contains all sections and subsections with proper Markdown heading levels (# for main title, ## for sections, ### for subsections, etc.)
-    4. Keeps any inline citations in the text (like [Author, Year])
-    5. Includes a references section at the end
+    4. Keeps any inline citations in the text (like [Smith2021])
+    5. Includes a references section at the end, built from the references of every section
     
     Here is the JSON structure of the document:
     
@@ -51,10 +67,7 @@ def compile_markdown_report(report_data: Dict[str, Any]) -> str:
     """
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[{"text": prompt}]
-        )
+        response = router.generate("compile", [{"text": prompt}])
         
         content = response.text
         
@@ -0,0 +1,145 @@
+"""
+Module for packing the most relevant paper content into a token budget.
+
+Each paper's extracted content is split into chunks, the chunks are ranked by
+similarity to the section question, and the best ones are added until the
+budget is full, skipping chunks that repeat content already selected. Papers
+are cited with compact keys instead of full BibTeX entries.
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules.paper import Paper
+from modules.embeddings import embed_texts, estimate_tokens
+
+# Token budget for the paper content of one section prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+# Target chunk size, and the similarity above which two chunks count as overlapping
+CONTEXT_CHUNK_TOKENS = int(os.getenv("CONTEXT_CHUNK_TOKENS", 250))
+CONTEXT_DEDUP_SIMILARITY = float(os.getenv("CONTEXT_DEDUP_SIMILARITY", 0.92))
+
+
+def citation_keys(papers: List[Paper]) -> Dict[str, str]:
+    """
+    Assign a short, unique citation key such as "Smith2021" to each paper.
+
+    Args:
+        papers (List[Paper]): Papers to cite
+
+    Returns:
+        dict: Mapping of paper IDs to citation keys
+    """
+    keys = {}
+    used = set()
+    for paper in papers:
+        surname = re.sub(r"[^A-Za-z]", "", paper.authors[0].split()[-1]) if paper.authors else "Anon"
+        year = paper.published_date.year if paper.published_date else ""
+        base = f"{surname or 'Anon'}{year}"
+        key = base
+        suffix = ord("a")
+        while key in used:
+            key = f"{base}{chr(suffix)}"
+            suffix += 1
+        used.add(key)
+        keys[paper.id] = key
+    return keys
+
+
+def format_reference(paper: Paper) -> str:
+    """
+    Format a one-line reference for a paper.
+    """
+    authors = paper.authors[0] + (" et al." if len(paper.authors) > 1 else "") if paper.authors else "Unknown"
+    year = paper.published_date.year if paper.published_date else "n.d."
+    return f"{authors} ({year}). {paper.title}. arXiv:{paper.id}"
+
+
+def chunk_text(text: str, chunk_tokens: int = CONTEXT_CHUNK_TOKENS) -> List[str]:
+    """
+    Split text into chunks of about chunk_tokens tokens along paragraph and sentence boundaries.
+
+    Args:
+        text (str): Text to split
+        chunk_tokens (int): Target chunk size in tokens
+
+    Returns:
+        List[str]: Chunks in document order
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= chunk_tokens:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(sentence for sentence in re.split(r"(?<=[.!?])\s+", paragraph) if sentence)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and estimate_tokens(current) + estimate_tokens(piece) > chunk_tokens:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def pack_context(question: str, papers: List[Paper], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 keys: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Select the paper content most relevant to a question within a token budget.
+
+    Args:
+        question (str): The question the section answers
+        papers (List[Paper]): Retrieved papers, most relevant first
+        token_budget (int): Maximum estimated tokens of packed content
+        keys (dict): Citation keys by paper ID, assigned from papers if None
+
+    Returns:
+        tuple: (context, references) where context lists the selected chunks under
+            each paper's citation key, and references maps keys to one-line references
+    """
+    keys = keys or citation_keys(papers)
+    chunks = [(paper, chunk) for paper in papers for chunk in chunk_text(paper.relevant_content)]
+    if not chunks:
+        return "", {}
+
+    vectors = embed_texts([question] + [chunk for _, chunk in chunks])
+    scores = vectors[1:] @ vectors[0]
+
+    selected: List[int] = []
+    used_tokens = 0
+    for i in np.argsort(-scores, kind="stable"):
+        tokens = estimate_tokens(chunks[i][1])
+        if used_tokens + tokens > token_budget:
+            continue
+        # Skip content that repeats an already selected chunk
+        if selected and float(np.max(vectors[1:][selected] @ vectors[1 + i])) >= CONTEXT_DEDUP_SIMILARITY:
+            continue
+        selected.append(int(i))
+        used_tokens += tokens
+
+    # Group the selected chunks by paper, keeping the papers' retrieval order
+    by_paper: Dict[str, List[str]] = {}
+    for i in sorted(selected):
+        paper, chunk = chunks[i]
+        by_paper.setdefault(paper.id, []).append(chunk)
+
+    blocks = []
+    references = {}
+    for paper in papers:
+        if paper.id not in by_paper:
+            continue
+        key = keys[paper.id]
+        references[key] = format_reference(paper)
+        excerpts = "\n".join(f"- {chunk}" for chunk in by_paper[paper.id])
+        blocks.append(f"[{key}] {paper.title}\n{excerpts}")
+
+    return "\n\n".join(blocks), references
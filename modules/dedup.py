@@ -0,0 +1,184 @@
+"""
+Module for collapsing duplicate papers before they are downloaded.
+
+Papers are grouped when they share an arXiv base ID (different versions of the
+same entry) or when MinHash/LSH finds near-identical titles and abstracts
+(cross-listings, lightly retitled preprints). One canonical paper is kept per
+group and the IDs of the others are recorded as its aliases.
+"""
+import os
+import re
+import random
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from modules.paper import Paper
+from modules.arxiv_search import base_arxiv_id
+
+# Estimated Jaccard similarity above which two papers are treated as duplicates
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.8))
+
+# MinHash signature length, split into LSH bands of equal size
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 32
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(1)
+_PERMUTATIONS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase text and reduce it to alphanumeric words separated by single spaces.
+    """
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+
+
+def shingles(paper: Paper) -> Set[int]:
+    """
+    Hash the word shingles of a paper's normalized title and abstract.
+
+    Args:
+        paper (Paper): Paper to shingle
+
+    Returns:
+        set: 64-bit hashes of the word n-grams
+    """
+    words = normalize_text(f"{paper.title} {paper.abstract}").split()
+    grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))]
+    return {int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big") for gram in grams}
+
+
+def minhash_signature(hashes: Set[int]) -> List[int]:
+    """
+    Compute the MinHash signature of a set of shingle hashes.
+    """
+    if not hashes:
+        return [_PRIME] * NUM_PERMUTATIONS
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def estimated_similarity(signature_a: List[int], signature_b: List[int]) -> float:
+    """
+    Estimate the Jaccard similarity of two sets from their MinHash signatures.
+    """
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
+
+
+def dedupe_papers(papers: List[Paper], threshold: float = DEDUP_THRESHOLD) -> List[Paper]:
+    """
+    Collapse versions and near-duplicates to one canonical paper per cluster.
+
+    The first paper of each cluster in the given order (normally the best-ranked
+    search result) is kept, and the IDs of the others are added to its aliases.
+
+    Args:
+        papers (List[Paper]): Papers in rank order
+        threshold (float): Minimum estimated Jaccard similarity for near-duplicates
+
+    Returns:
+        List[Paper]: Canonical papers in rank order
+    """
+    parent = list(range(len(papers)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            # Keep the better-ranked paper as the root
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    # Exact matches on the arXiv base ID
+    first_by_base_id: Dict[str, int] = {}
+    for i, paper in enumerate(papers):
+        base_id = base_arxiv_id(paper.id)
+        if base_id in first_by_base_id:
+            union(first_by_base_id[base_id], i)
+        else:
+            first_by_base_id[base_id] = i
+
+    # Near-duplicate candidates from LSH buckets, verified against the full signatures
+    signatures = [minhash_signature(shingles(paper)) for paper in papers]
+    rows = NUM_PERMUTATIONS // NUM_BANDS
+    for band in range(NUM_BANDS):
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            buckets[tuple(signature[band * rows:(band + 1) * rows])].append(i)
+        for members in buckets.values():
+            for position, i in enumerate(members):
+                for j in members[position + 1:]:
+                    if find(i) != find(j) and estimated_similarity(signatures[i], signatures[j]) >= threshold:
+                        union(i, j)
+
+    canonical = []
+    for i, paper in enumerate(papers):
+        root = find(i)
+        if root == i:
+            canonical.append(paper)
+        else:
+            root_paper = papers[root]
+            root_paper.aliases = (root_paper.aliases or []) + [paper.id] + (paper.aliases or [])
+
+    if len(canonical) < len(papers):
+        print(f"Collapsed {len(papers) - len(canonical)} duplicate papers into {len(canonical)} canonical papers")
+    return canonical
+
+
+class StreamingDeduper:
+    """
+    Collapse duplicates among papers that arrive one at a time.
+
+    The first paper of each cluster is canonical, as in dedupe_papers, and later
+    duplicates are recorded as its aliases.
+
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity for near-duplicates
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.by_base_id: Dict[str, Paper] = {}
+        self.buckets = defaultdict(list)
+        self.duplicates = 0
+
+    def add(self, paper: Paper) -> Paper:
+        """
+        Record a paper and find the canonical paper it belongs to.
+
+        Args:
+            paper (Paper): Next paper in rank order
+
+        Returns:
+            Paper: The paper itself if it is new, otherwise the earlier paper it duplicates
+        """
+        signature = minhash_signature(shingles(paper))
+        rows = NUM_PERMUTATIONS // NUM_BANDS
+        bands = [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(NUM_BANDS)]
+
+        canonical = self.by_base_id.get(base_arxiv_id(paper.id))
+        for band in bands:
+            if canonical is not None:
+                break
+            for other, other_signature in self.buckets[band]:
+                if estimated_similarity(signature, other_signature) >= self.threshold:
+                    canonical = other
+                    break
+
+        if canonical is not None:
+            # The same entry found again (e.g. by another query) is not an alias
+            if paper.id != canonical.id and paper.id not in (canonical.aliases or []):
+                canonical.aliases = (canonical.aliases or []) + [paper.id] + (paper.aliases or [])
+                self.duplicates += 1
+            return canonical
+
+        self.by_base_id[base_arxiv_id(paper.id)] = paper
+        for band in bands:
+            self.buckets[band].append((paper, signature))
+        return paper
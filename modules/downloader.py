@@ -0,0 +1,280 @@
+"""
+Module for downloading paper PDFs over pooled, resumable connections.
+
+One keep-alive session is shared by every download in the process, with a
+limit on concurrent downloads per host. Bytes are written to a ".part" file
+next to the target; a failed attempt is retried with backoff and resumes from
+the bytes already on disk with a Range request when the server supports it.
+Responses that are not PDFs, or are larger than the configured limit, are
+rejected instead of being passed on to upload and parsing.
+
+download_spooled() keeps the PDF in memory instead of a named file, so it can
+be parsed and uploaded without touching the disk. Files larger than the spool
+threshold, or arriving when the shared memory budget is used up, go to an
+anonymous temporary file instead, which bounds peak memory under concurrency.
+"""
+import os
+import time
+import tempfile
+import threading
+from typing import IO, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.tracing import span
+
+# Connect and read timeouts in seconds; the read timeout applies between chunks
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", 10))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", 60))
+
+# Retries after the first attempt, and the delay before the first retry (doubled on each further retry)
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", 3))
+DOWNLOAD_RETRY_DELAY = float(os.getenv("DOWNLOAD_RETRY_DELAY", 2))
+
+# Largest PDF accepted, and concurrent downloads allowed per host
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", 50 * 1024 * 1024))
+DOWNLOAD_MAX_PER_HOST = int(os.getenv("DOWNLOAD_MAX_PER_HOST", 4))
+
+# PDFs up to this size are kept in memory by download_spooled, within a budget shared by all downloads
+DOWNLOAD_SPOOL_MAX_BYTES = int(os.getenv("DOWNLOAD_SPOOL_MAX_BYTES", 16 * 1024 * 1024))
+DOWNLOAD_MEMORY_BUDGET = int(os.getenv("DOWNLOAD_MEMORY_BUDGET", 128 * 1024 * 1024))
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Content types accepted for PDFs; anything else (e.g. an HTML error page) is rejected
+PDF_CONTENT_TYPES = {"application/pdf", "application/x-pdf", "application/octet-stream"}
+
+# Status codes worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DownloadError(Exception):
+    """
+    A download that failed validation or ran out of retries.
+    """
+
+
+class MemoryBudget:
+    """
+    Bytes of memory shared by concurrent in-memory downloads.
+    """
+
+    def __init__(self, total: int):
+        self.available = total
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        """
+        Reserve memory if enough is left, without waiting.
+        """
+        with self._lock:
+            if size > self.available:
+                return False
+            self.available -= size
+            return True
+
+    def release(self, size: int) -> None:
+        with self._lock:
+            self.available += size
+
+
+class _BudgetedSpool(tempfile.SpooledTemporaryFile):
+    """
+    Spooled file that holds a memory reservation until it moves to disk or is closed.
+    """
+
+    def __init__(self, max_size: int, budget: MemoryBudget):
+        super().__init__(max_size=max_size)
+        self._budget = budget
+        self._reserved = max_size
+
+    @property
+    def in_memory(self) -> bool:
+        return not self._rolled
+
+    def _release(self) -> None:
+        if self._reserved:
+            self._budget.release(self._reserved)
+            self._reserved = 0
+
+    def rollover(self) -> None:
+        super().rollover()
+        self._release()
+
+    def close(self) -> None:
+        super().close()
+        self._release()
+
+    def __exit__(self, exc, value, tb):
+        # SpooledTemporaryFile.__exit__ closes the underlying file without calling close()
+        self.close()
+
+
+class Downloader:
+    """
+    Downloads files over a shared connection pool with resume and retries.
+
+    Args:
+        max_per_host (int): Concurrent downloads allowed per host
+        retries (int): Retries after the first attempt
+        retry_delay (float): Seconds before the first retry, doubled on each further retry
+        max_bytes (int): Largest response accepted
+        spool_max_bytes (int): Largest download kept in memory by download_spooled
+        memory_budget (int): Memory shared by all in-memory downloads
+    """
+
+    def __init__(self, max_per_host: int = DOWNLOAD_MAX_PER_HOST, retries: int = DOWNLOAD_RETRIES,
+                 retry_delay: float = DOWNLOAD_RETRY_DELAY, max_bytes: int = DOWNLOAD_MAX_BYTES,
+                 spool_max_bytes: int = DOWNLOAD_SPOOL_MAX_BYTES, memory_budget: int = DOWNLOAD_MEMORY_BUDGET):
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_bytes = max_bytes
+        self.spool_max_bytes = spool_max_bytes
+        self.memory = MemoryBudget(memory_budget)
+        self.timeout = (DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(max_per_host, 1) * 2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._hosts_lock = threading.Lock()
+        self._host_slots: Dict[str, threading.Semaphore] = {}
+
+    def _slots(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._hosts_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def download(self, url: str, path: str) -> int:
+        """
+        Download a PDF to a path, resuming a partial download left by an earlier attempt.
+
+        Args:
+            url (str): URL of the PDF
+            path (str): Where to save it
+
+        Returns:
+            int: Size of the downloaded file in bytes
+        """
+        part_path = f"{path}.part"
+        try:
+            with open(part_path, "a+b") as f:
+                size = self.download_to(url, f)
+        except DownloadError:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        os.replace(part_path, path)
+        return size
+
+    def download_spooled(self, url: str) -> IO[bytes]:
+        """
+        Download a PDF into memory, or into an anonymous temporary file if it is
+        large or the memory budget is used up.
+
+        Args:
+            url (str): URL of the PDF
+
+        Returns:
+            file: Seekable binary file positioned at the start; the caller must close it
+        """
+        if self.memory.reserve(self.spool_max_bytes):
+            buffer = _BudgetedSpool(self.spool_max_bytes, self.memory)
+        else:
+            buffer = tempfile.TemporaryFile()
+        try:
+            self.download_to(url, buffer)
+        except BaseException:
+            buffer.close()
+            raise
+        buffer.seek(0)
+        return buffer
+
+    def download_to(self, url: str, f: IO[bytes]) -> int:
+        """
+        Download a PDF into a seekable binary file, resuming after the bytes it already holds.
+
+        Args:
+            url (str): URL of the PDF
+            f (file): File to append to; it is truncated if the server can't resume
+
+        Returns:
+            int: Size of the file in bytes
+        """
+        with self._slots(url), span("http_get", "download", url=url) as details:
+            for attempt in range(self.retries + 1):
+                details["attempts"] = attempt + 1
+                try:
+                    return self._attempt(url, f)
+                except requests.RequestException as e:
+                    retry_after = _retry_after(e)
+                    if attempt == self.retries:
+                        raise DownloadError(f"Download of {url} failed after {attempt + 1} attempts: {e}") from e
+                    delay = retry_after if retry_after is not None else self.retry_delay * 2 ** attempt
+                    print(f"  Download of {url} failed ({e}), retrying in {delay:.0f}s")
+                    time.sleep(delay)
+
+    def _attempt(self, url: str, f: IO[bytes]) -> int:
+        offset = f.seek(0, os.SEEK_END)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(url, stream=True, timeout=self.timeout, headers=headers) as response:
+            if response.status_code == 416:
+                # The partial file doesn't match the server's copy; start over
+                f.seek(0)
+                f.truncate()
+                return self._attempt(url, f)
+            response.raise_for_status()
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type and content_type not in PDF_CONTENT_TYPES:
+                raise DownloadError(f"Expected a PDF from {url}, got {content_type}")
+
+            # Servers that ignore Range send the whole file again
+            if response.status_code != 206:
+                offset = 0
+                f.seek(0)
+                f.truncate()
+            length = response.headers.get("Content-Length")
+            if length is not None and offset + int(length) > self.max_bytes:
+                raise DownloadError(f"{url} is larger than {self.max_bytes} bytes")
+
+            size = offset
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise DownloadError(f"{url} is larger than {self.max_bytes} bytes")
+                f.write(chunk)
+            f.flush()
+
+        f.seek(0)
+        header = f.read(5)
+        f.seek(0, os.SEEK_END)
+        if header != b"%PDF-":
+            raise DownloadError(f"Response from {url} is not a PDF")
+        return size
+
+
+def _retry_after(error: requests.RequestException) -> Optional[float]:
+    """
+    Get the delay a server asked for on a retryable error, or raise if the error is not retryable.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    if response.status_code not in RETRY_STATUSES:
+        raise DownloadError(f"Download of {response.url} failed: {error}") from error
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Shared by every download in the process so connections are reused
+downloader = Downloader()
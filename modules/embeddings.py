@@ -0,0 +1,86 @@
+"""
+Module for embedding text with the configured LlamaIndex embedding model.
+"""
+import hashlib
+import threading
+from typing import Dict, List
+
+import numpy as np
+from llama_index.core import Settings
+
+# Embeddings are cached by text hash, since the same chunks recur across sections
+_cache: Dict[str, np.ndarray] = {}
+_cache_lock = threading.Lock()
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts and return unit-length vectors, one row per text.
+
+    Args:
+        texts (List[str]): Texts to embed
+
+    Returns:
+        np.ndarray: Matrix of normalized embeddings with shape (len(texts), dim)
+    """
+    keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    with _cache_lock:
+        missing = list({key: text for key, text in zip(keys, texts) if key not in _cache}.items())
+
+    if missing:
+        vectors = np.asarray(Settings.embed_model.get_text_embedding_batch([text for _, text in missing]), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with _cache_lock:
+            for (key, _), vector in zip(missing, vectors):
+                _cache[key] = vector
+
+    with _cache_lock:
+        return np.stack([_cache[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens in a text (roughly four characters per token).
+    """
+    return len(text) // 4 + 1
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 50, seed: int = 0) -> np.ndarray:
+    """
+    Cluster vectors with k-means (k-means++ initialization, vectorized updates).
+
+    Args:
+        vectors (np.ndarray): Matrix with one vector per row
+        k (int): Number of clusters
+        iterations (int): Maximum number of refinement iterations
+        seed (int): Random seed, so the same inputs give the same clusters
+
+    Returns:
+        np.ndarray: Cluster label for each row
+    """
+    n = len(vectors)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # k-means++: pick each new center with probability proportional to squared distance
+    centers = [vectors[rng.integers(n)]]
+    for _ in range(1, k):
+        distances = np.min(((vectors[:, None, :] - np.array(centers)[None, :, :]) ** 2).sum(axis=2), axis=1)
+        total = distances.sum()
+        probabilities = distances / total if total > 0 else np.full(n, 1 / n)
+        centers.append(vectors[rng.choice(n, p=probabilities)])
+    centers = np.array(centers)
+
+    labels = np.zeros(n, dtype=int)
+    for iteration in range(iterations):
+        distances = ((vectors[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = vectors[labels == cluster]
+            if len(members):
+                centers[cluster] = members.mean(axis=0)
+    return labels
@@ -1,8 +1,14 @@
 import json
-from typing import Dict, Any, List
+import hashlib
+from typing import Dict, Any, List, Optional
 from modules.paper import Paper
+from modules.progress import emit
+from modules.tracing import span
 from datetime import datetime
-from modules.rag import write_lit_review_section
+from modules.rag import (write_lit_review_section, query_papers, build_section_prompt, build_synthesis_prompts,
+                        write_hierarchical_section, needs_hierarchy, hierarchical_models, SECTION_TOP_K)
+from modules.ai_analyzer import router
+from modules.embeddings import estimate_tokens
 
 import os
 import dotenv
@@ -12,69 +18,134 @@ from llama_index.core import VectorStoreIndex, Document
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.retrievers import VectorIndexRetriever
 
-def generate_text_for_question(question: str, index: VectorStoreIndex) -> str:
+def section_input_hash(prompt: str, model: str) -> str:
+    """
+    Hash everything that determines the text of a section: model and full prompt.
+    
+    Args:
+        prompt (str): The section prompt, including the retrieved paper content
+        model (str): The model, or comma-separated models, routed for the section
+        
+    Returns:
+        str: Hex digest identifying the section inputs
+    """
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+def collect_sections(report: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Collect every section with generated text from a report, keyed by question.
+    
+    Args:
+        report (Dict): A report produced by generate_full_report, or None
+        
+    Returns:
+        Dict: Mapping of section questions to sections
+    """
+    sections = {}
+    if not report:
+        return sections
+    if "question" in report and "text" in report:
+        sections[report["question"]] = report
+    for section in report.get("sections", []) or []:
+        sections.update(collect_sections(section))
+    return sections
+
+def generate_text_for_question(question: str, index: VectorStoreIndex,
+                               previous_sections: Optional[Dict[str, Dict[str, Any]]] = None,
+                               paper_ids: Optional[List[str]] = None) -> Dict[str, Any]:
     """
     Generate text content that answers the given question using information 
-    from the provided papers.
+    from the indexed papers, reusing the previous text if its inputs are unchanged.
+    
+    Sections backed by more papers than fit in one prompt are written
+    hierarchically from parallel syntheses of groups of papers.
     
     Args:
         question (str): The question to be addressed
-        relevant_papers (List[Paper]): List of Paper objects to use as sources
+        index (VectorStoreIndex): Index of the relevant papers
+        previous_sections (Dict): Sections of a previous report, keyed by question
+        paper_ids (List[str]): Papers assigned to the section by the outline, retrieved if None
         
     Returns:
-        str: Generated text addressing the question
+        Dict: Generated text, cited references, paper IDs used and the hash of the section inputs
     """
-    # TODO: Implement the actual text generation using AI
+    indexed_papers = index.extra_info.get("papers", {})
+    papers = [indexed_papers[paper_id] for paper_id in paper_ids or [] if paper_id in indexed_papers]
+    if not papers:
+        papers = query_papers(index, question, top_k=SECTION_TOP_K)
 
-    # This might involve calling a language model, extracting relevant info from papers, etc.
+    hierarchical = needs_hierarchy(papers)
+    if hierarchical:
+        prompts, references = build_synthesis_prompts(question, papers)
+        input_hash = section_input_hash("\n".join(prompts), ",".join(hierarchical_models()))
+    else:
+        prompt, references = build_section_prompt(question, papers)
+        input_hash = section_input_hash(prompt, router.model_for("section", estimate_tokens(prompt)))
 
-    section = write_lit_review_section(index, question)
+    previous = (previous_sections or {}).get(question)
+    if previous and previous.get("input_hash") == input_hash:
+        print(f"Reusing unchanged section for: {question}")
+        text = previous["text"]
+    elif hierarchical:
+        text = write_hierarchical_section(question, prompts)
+    else:
+        text = write_lit_review_section(index, question, prompt=prompt)
 
-    return section
+    return {
+        "text": text,
+        "references": references,
+        "paper_ids": [paper.id for paper in papers],
+        "input_hash": input_hash
+    }
 
-def process_section(section: Dict[Any, Any], index: VectorStoreIndex) -> None:
+def process_section(section: Dict[Any, Any], index: VectorStoreIndex,
+                    previous_sections: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
     """
     Recursively process each section in the outline, adding text content
     wherever a question field exists.
     
     Args:
         section (Dict): A section from the outline
-        relevant_papers (List[Paper]): List of Paper objects to use as sources
+        index (VectorStoreIndex): Index of the relevant papers
+        previous_sections (Dict): Sections of a previous report, keyed by question
     """
     # If the section has a question, generate text for it
     if "question" in section:
-        section["text"] = generate_text_for_question(section["question"], index)
+        with span("write_section", "report", title=section.get("title")) as details:
+            section.update(generate_text_for_question(section["question"], index, previous_sections,
+                                                      paper_ids=section.get("paper_ids")))
+            details["papers"] = len(section["paper_ids"])
+        emit("section_written", title=section.get("title"), question=section["question"], text=section["text"])
     
     # Process any subsections recursively
     if "sections" in section and isinstance(section["sections"], list):
         for subsection in section["sections"]:
-            process_section(subsection, index)
+            process_section(subsection, index, previous_sections)
 
-def generate_full_report(outline: Dict[str, Any], index: VectorStoreIndex) -> Dict[str, Any]:
+def generate_full_report(outline: Dict[str, Any], index: VectorStoreIndex,
+                         previous_report: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Process an outline from outline_generator and add text content for each section
     with a question.
     
+    Each section records the IDs of the papers it was written from and a hash of
+    its inputs. When a previous report is given, sections whose inputs are
+    unchanged keep their previous text instead of being regenerated.
+    
     Args:
         outline (Dict): The outline generated by outline_generator
-        relevant_papers (List[Paper]): List of Paper objects to use as sources
+        index (VectorStoreIndex): Index of the relevant papers
+        previous_report (Dict): A report previously generated from the same outline
         
     Returns:
         Dict: The enhanced outline with generated text content
     """
     # Create a deep copy of the outline to avoid modifying the original
     enhanced_outline = json.loads(json.dumps(outline))
+    previous_sections = collect_sections(previous_report)
     
-    # Process the top level
-    if "question" in enhanced_outline:
-        enhanced_outline["text"] = generate_text_for_question(
-            enhanced_outline["question"], index
-        )
-    
-    # Process each section
-    if "sections" in enhanced_outline and isinstance(enhanced_outline["sections"], list):
-        for section in enhanced_outline["sections"]:
-            process_section(section, index)
+    # Process the top level and each section
+    process_section(enhanced_outline, index, previous_sections)
     
     return enhanced_outline
 
@@ -0,0 +1,202 @@
+"""
+Module for choosing the Gemini model that handles each kind of request.
+
+Call sites name their task ("screen", "section", ...) instead of a model. The
+routing table maps each task to a model, an optional stronger model to
+escalate to, and a prompt size above which requests go straight to the
+stronger model. Screening runs on a lite model and is only repeated on the
+stronger one for low-confidence or unparseable verdicts. Every call is timed
+and its tokens counted per task and model, so the table can be tuned from
+real runs.
+"""
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from modules.embeddings import estimate_tokens
+
+# Model tiers used by the default routes
+GEMINI_LITE_MODEL = os.getenv("GEMINI_LITE_MODEL", "gemini-2.0-flash-lite")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_STRONG_MODEL = os.getenv("GEMINI_STRONG_MODEL", "gemini-2.5-flash")
+
+# Screening verdicts with a lower confidence are repeated on the escalation model
+ROUTE_ESCALATION_CONFIDENCE = float(os.getenv("ROUTE_ESCALATION_CONFIDENCE", 0.7))
+# Prompts estimated above this many tokens go straight to the escalation model
+ROUTE_LONG_CONTEXT_TOKENS = int(os.getenv("ROUTE_LONG_CONTEXT_TOKENS", 32000))
+
+# JSON object overriding routes, inline or as a path to a JSON file,
+# e.g. {"screen": {"model": "gemini-2.0-flash", "escalate_to": null}}
+MODEL_ROUTES = os.getenv("MODEL_ROUTES", "")
+
+
+@dataclass
+class Route:
+    """
+    How requests for one task are routed.
+    """
+    model: str
+    escalate_to: Optional[str] = None
+    long_context_tokens: Optional[int] = None
+
+
+DEFAULT_ROUTES = {
+    "criteria": Route(GEMINI_MODEL),
+    "queries": Route(GEMINI_MODEL),
+    "screen": Route(GEMINI_LITE_MODEL, escalate_to=GEMINI_MODEL),
+    "extract": Route(GEMINI_MODEL),
+    "cluster_summary": Route(GEMINI_LITE_MODEL),
+    "outline": Route(GEMINI_MODEL),
+    "synthesis": Route(GEMINI_MODEL),
+    "merge": Route(GEMINI_MODEL, escalate_to=GEMINI_STRONG_MODEL, long_context_tokens=ROUTE_LONG_CONTEXT_TOKENS),
+    "section": Route(GEMINI_MODEL, escalate_to=GEMINI_STRONG_MODEL, long_context_tokens=ROUTE_LONG_CONTEXT_TOKENS),
+    "compile": Route(GEMINI_MODEL, escalate_to=GEMINI_STRONG_MODEL, long_context_tokens=ROUTE_LONG_CONTEXT_TOKENS),
+}
+
+
+def load_routes(overrides: str = MODEL_ROUTES) -> Dict[str, Route]:
+    """
+    Get the default routing table with any configured overrides applied.
+
+    Args:
+        overrides (str): JSON object of task -> route fields, or a path to a JSON file
+
+    Returns:
+        dict: Mapping of task names to routes
+    """
+    routes = dict(DEFAULT_ROUTES)
+    if not overrides:
+        return routes
+    if os.path.exists(overrides):
+        with open(overrides) as f:
+            overrides = f.read()
+    for task, fields in json.loads(overrides).items():
+        base = asdict(routes.get(task, Route(GEMINI_MODEL)))
+        routes[task] = Route(**{**base, **fields})
+    return routes
+
+
+def contents_tokens(contents: List[Dict[str, Any]]) -> int:
+    """
+    Estimate the prompt tokens of the text parts of a request (attached files are not counted).
+    """
+    return sum(estimate_tokens(part["text"]) for part in contents if isinstance(part, dict) and "text" in part)
+
+
+def is_low_confidence(result: Dict[str, Any], threshold: float = ROUTE_ESCALATION_CONFIDENCE) -> bool:
+    """
+    Check whether a screening result reports a confidence below the threshold.
+    """
+    try:
+        return float(result.get("confidence", 1.0)) < threshold
+    except (TypeError, ValueError):
+        return True
+
+
+class ModelRouter:
+    """
+    Sends requests to the model routed for their task and records per-route stats.
+
+    Args:
+        client: The Gemini client
+        routes (dict): Routing table, the configured table by default
+    """
+
+    def __init__(self, client, routes: Optional[Dict[str, Route]] = None):
+        self.client = client
+        self.routes = routes or load_routes()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def route(self, task: str) -> Route:
+        return self.routes.get(task) or Route(GEMINI_MODEL)
+
+    def can_escalate(self, task: str) -> bool:
+        return self.route(task).escalate_to is not None
+
+    def model_for(self, task: str, prompt_tokens: Optional[int] = None, escalate: bool = False) -> str:
+        """
+        Choose the model for a request.
+
+        Args:
+            task (str): Task name from the routing table
+            prompt_tokens (int): Estimated prompt size, if known
+            escalate (bool): Whether the request is a retry of a low-confidence answer
+
+        Returns:
+            str: Model name
+        """
+        route = self.route(task)
+        if route.escalate_to:
+            long_context = (route.long_context_tokens is not None and prompt_tokens is not None
+                            and prompt_tokens > route.long_context_tokens)
+            if escalate or long_context:
+                return route.escalate_to
+        return route.model
+
+    def generate(self, task: str, contents: List[Dict[str, Any]], escalate: bool = False,
+                 model: Optional[str] = None, **kwargs):
+        """
+        Generate content with the model routed for a task.
+
+        Args:
+            task (str): Task name from the routing table
+            contents (list): Request content parts
+            escalate (bool): Use the task's escalation model
+            model (str): Model to use instead of the routed one
+            **kwargs: Further generate_content arguments, e.g. config
+
+        Returns:
+            The generate_content response
+        """
+        model = model or self.model_for(task, contents_tokens(contents), escalate)
+        started = time.perf_counter()
+        try:
+            response = self.client.models.generate_content(model=model, contents=contents, **kwargs)
+        except Exception:
+            self._record(task, model, time.perf_counter() - started, None, escalate, error=True)
+            raise
+        self._record(task, model, time.perf_counter() - started, response, escalate)
+        return response
+
+    def _record(self, task: str, model: str, seconds: float, response: Any, escalated: bool,
+                error: bool = False) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        with self._lock:
+            stats = self._stats.setdefault(f"{task}/{model}", {
+                "task": task, "model": model, "calls": 0, "escalations": 0, "errors": 0,
+                "seconds": 0.0, "prompt_tokens": 0, "output_tokens": 0
+            })
+            stats["calls"] += 1
+            stats["escalations"] += int(escalated)
+            stats["errors"] += int(error)
+            stats["seconds"] += seconds
+            stats["prompt_tokens"] += getattr(usage, "prompt_token_count", None) or 0
+            stats["output_tokens"] += getattr(usage, "candidates_token_count", None) or 0
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        Get call counts, latency and token totals for each task and model used so far.
+        """
+        with self._lock:
+            rows = [dict(stats) for stats in self._stats.values()]
+        for row in rows:
+            row["avg_seconds"] = round(row["seconds"] / row["calls"], 3) if row["calls"] else 0.0
+            row["seconds"] = round(row["seconds"], 3)
+        return sorted(rows, key=lambda row: (row["task"], row["model"]))
+
+    def report(self) -> List[Dict[str, Any]]:
+        """
+        Print and return the per-route stats.
+        """
+        rows = self.stats()
+        if rows:
+            print("Model usage by route:")
+        for row in rows:
+            print(f"  {row['task']:<16} {row['model']:<24} {row['calls']:>5} calls "
+                  f"({row['escalations']} escalated, {row['errors']} failed), "
+                  f"{row['avg_seconds']:.2f}s avg, {row['prompt_tokens']} in / {row['output_tokens']} out tokens")
+        return rows
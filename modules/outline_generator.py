@@ -1,8 +1,11 @@
 import os
+import math
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
 import json
 import re
 from typing import Dict, List
+import numpy as np
 from modules.paper import Paper
 
 """
@@ -10,7 +13,13 @@ Module for generating literature review outlines using Google's Gemini AI.
 """
 
 # Configure the Gemini API
-from modules.ai_analyzer import client
+from modules.ai_analyzer import router
+from modules.embeddings import embed_texts, kmeans
+
+# Above this many papers, the outline is built from cluster summaries
+OUTLINE_CLUSTER_THRESHOLD = int(os.getenv("OUTLINE_CLUSTER_THRESHOLD", 30))
+OUTLINE_MAX_CLUSTERS = int(os.getenv("OUTLINE_MAX_CLUSTERS", 12))
+OUTLINE_CONCURRENCY = int(os.getenv("OUTLINE_CONCURRENCY", 4))
 
 def clean_json(json_str):
     """
@@ -28,6 +37,40 @@ def clean_json(json_str):
     json_str = re.sub(r',\s*]', ']', json_str)
     return json_str
 
+def parse_outline_response(content: str, research_question: str) -> Dict:
+    """
+    Parse the JSON outline from a model response, falling back to an empty outline.
+    
+    Args:
+        content (str): Raw text of the model response
+        research_question (str): The main research question, used for the fallback title
+        
+    Returns:
+        dict: JSON structured outline
+    """
+    # Find JSON block if it's embedded in markdown
+    if "```json" in content:
+        json_content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        json_content = content.split("```")[1].strip()
+    else:
+        json_content = content
+    
+    # Clean the JSON before parsing
+    cleaned_json = clean_json(json_content)
+        
+    # Parse the JSON
+    try:
+        return json.loads(cleaned_json)
+    except json.JSONDecodeError as e:
+        print(f"Error parsing JSON: {e}")
+        print(f"Cleaned JSON was: {cleaned_json}")
+        # Fallback to a simple structure
+        return {
+            "title": f"Literature Review on {research_question}",
+            "sections": []
+        }
+
 def generate_outline(research_question: str, papers: List[Paper], max_sections=5):
     """
     Generate a structured outline for a literature review based on relevant papers.
@@ -82,40 +125,130 @@ def generate_outline(research_question: str, papers: List[Paper], max_sections=5
     
     try:
         # Generate content with the prompt
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[{"text": prompt}]
-        )
+        response = router.generate("outline", [{"text": prompt}])
         
         # Extract the JSON response
         content = response.text
         print(content)
         
-        # Find JSON block if it's embedded in markdown
-        if "```json" in content:
-            json_content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            json_content = content.split("```")[1].strip()
-        else:
-            json_content = content
+        return parse_outline_response(content, research_question)
+    
+    except Exception as e:
+        print(f"Error generating outline: {e}")
+        return {
+            "error": str(e),
+            "title": f"Literature Review on {research_question}",
+            "sections": [],
+            "conclusion": "Error generating outline"
+        }
+
+def summarize_cluster(research_question: str, papers: List[Paper]) -> str:
+    """
+    Summarize the common theme of a cluster of papers.
+    
+    Args:
+        research_question (str): The main research question
+        papers (List[Paper]): Papers in the cluster
         
-        # Clean the JSON before parsing
-        cleaned_json = clean_json(json_content)
-            
-        # Parse the JSON
-        try:
-            outline = json.loads(cleaned_json)
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
-            print(f"Cleaned JSON was: {cleaned_json}")
-            # Fallback to a simple structure
-            outline = {
-                "title": f"Literature Review on {research_question}",
-                "sections": []
-            }
+    Returns:
+        str: Short summary of what the cluster covers
+    """
+    sources_list = "\n".join([f"- {paper.title}: {(paper.summary or paper.abstract)[:300]}" for paper in papers])
+    prompt = f"""
+    You are an expert academic researcher organizing sources for a literature review on: "{research_question}".
+    
+    The following papers were grouped together because their content is similar:
+    {sources_list}
+    
+    In at most 120 words, describe the common theme of this group, the main approaches it covers,
+    and how it relates to the research question. Respond with plain text only.
+    """
+    try:
+        response = router.generate("cluster_summary", [{"text": prompt}])
+        return response.text.strip()
+    except Exception as e:
+        print(f"Error summarizing cluster: {e}")
+        return "; ".join(paper.title for paper in papers[:10])
+
+def paper_embedding_text(paper: Paper) -> str:
+    return f"{paper.title}\n{paper.summary or paper.abstract}"
+
+def generate_clustered_outline(research_question: str, papers: List[Paper], max_sections=5, num_clusters=None):
+    """
+    Generate an outline for a large set of papers by clustering them first.
+    
+    Paper embeddings are clustered locally with k-means, each cluster is summarized
+    in parallel, and the outline is built from the cluster summaries. Every section
+    lists the IDs of the papers in the clusters it covers under "paper_ids".
+    
+    Args:
+        research_question (str): The main research question
+        papers (List[Paper]): List of Paper objects
+        max_sections (int): Maximum number of main sections to include
+        num_clusters (int): Number of clusters, chosen from the number of papers if None
         
-        return outline
+    Returns:
+        dict: JSON structured outline for the literature review
+    """
+    if num_clusters is None:
+        num_clusters = min(OUTLINE_MAX_CLUSTERS, max(2, round(math.sqrt(len(papers) / 2))))
+    
+    vectors = embed_texts([paper_embedding_text(paper) for paper in papers])
+    labels = kmeans(vectors, num_clusters)
+    clusters = [[paper for paper, label in zip(papers, labels) if label == cluster] for cluster in range(num_clusters)]
+    clusters = [members for members in clusters if members]
+    print(f"Grouped {len(papers)} papers into {len(clusters)} clusters")
+    
+    # Summarize the clusters in parallel
+    with ThreadPoolExecutor(max_workers=OUTLINE_CONCURRENCY) as executor:
+        summaries = list(executor.map(lambda members: summarize_cluster(research_question, members), clusters))
+    
+    clusters_list = "\n".join([f"- Cluster {i + 1} ({len(members)} papers): {summary}"
+                               for i, (members, summary) in enumerate(zip(clusters, summaries))])
+    
+    prompt = f"""
+    You are an expert academic researcher tasked with organizing a literature review outline.
+    
+    Research Question: "{research_question}"
+    
+    The available sources have been grouped into thematic clusters:
+    {clusters_list}
+    
+    Create a structured outline for a literature review addressing this research question.
+    Organize the literature into logical sections (maximum {max_sections} main sections).
+    Every cluster should be covered by at least one section.
+
+    Each layer should have a title. If there is meant to be top-level text for a layer, include a question
+    and the numbers of the clusters it draws on in a "clusters" field.
+    If there are subsections, include them in the sections field. Do not include any other fields.
+    
+    Return your response as a valid JSON object with this structure:
+    {{
+        "title": "Literature Review on [topic]",
+        "sections": [
+            {{
+                "title": "Section Title",
+                "question": "Question encapsulating what this section is supposed to cover.",
+                "clusters": [1, 2],
+                "sections": [
+                    {{
+                        "title": "Subsection Title",
+                        "question": "Question encapsulating what this section is supposed to cover.",
+                        "clusters": [2]
+                    }}
+                ]
+            }}
+        ]
+    }}
+    
+    IMPORTANT: Ensure your JSON is valid with no trailing commas.
+    """
     
+    try:
+        response = router.generate("outline", [{"text": prompt}])
+        content = response.text
+        print(content)
+        outline = parse_outline_response(content, research_question)
     except Exception as e:
         print(f"Error generating outline: {e}")
         return {
@@ -124,6 +257,71 @@ def generate_outline(research_question: str, papers: List[Paper], max_sections=5
             "sections": [],
             "conclusion": "Error generating outline"
         }
+    
+    link_cluster_papers(outline, clusters)
+    return outline
+
+def link_cluster_papers(section: Dict, clusters: List[List[Paper]]) -> None:
+    """
+    Replace the cluster numbers of each section with the IDs of the member papers.
+    
+    Args:
+        section (dict): An outline or section with optional "clusters" and "sections" fields
+        clusters (List[List[Paper]]): Papers in each cluster, numbered from 1
+    """
+    if "clusters" in section:
+        paper_ids = []
+        for number in section.pop("clusters") or []:
+            if isinstance(number, int) and 1 <= number <= len(clusters):
+                paper_ids.extend(paper.id for paper in clusters[number - 1])
+        section["paper_ids"] = paper_ids
+    for subsection in section.get("sections", []) or []:
+        link_cluster_papers(subsection, clusters)
+
+def outline_sections_with_papers(section: Dict) -> List[Dict]:
+    """
+    Collect every section of an outline that lists its papers under "paper_ids".
+    """
+    sections = [section] if section.get("paper_ids") else []
+    for subsection in section.get("sections", []) or []:
+        sections.extend(outline_sections_with_papers(subsection))
+    return sections
+
+def assign_new_papers(outline: Dict, papers: List[Paper], new_papers: List[Paper]) -> Dict:
+    """
+    Add newly included papers to the nearest section of a clustered outline.
+    
+    Each section's position is the mean embedding of the papers it lists; every
+    new paper is added to the paper_ids of the section it is most similar to.
+    Outlines without paper_ids retrieve papers per section and are returned unchanged.
+    
+    Args:
+        outline (dict): Outline whose sections may list "paper_ids"
+        papers (List[Paper]): Papers the outline's sections were built from
+        new_papers (List[Paper]): Newly included papers to place
+        
+    Returns:
+        dict: A copy of the outline with the new papers assigned
+    """
+    outline = json.loads(json.dumps(outline))
+    sections = outline_sections_with_papers(outline)
+    by_id = {paper.id: paper for paper in papers}
+    sections = [section for section in sections if any(paper_id in by_id for paper_id in section["paper_ids"])]
+    if not sections or not new_papers:
+        return outline
+    
+    centroids = []
+    for section in sections:
+        members = [by_id[paper_id] for paper_id in section["paper_ids"] if paper_id in by_id]
+        centroid = embed_texts([paper_embedding_text(paper) for paper in members]).mean(axis=0)
+        centroids.append(centroid / (np.linalg.norm(centroid) or 1))
+    
+    similarities = embed_texts([paper_embedding_text(paper) for paper in new_papers]) @ np.array(centroids).T
+    for paper, nearest in zip(new_papers, similarities.argmax(axis=1)):
+        if paper.id not in sections[nearest]["paper_ids"]:
+            sections[nearest]["paper_ids"].append(paper.id)
+            print(f"Assigned {paper.id} to section: {sections[nearest].get('title')}")
+    return outline
 
 def generate_literature_review_outline(research_question: str, relevant_papers: List[Paper], topic_keywords: List[str] = None):
     """
@@ -147,6 +345,10 @@ def generate_literature_review_outline(research_question: str, relevant_papers:
         print("Warning: No relevant papers found. Using all provided papers.")
         filtered_papers = relevant_papers
     
+    # Large sets are clustered first so the prompt stays bounded
+    if len(filtered_papers) > OUTLINE_CLUSTER_THRESHOLD:
+        return generate_clustered_outline(research_question, filtered_papers)
+    
     # Generate the outline
     try:
         outline = generate_outline(research_question, filtered_papers)
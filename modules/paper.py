@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
 
 """
@@ -28,6 +28,7 @@ class Paper:
     uploaded: bool = False
     file_uri: Optional[str] = None
     mime_type: str = "application/pdf"
+    sections: Optional[Dict[str, str]] = None  # Locally extracted section text
     
     # AI analysis results
     is_relevant: Optional[bool] = None
@@ -39,6 +40,7 @@ class Paper:
     citation_count: Optional[int] = None
     references: Optional[List[str]] = None
     tags: Optional[List[str]] = None
+    aliases: Optional[List[str]] = None  # IDs of duplicate versions collapsed into this paper
 
     bibtex: Optional[str] = None
     
@@ -65,6 +67,45 @@ class Paper:
             categories=paper.categories
         )
     
+    @classmethod
+    def from_feed_entry(cls, entry):
+        """
+        Create a Paper object from an arXiv API Atom entry parsed by feedparser.
+        
+        Args:
+            entry: A feedparser entry from an arXiv API response
+            
+        Returns:
+            Paper: A Paper object with metadata from the entry
+        """
+        pdf_url = next((link.href for link in entry.get("links", []) if link.get("title") == "pdf"), None)
+        return cls(
+            id=entry.id.split("/abs/")[-1],
+            title=" ".join(entry.title.split()),
+            authors=[author.name for author in entry.get("authors", [])],
+            abstract=entry.summary,
+            published_date=datetime(*entry.published_parsed[:6], tzinfo=timezone.utc),
+            pdf_url=pdf_url,
+            entry_id=entry.id,
+            categories=[tag["term"] for tag in entry.get("tags", [])]
+        )
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """
+        Create a Paper object from a dictionary produced by to_dict.
+        
+        Args:
+            data (Dict[str, Any]): Dictionary representation of a Paper
+            
+        Returns:
+            Paper: The reconstructed Paper object
+        """
+        data = dict(data)
+        if isinstance(data.get("published_date"), str):
+            data["published_date"] = datetime.fromisoformat(data["published_date"])
+        return cls(**data)
+    
     def to_dict(self) -> Dict[str, Any]:
         """
         Convert the Paper object to a dictionary.
@@ -2,17 +2,85 @@
 Module for processing arXiv papers using Google's file API.
 """
 import os
-import requests
-import tempfile
 from google import genai
 import time
-from typing import List, Dict, Any
+from typing import IO, List, Dict, Any, Union
 
 from modules.paper import Paper
+from modules.pdf_text import SectionParser
+from modules.progress import emit
+from modules.tracing import span
+from modules.downloader import downloader
+
+def download_paper(paper: Paper, temp_dir: str) -> str:
+    """
+    Download a paper's PDF into a directory.
+    
+    Args:
+        paper (Paper): Paper to download
+        temp_dir (str): Directory to save the PDF in
+        
+    Returns:
+        str: Path of the downloaded PDF
+    """
+    temp_file_path = os.path.join(temp_dir, f"{paper.id.replace('/', '_')}.pdf")
+    print(f"  Downloading from {paper.pdf_url}")
+    with span("download", "paper", paper_id=paper.id) as details:
+        details["bytes"] = downloader.download(paper.pdf_url, temp_file_path)
+    return temp_file_path
+
+def download_paper_buffer(paper: Paper) -> IO[bytes]:
+    """
+    Download a paper's PDF into memory, spilling to an anonymous temporary file if it is large.
+    
+    Args:
+        paper (Paper): Paper to download
+        
+    Returns:
+        file: Seekable binary file positioned at the start; the caller must close it
+    """
+    print(f"  Downloading from {paper.pdf_url}")
+    with span("download", "paper", paper_id=paper.id) as details:
+        buffer = downloader.download_spooled(paper.pdf_url)
+        details["bytes"] = buffer.seek(0, os.SEEK_END)
+        buffer.seek(0)
+    return buffer
+
+def upload_paper(paper: Paper, pdf: Union[str, IO[bytes]], client) -> Paper:
+    """
+    Upload a downloaded PDF to Google AI Platform and record the file URI on the paper.
+    
+    Args:
+        paper (Paper): Paper the PDF belongs to
+        pdf (str or file): Path of the downloaded PDF, or a binary file positioned at its start
+        client: The Google Generative AI client
+        
+    Returns:
+        Paper: The updated paper
+    """
+    print(f"  Uploading {paper.id} to Google AI")
+    if isinstance(pdf, str):
+        size = os.path.getsize(pdf)
+    else:
+        size = pdf.seek(0, os.SEEK_END)
+        pdf.seek(0)
+    with span("upload", "paper", paper_id=paper.id, bytes=size):
+        uploaded_file = client.files.upload(file=pdf, config={"mime_type": "application/pdf"})
+    
+    # Update the paper object with upload info
+    paper.uploaded = True
+    paper.file_uri = uploaded_file.uri
+    paper.mime_type = "application/pdf"
+    return paper
 
 def upload_papers(papers: List[Paper], client) -> Dict[str, Dict[str, Any]]:
     """
-    Download PDFs temporarily and upload them to Google AI Platform.
+    Download PDFs into memory and upload them to Google AI Platform.
+    
+    PDFs are kept in memory (spilling to anonymous temporary files when large),
+    and their section text is extracted in a process pool while later papers
+    are still downloading. Only a bounded number of PDFs are parsed at once, and
+    spilled PDFs are parsed in this thread rather than copied to the pool.
     
     Args:
         papers (List[Paper]): List of Paper objects
@@ -21,41 +89,31 @@ def upload_papers(papers: List[Paper], client) -> Dict[str, Dict[str, Any]]:
     Returns:
         dict: Mapping of paper IDs to file URIs
     """
-    
-    # Create a temporary directory to store downloads
-    with tempfile.TemporaryDirectory() as temp_dir:
+    with SectionParser(downloader.memory) as parser:
+        parsed = []
         for i, paper in enumerate(papers):
             paper_id = paper.id
-            pdf_url = paper.pdf_url
             
             print(f"Processing {i+1}/{len(papers)}: {paper_id} - {paper.title}")
             
-            # Create a temporary file path
-            temp_file_path = os.path.join(temp_dir, f"{paper_id}.pdf")
-            
             try:
                 # First download the PDF
-                print(f"  Downloading from {pdf_url}")
-                response = requests.get(pdf_url, stream=True)
-                response.raise_for_status()
-                
-                with open(temp_file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
-                # Then upload to Google AI
-                print(f"  Uploading to Google AI")
-                uploaded_file = client.files.upload(file=temp_file_path)
-                
-                # Update the paper object with upload info
-                paper.uploaded = True
-                paper.file_uri = uploaded_file.uri
-                paper.mime_type = "application/pdf"
+                with download_paper_buffer(paper) as pdf:
+                    # Then upload to Google AI
+                    upload_paper(paper, pdf, client)
+                    emit("paper_uploaded", paper_id=paper_id, title=paper.title, done=i + 1, total=len(papers))
+
+                    # Extract section text locally while the PDF is still in memory
+                    parsed.append((paper, parser.submit(pdf)))
 
                 time.sleep(1)
                 
             except Exception as e:
                 print(f"Error processing {paper_id}: {e}")
+
+        print(f"Extracting text from {len(parsed)} PDFs")
+        for paper, future in parsed:
+            paper.sections = future.result()
     
     return papers
 
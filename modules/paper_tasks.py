@@ -0,0 +1,267 @@
+"""
+Module for running a review's per-paper work through the durable task queue.
+
+A coordinator plans the review and enqueues one download task per candidate
+paper. Workers lease tasks and move each paper through download,
+upload, screen and extract; each step enqueues the next. Once every task of the
+run has finished, the coordinator writes the outline and report from the
+recorded papers.
+
+Downloads are spooled to a host-local directory for a separate upload task. An
+upload that lands on another host downloads the PDF again. With TASK_SPOOL_DIR
+empty, the download task uploads straight from memory and goes on to screening,
+which suits workers spread over hosts.
+"""
+import os
+import time
+import uuid
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from modules.paper import Paper
+from modules.task_queue import Task, TaskQueue, open_task_queue, TASK_LEASE_SECONDS
+from modules.paper_processor import download_paper, download_paper_buffer, upload_paper
+from modules.pdf_text import extract_pdf_sections
+from modules.ai_analyzer import client, can_screen, analyze_paper_relevance, extract_paper_content
+from modules.arxiv_search import fetch_papers, ARXIV_SOURCE
+from modules.dedup import dedupe_papers
+from modules.outline_generator import generate_literature_review_outline
+from modules.pipeline import plan_review, finish_review
+from modules.rag import create_index
+from modules.run_store import get_run_dir, RUNS_DIR
+
+# Host-local directory where downloaded PDFs wait for their upload task; empty to upload while downloading
+TASK_SPOOL_DIR = os.getenv("TASK_SPOOL_DIR", os.path.join(".cache", "spool"))
+
+# Seconds between polls when the queue is empty
+TASK_POLL_INTERVAL = float(os.getenv("TASK_POLL_INTERVAL", 5))
+
+
+def _spool_dir(run_id: str) -> str:
+    path = os.path.join(TASK_SPOOL_DIR, run_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _spool_path(run_id: str, paper: Paper) -> str:
+    return os.path.join(_spool_dir(run_id), f"{paper.id.replace('/', '_')}.pdf")
+
+
+def run_download(paper: Paper, run: Dict[str, Any], run_id: str) -> Optional[str]:
+    """
+    Download a paper's PDF and extract its section text, then spool it for the
+    upload task, or upload it straight away if there is no spool directory.
+    """
+    if not TASK_SPOOL_DIR:
+        with download_paper_buffer(paper) as pdf:
+            paper.sections = extract_pdf_sections(pdf)
+            upload_paper(paper, pdf, client)
+        return "screen"
+    pdf_path = download_paper(paper, _spool_dir(run_id))
+    paper.sections = extract_pdf_sections(pdf_path)
+    return "upload"
+
+
+def run_upload(paper: Paper, run: Dict[str, Any], run_id: str) -> Optional[str]:
+    """
+    Upload a spooled PDF, downloading it again if the spooled copy is gone or on another host.
+    """
+    if not TASK_SPOOL_DIR:
+        with download_paper_buffer(paper) as pdf:
+            upload_paper(paper, pdf, client)
+        return "screen"
+    pdf_path = _spool_path(run_id, paper)
+    if not os.path.exists(pdf_path):
+        pdf_path = download_paper(paper, _spool_dir(run_id))
+    upload_paper(paper, pdf_path, client)
+    os.remove(pdf_path)
+    return "screen"
+
+
+def run_screen(paper: Paper, run: Dict[str, Any], run_id: str) -> Optional[str]:
+    """
+    Screen a paper against the run's criteria; only relevant papers go on to extraction.
+    """
+    if not can_screen(paper):
+        raise ValueError("Paper has no extracted text or uploaded file to screen")
+    result = analyze_paper_relevance(paper, run["topic"], run["include"], run["exclude"])
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return "extract" if paper.is_relevant else None
+
+
+def run_extract(paper: Paper, run: Dict[str, Any], run_id: str) -> Optional[str]:
+    """
+    Extract the topic-relevant content of a paper.
+    """
+    extract_paper_content(paper, run["topic"])
+    if not paper.relevant_content:
+        raise RuntimeError("No content extracted")
+    return None
+
+
+# Task handlers update the paper in place and return the next task kind, if any
+TASK_HANDLERS: Dict[str, Callable[[Paper, Dict[str, Any], str], Optional[str]]] = {
+    "download": run_download,
+    "upload": run_upload,
+    "screen": run_screen,
+    "extract": run_extract,
+}
+
+
+def process_task(queue: TaskQueue, task: Task, lease_seconds: int = TASK_LEASE_SECONDS) -> bool:
+    """
+    Run a leased task, renewing its lease until it finishes, and record the result.
+
+    Args:
+        queue (TaskQueue): Queue the task was leased from
+        task (Task): The leased task
+        lease_seconds (int): Lease length to renew
+
+    Returns:
+        bool: True if the result was recorded
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(lease_seconds / 3):
+            if not queue.heartbeat(task, lease_seconds):
+                print(f"Lost lease on {task.kind} task for {task.paper_id}")
+                return
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    try:
+        paper = queue.get_paper(task.run_id, task.paper_id)
+        next_kind = TASK_HANDLERS[task.kind](paper, queue.get_run(task.run_id), task.run_id)
+    except Exception as e:
+        print(f"Error in {task.kind} task for {task.paper_id} (attempt {task.attempts}): {e}")
+        queue.fail(task, str(e))
+        return False
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+    recorded = queue.complete(task, paper, next_kind)
+    if not recorded:
+        print(f"Discarded {task.kind} result for {task.paper_id}: lease was taken over")
+    return recorded
+
+
+def run_task_worker(queue: TaskQueue, kinds: Optional[List[str]] = None, concurrency: int = 1,
+                    lease_seconds: int = TASK_LEASE_SECONDS, exit_when_idle: bool = False,
+                    poll_interval: float = TASK_POLL_INTERVAL) -> int:
+    """
+    Lease and run tasks until stopped, or until the queue is empty if exit_when_idle.
+
+    Args:
+        queue (TaskQueue): Queue to lease tasks from
+        kinds (list): Task kinds this worker runs, all kinds if None
+        concurrency (int): Number of tasks run at the same time
+        lease_seconds (int): Lease length
+        exit_when_idle (bool): Stop once no task is available
+        poll_interval (float): Seconds between polls when the queue is empty
+
+    Returns:
+        int: Number of task results recorded
+    """
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    recorded = 0
+    lock = threading.Lock()
+
+    def loop(slot):
+        nonlocal recorded
+        while True:
+            task = queue.lease(f"{worker_id}-{slot}", kinds, lease_seconds)
+            if task is None:
+                if exit_when_idle:
+                    return
+                time.sleep(poll_interval)
+                continue
+            print(f"[{worker_id}-{slot}] {task.kind} {task.paper_id} (run {task.run_id})")
+            if process_task(queue, task, lease_seconds):
+                with lock:
+                    recorded += 1
+
+    threads = [threading.Thread(target=loop, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorded
+
+
+def enqueue_review(topic: str, max_papers: int, queue: Optional[TaskQueue] = None,
+                   runs_dir: str = RUNS_DIR, source: str = ARXIV_SOURCE) -> str:
+    """
+    Plan a review, fetch its candidates and enqueue their per-paper tasks.
+
+    Each call creates a new run, so re-enqueueing a topic screens its papers
+    again under the newly planned criteria; an unfinished run is resumed by
+    starting workers and finishing it under its existing run ID.
+
+    Args:
+        topic (str): Main research topic
+        max_papers (int): Maximum number of papers to retrieve
+        queue (TaskQueue): Queue to use, the one at TASK_QUEUE_DB by default
+        runs_dir (str): Parent directory of the saved runs
+        source (str): Where to search for papers: "api", "local" or "hybrid"
+
+    Returns:
+        str: The run ID to pass to finish_queued_review
+    """
+    queue = queue or open_task_queue()
+    run_dir = get_run_dir(topic, runs_dir)
+    run_id = f"{os.path.basename(run_dir)}-{uuid.uuid4().hex[:8]}"
+
+    include, exclude, query = plan_review(topic)
+    papers = dedupe_papers(fetch_papers(query, max_results=max_papers, source=source))
+    queue.create_run(run_id, {
+        "topic": topic,
+        "include": include,
+        "exclude": exclude,
+        "query": query,
+        "run_dir": run_dir
+    }, papers)
+    print(f"Enqueued {len(papers)} papers for run {run_id}")
+    return run_id
+
+
+def wait_for_run(queue: TaskQueue, run_id: str, poll_interval: float = TASK_POLL_INTERVAL) -> Dict[str, int]:
+    """
+    Block until no task of the run is pending or leased.
+
+    Returns:
+        dict: Final task counts by status
+    """
+    while True:
+        counts = queue.counts(run_id)
+        if not counts.get("pending") and not counts.get("leased"):
+            return counts
+        print(f"Run {run_id}: {counts}")
+        time.sleep(poll_interval)
+
+
+def finish_queued_review(run_id: str, queue: Optional[TaskQueue] = None) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Wait for a queued run's tasks, then write and save its outline and report.
+
+    Args:
+        run_id (str): Run ID returned by enqueue_review
+        queue (TaskQueue): Queue the run was enqueued on
+
+    Returns:
+        tuple: (review result as returned by run_review, final task counts)
+    """
+    queue = queue or open_task_queue()
+    run = queue.get_run(run_id)
+    if run is None:
+        raise KeyError(f"Unknown run: {run_id}")
+
+    counts = wait_for_run(queue, run_id)
+    papers = queue.get_papers(run_id)
+    outline = generate_literature_review_outline(run["topic"], papers)
+    review = finish_review(run["topic"], run["include"], run["exclude"], run["query"], papers,
+                           outline, create_index(papers), run["run_dir"])
+    return review, counts
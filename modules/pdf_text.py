@@ -0,0 +1,201 @@
+"""
+Module for extracting text and section boundaries from downloaded PDFs locally.
+"""
+import io
+import os
+import re
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import IO, Dict, List, Optional, Union
+
+from modules.paper import Paper
+from modules.downloader import MemoryBudget
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # Local extraction is optional; screening falls back to the full PDF
+    PdfReader = None
+
+# Number of processes used for CPU-bound PDF parsing
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+
+# Sections sent to Gemini for screening, and the character cap for each of them
+SCREENING_SECTIONS = ("abstract", "introduction", "conclusion")
+SCREENING_SECTION_MAX_CHARS = int(os.getenv("SCREENING_SECTION_MAX_CHARS", 6000))
+
+# Common section headings, optionally numbered ("1 Introduction", "IV. RESULTS", ...)
+SECTION_HEADINGS = {
+    "abstract": r"abstract",
+    "introduction": r"introduction",
+    "related_work": r"related work|background",
+    "method": r"methods?|methodology|approach",
+    "experiments": r"experiments?|evaluation|experimental setup",
+    "results": r"results?|results and discussion",
+    "discussion": r"discussion",
+    "conclusion": r"conclusions?|concluding remarks|conclusions? and future work|summary and outlook",
+    "references": r"references|bibliography",
+}
+HEADING_PATTERN = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*|[IVX]+)\.?\s+)?(?P<title>"
+    + "|".join(f"(?P<{name}>{pattern})" for name, pattern in SECTION_HEADINGS.items())
+    + r")\s*:?\s*$",
+    re.IGNORECASE
+)
+
+
+def split_sections(text: str) -> Dict[str, str]:
+    """
+    Split the plain text of a paper into sections using its headings.
+
+    Args:
+        text (str): Full text of the paper
+
+    Returns:
+        dict: Mapping of section names to section text (first occurrence wins)
+    """
+    boundaries = []
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        match = HEADING_PATTERN.match(line)
+        if match:
+            name = next(key for key, value in match.groupdict().items() if value and key != "title")
+            boundaries.append((name, offset, offset + len(line)))
+        offset += len(line)
+
+    sections = {}
+    for i, (name, _, body_start) in enumerate(boundaries):
+        body_end = boundaries[i + 1][1] if i + 1 < len(boundaries) else len(text)
+        if name not in sections:
+            sections[name] = text[body_start:body_end].strip()
+
+    return sections
+
+
+def extract_pdf_sections(pdf: Union[str, bytes, IO[bytes]]) -> Optional[Dict[str, str]]:
+    """
+    Extract the text of a PDF and split it into sections.
+
+    Args:
+        pdf (str, bytes or file): Path to the downloaded PDF, its content, or a binary file
+
+    Returns:
+        dict: Mapping of section names to text, or None if the PDF can't be parsed
+    """
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf)
+        text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        print(f"Error extracting text from {pdf if isinstance(pdf, str) else 'PDF buffer'}: {e}")
+        return None
+    if not text.strip():
+        return None
+    return split_sections(text)
+
+
+def can_use_process_pool() -> bool:
+    """
+    Check whether this process may start worker processes (daemonic pool workers may not).
+    """
+    return not multiprocessing.current_process().daemon
+
+
+class SectionParser:
+    """
+    Extracts PDF sections in a process pool with a bounded number of PDFs in flight.
+
+    Only PDFs held in memory are sent to the pool: their bytes are copied to be
+    pickled, so at most `workers` copies exist at once and each is reserved
+    against the shared memory budget until its parse finishes. PDFs that spilled
+    to disk, or whose copy doesn't fit the budget, are parsed in the calling
+    thread straight from the file object.
+
+    Args:
+        memory (MemoryBudget): Budget the copies sent to the pool are reserved against
+        workers (int): Worker processes, and the number of PDFs in flight
+    """
+
+    def __init__(self, memory: MemoryBudget, workers: int = PDF_EXTRACT_WORKERS):
+        self.memory = memory
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = None
+
+    def __enter__(self) -> "SectionParser":
+        if PdfReader is not None and can_use_process_pool():
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, exc, value, tb):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def submit(self, pdf: IO[bytes]) -> "Future[Optional[Dict[str, str]]]":
+        """
+        Start extracting the sections of a PDF, waiting for a free slot if all are in use.
+
+        Args:
+            pdf (file): Binary PDF file, read from its start
+
+        Returns:
+            Future: Resolves to the mapping of section names to text, or None
+        """
+        pdf.seek(0, io.SEEK_END)
+        size = pdf.tell()
+        pdf.seek(0)
+        if self._pool is not None and getattr(pdf, "in_memory", False):
+            self._slots.acquire()
+            if self.memory.reserve(size):
+                try:
+                    future = self._pool.submit(extract_pdf_sections, pdf.read())
+                except BaseException:
+                    self._done(size)
+                    raise
+                future.add_done_callback(lambda _: self._done(size))
+                return future
+            self._slots.release()
+
+        future = Future()
+        future.set_result(extract_pdf_sections(pdf))
+        return future
+
+    def parse(self, pdf: IO[bytes]) -> Optional[Dict[str, str]]:
+        """
+        Extract the sections of a PDF, waiting for the result.
+        """
+        return self.submit(pdf).result()
+
+    def _done(self, size: int) -> None:
+        self.memory.release(size)
+        self._slots.release()
+
+
+def build_screening_text(paper: Paper, sections: List[str] = SCREENING_SECTIONS) -> Optional[str]:
+    """
+    Build the text sent for relevance screening from selected sections of a paper.
+
+    Args:
+        paper (Paper): Paper with locally extracted sections
+        sections (list): Names of the sections to include
+
+    Returns:
+        str: Screening text, or None if the paper has no usable sections
+    """
+    if not paper.sections:
+        return None
+
+    parts = []
+    for name in sections:
+        text = paper.sections.get(name)
+        if name == "abstract" and not text:
+            text = paper.abstract
+        if text:
+            parts.append(f"## {name.capitalize()}\n{text[:SCREENING_SECTION_MAX_CHARS]}")
+
+    # An abstract alone is what the metadata already gives us; require more than that
+    if len(parts) < 2:
+        return None
+    return f"# {paper.title}\n\n" + "\n\n".join(parts)
@@ -0,0 +1,463 @@
+"""
+Module for running the end-to-end literature review pipeline.
+"""
+import os
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from modules.arxiv_search import fetch_papers, fetch_new_papers, iter_papers, base_arxiv_id, ARXIV_SOURCE
+from modules.dedup import dedupe_papers, StreamingDeduper
+from modules.paper_processor import upload_papers, download_paper_buffer, upload_paper
+from modules.pdf_text import SectionParser, PDF_EXTRACT_WORKERS
+from modules.downloader import downloader
+from modules.streaming import Stage, StreamingPipeline
+from modules.ai_analyzer import (filter_papers, client, generate_queries_gemini, get_inclusion_exclusion_criteria,
+                                 can_screen, analyze_paper_relevance, extract_paper_content, emit_screened)
+from modules.batch_screening import GeminiBatchBackend
+from modules.outline_generator import generate_literature_review_outline, assign_new_papers
+from modules.paper import Paper
+from modules.rag import create_index, add_to_index, save_index, load_index
+from modules.generate_report import generate_full_report
+from modules.compile_report import compile_markdown_report
+from modules.run_store import save_run, load_run, index_dir, get_run_dir, RUNS_DIR
+from modules.progress import emit
+
+# Worker threads and queue bound for each stage of the streaming pipeline
+STREAM_DOWNLOAD_WORKERS = int(os.getenv("STREAM_DOWNLOAD_WORKERS", 4))
+STREAM_UPLOAD_WORKERS = int(os.getenv("STREAM_UPLOAD_WORKERS", 4))
+STREAM_SCREEN_WORKERS = int(os.getenv("STREAM_SCREEN_WORKERS", 4))
+STREAM_EXTRACT_WORKERS = int(os.getenv("STREAM_EXTRACT_WORKERS", 4))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 8))
+
+# Topics reviewed concurrently by a multi-topic batch
+BATCH_TOPIC_WORKERS = int(os.getenv("BATCH_TOPIC_WORKERS", 4))
+
+
+def paper_summary(paper: Paper) -> Dict[str, Any]:
+    """
+    Build the compact paper description returned to callers of the pipeline.
+
+    Args:
+        paper (Paper): Paper object to describe
+
+    Returns:
+        dict: ID, title, authors, abstract, year, URL, categories and screening verdict of the paper
+    """
+    return {
+        "id": paper.id,
+        "title": paper.title,
+        "authors": paper.authors,
+        "abstract": paper.abstract,
+        "year": paper.published_date.year if paper.published_date else None,
+        "url": paper.pdf_url,
+        "categories": paper.categories,
+        "relevant": paper.is_relevant
+    }
+
+
+def latest_submission(papers: List[Paper], previous: Optional[str] = None) -> Optional[str]:
+    """
+    Get the newest submission date among papers, as an ISO string.
+
+    Args:
+        papers (List[Paper]): Papers to inspect
+        previous (str): Previously recorded date to keep if it is newer
+
+    Returns:
+        str: ISO formatted date, or None if there is nothing to compare
+    """
+    dates = [paper.published_date for paper in papers if paper.published_date]
+    if previous:
+        dates.append(datetime.fromisoformat(previous))
+    return max(dates).isoformat() if dates else None
+
+
+def emit_included(papers: List[Paper]) -> None:
+    """
+    Report the papers included once screening has finished.
+    """
+    included = [paper_summary(paper) for paper in papers if paper.is_relevant]
+    emit("papers_included", count=len(included), screened=sum(1 for paper in papers if paper.is_relevant is not None),
+         papers=included)
+
+
+def _review_result(state: Dict[str, Any], papers: List[Paper], outline: Dict[str, Any],
+                   report: Dict[str, Any], final_report: str) -> Dict[str, Any]:
+    return {
+        "topic": state["topic"],
+        "query": state["query"],
+        "papers": [paper_summary(paper) for paper in papers if paper.is_relevant],
+        # Every screened paper, so clients can also filter by screening verdict
+        "screened": [paper_summary(paper) for paper in papers if paper.is_relevant is not None],
+        "outline": outline,
+        "report": report,
+        "final_report": final_report
+    }
+
+
+def plan_review(topic: str) -> Tuple[List[str], List[str], str]:
+    """
+    Generate the screening criteria and arXiv search query for a topic.
+
+    Args:
+        topic (str): Main research topic
+
+    Returns:
+        tuple: (inclusion criteria, exclusion criteria, search query)
+    """
+    print("Generating optimized search query...")
+    emit("stage", stage="planning")
+    include, exclude = get_inclusion_exclusion_criteria(topic, num_criteria=5)
+    queries = generate_queries_gemini(topic, num_queries=5)
+
+    query = " OR ".join([f"({q})" for q in queries])
+
+    print(f"Search query: {query}")
+    emit("query", query=query, include=include, exclude=exclude)
+    return include, exclude, query
+
+
+def stream_papers(query: str, topic: str, include: List[str], exclude: List[str], max_papers: int,
+                  source: str = ARXIV_SOURCE) -> Tuple[List[Paper], Dict[str, Any]]:
+    """
+    Run each paper through fetch, download, parse, upload, screen, extract and index
+    on its own, without waiting for the other papers to finish a stage.
+
+    The outline is generated as soon as the last paper has been screened, while
+    content extraction and indexing of the relevant papers are still running.
+    PDFs are passed from download to parsing and upload in memory rather than
+    through temporary files.
+
+    Args:
+        query (str): arXiv search query
+        topic (str): Main research topic
+        include (list): Inclusion criteria
+        exclude (list): Exclusion criteria
+        max_papers (int): Maximum number of papers to retrieve
+        source (str): Where to search for papers: "api", "local" or "hybrid"
+
+    Returns:
+        tuple: (papers in rank order, {"outline": ..., "index": ...})
+    """
+    papers: List[Paper] = []
+    indexed: Dict[str, Any] = {"index": None}
+    deduper = StreamingDeduper()
+
+    def candidates():
+        emit("stage", stage="fetching")
+        for paper in iter_papers(query, max_results=max_papers, source=source):
+            if deduper.add(paper) is paper:
+                papers.append(paper)
+                emit("papers_fetched", count=len(papers), papers=[paper_summary(paper)])
+                yield paper
+
+    with SectionParser(downloader.memory) as parser:
+
+        def download(paper):
+            return paper, download_paper_buffer(paper)
+
+        def parse(item):
+            paper, pdf = item
+            try:
+                paper.sections = parser.parse(pdf)
+                pdf.seek(0)
+            except BaseException:
+                pdf.close()
+                raise
+            return item
+
+        def upload(item):
+            paper, pdf = item
+            try:
+                upload_paper(paper, pdf, client)
+                emit("paper_uploaded", paper_id=paper.id, title=paper.title)
+                return paper
+            finally:
+                pdf.close()
+
+        def screen(paper):
+            if not can_screen(paper):
+                print(f"Skipping {paper.id} - not uploaded or missing file URI")
+                return None
+            result = analyze_paper_relevance(paper, topic, include, exclude)
+            print(f"  {paper.id} relevant: {result.get('is_relevant', 'unknown')}")
+            emit_screened(paper)
+            return paper if paper.is_relevant else None
+
+        def extract(paper):
+            extract_paper_content(paper, topic)
+            return paper if paper.relevant_content else None
+
+        def index(paper):
+            # A single worker, so the index is only modified from one thread
+            if indexed["index"] is None:
+                indexed["index"] = create_index([paper])
+            else:
+                add_to_index(indexed["index"], [paper])
+            return paper
+
+        pipeline = StreamingPipeline([
+            Stage("download", download, workers=STREAM_DOWNLOAD_WORKERS, queue_size=STREAM_QUEUE_SIZE),
+            Stage("parse", parse, workers=PDF_EXTRACT_WORKERS, queue_size=STREAM_QUEUE_SIZE),
+            Stage("upload", upload, workers=STREAM_UPLOAD_WORKERS, queue_size=STREAM_QUEUE_SIZE),
+            Stage("screen", screen, workers=STREAM_SCREEN_WORKERS, queue_size=STREAM_QUEUE_SIZE),
+            Stage("extract", extract, workers=STREAM_EXTRACT_WORKERS, queue_size=STREAM_QUEUE_SIZE),
+            Stage("index", index, workers=1, queue_size=STREAM_QUEUE_SIZE),
+        ])
+        pipeline.start(candidates())
+
+        # The outline only needs the screening verdicts and summaries
+        pipeline.wait_for("screen")
+        print(f"Screened {len(papers)} papers, generating outline...")
+        emit_included(papers)
+        emit("stage", stage="outlining")
+        outline = generate_literature_review_outline(topic, papers)
+        emit("outline", outline=outline)
+
+        pipeline.join()
+
+    if deduper.duplicates:
+        print(f"Collapsed {deduper.duplicates} duplicate papers")
+    return papers, {"outline": outline, "index": indexed["index"] or create_index([])}
+
+
+def run_review(topic: str, max_papers: int = int(os.getenv('MAX_PAPERS', 1)), batch: bool = False,
+               source: str = ARXIV_SOURCE, run_dir: Optional[str] = None,
+               target_relevant: Optional[int] = None, streaming: bool = False) -> Dict[str, Any]:
+    """
+    Run a full literature review for a topic.
+
+    Args:
+        topic (str): Main research topic
+        max_papers (int): Maximum number of papers to retrieve
+        batch (bool): Screen papers with a Gemini batch job instead of interactive calls
+        source (str): Where to search for papers: "api", "local" or "hybrid"
+        run_dir (str): If given, save the run's outputs here for later refreshes
+        target_relevant (int): If given, stop screening once this many papers are included
+        streaming (bool): Run each paper through the stages independently instead of in phases
+
+    Returns:
+        dict: Search query, relevant papers, outline, report data and final Markdown report
+    """
+    if streaming and (batch or target_relevant is not None):
+        raise ValueError("Streaming runs screen papers one at a time and can't be combined with batch or target screening")
+    if batch and target_relevant is not None:
+        raise ValueError("Batch screening screens every paper in one job and can't stop at a target")
+
+    # Step 1: Generate search query
+    include, exclude, query = plan_review(topic)
+
+    if streaming:
+        papers, streamed = stream_papers(query, topic, include, exclude, max_papers, source=source)
+        return finish_review(topic, include, exclude, query, papers, streamed["outline"], streamed["index"], run_dir)
+
+    # Step 2: Fetch paper metadata from arXiv
+    print(f"Fetching up to {max_papers} papers from arXiv...")
+    emit("stage", stage="fetching")
+    papers = fetch_papers(query, max_results=max_papers, source=source)
+    print(f"Found {len(papers)} papers matching criteria")
+    papers = dedupe_papers(papers)
+    emit("papers_fetched", count=len(papers), papers=[paper_summary(paper) for paper in papers])
+
+    # Step 3: Upload papers to Google AI
+    print("Uploading papers to Google AI...")
+    emit("stage", stage="uploading")
+    papers = upload_papers(papers, client)
+    print(f"Uploaded {len(papers)} papers")
+
+    # Step 4: Analyze relevance with AI and extract relevant content
+    print("Analyzing and filtering papers with Gemini...")
+    emit("stage", stage="screening")
+    filter_papers(papers, topic, include, exclude, batch_backend=GeminiBatchBackend() if batch else None,
+                  target=target_relevant)
+    print("\nFiltered papers")
+    for paper in papers:
+        if paper.is_relevant:
+            print(paper.relevant_content)
+    emit_included(papers)
+
+    # Step 5: Generate outline
+    print("Generating outline...")
+    emit("stage", stage="outlining")
+    outline = generate_literature_review_outline(topic, papers)
+    print("Outline generated successfully!")
+    emit("outline", outline=outline)
+
+    index = create_index(papers)
+    return finish_review(topic, include, exclude, query, papers, outline, index, run_dir)
+
+
+def finish_review(topic: str, include: List[str], exclude: List[str], query: str, papers: List[Paper],
+                  outline: Dict[str, Any], index, run_dir: Optional[str]) -> Dict[str, Any]:
+    """
+    Write each section of an outline from the indexed papers, compile the report
+    and save the run if a run directory is given.
+
+    Returns:
+        dict: Search query, relevant papers, outline, report data and final Markdown report
+    """
+    # Step 6: Write each section and compile the report
+    emit("stage", stage="writing")
+    full_outline = generate_full_report(outline, index)
+    emit("stage", stage="compiling")
+    final_report = compile_markdown_report(full_outline)
+
+    state = {
+        "topic": topic,
+        "include": include,
+        "exclude": exclude,
+        "query": query,
+        "last_seen": latest_submission(papers),
+        # Candidates skipped by target-driven screening, for a later continuation
+        "unscreened": [paper.id for paper in papers if paper.is_relevant is None]
+    }
+    if run_dir:
+        save_run(run_dir, state, papers, outline, full_outline, final_report)
+        save_index(index, index_dir(run_dir))
+
+    return _review_result(state, papers, outline, full_outline, final_report)
+
+
+def run_reviews(topics: List[Dict[str, Any]], runs_dir: str = RUNS_DIR, source: str = ARXIV_SOURCE,
+                workers: int = BATCH_TOPIC_WORKERS) -> List[Dict[str, Any]]:
+    """
+    Run literature reviews for many topics in one process, sharing work between them.
+
+    Candidate papers are pooled across topics and deduplicated, so each PDF is
+    downloaded, parsed and uploaded once. Screening and extraction depend on
+    each topic's criteria and run per topic, except for repeated topics, which
+    are reviewed once. Topics run concurrently, and every Gemini call shares the
+    process-wide rate limit. Each review is saved to its run directory so it can
+    later be refreshed with the watch command.
+
+    Args:
+        topics (list): Topic specs with a "topic" and optional "max_papers"
+        runs_dir (str): Parent directory of the saved runs
+        source (str): Where to search for papers: "api", "local" or "hybrid"
+        workers (int): Number of topics processed concurrently
+
+    Returns:
+        list: One review result per distinct topic, with its run directory under "run_dir"
+    """
+    # Repeated topics share a run directory and are reviewed once
+    specs = {}
+    for spec in topics:
+        specs.setdefault(get_run_dir(spec["topic"], runs_dir), spec)
+    run_dirs = list(specs)
+    print(f"Running {len(run_dirs)} reviews ({len(topics) - len(run_dirs)} repeated topics skipped)")
+
+    # Step 1: Criteria, queries and candidates for every topic
+    def plan_and_fetch(run_dir):
+        spec = specs[run_dir]
+        include, exclude, query = plan_review(spec["topic"])
+        max_papers = spec.get("max_papers", int(os.getenv('MAX_PAPERS', 1)))
+        return include, exclude, query, fetch_papers(query, max_results=max_papers, source=source)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        plans = dict(zip(run_dirs, executor.map(plan_and_fetch, run_dirs)))
+
+    # Step 2: Pool the candidates so shared papers are processed once
+    deduper = StreamingDeduper()
+    candidates = {}
+    unique_papers = []
+    for run_dir in run_dirs:
+        candidates[run_dir] = {}
+        for paper in plans[run_dir][3]:
+            canonical = deduper.add(paper)
+            if canonical is paper:
+                unique_papers.append(paper)
+            candidates[run_dir].setdefault(canonical.id, canonical)
+    total = sum(len(papers) for papers in candidates.values())
+    print(f"{total} candidates across topics share {len(unique_papers)} unique papers")
+
+    print("Uploading papers to Google AI...")
+    upload_papers(unique_papers, client)
+
+    # Step 3: Screen and write each review on its own copy of the shared papers
+    def review(run_dir):
+        topic = specs[run_dir]["topic"]
+        include, exclude, query, _ = plans[run_dir]
+        papers = [replace(paper, aliases=list(paper.aliases or [])) for paper in candidates[run_dir].values()]
+        try:
+            filter_papers(papers, topic, include, exclude)
+            outline = generate_literature_review_outline(topic, papers)
+            result = finish_review(topic, include, exclude, query, papers, outline, create_index(papers), run_dir)
+        except Exception as e:
+            print(f"Error reviewing {topic}: {e}")
+            return {"topic": topic, "run_dir": run_dir, "error": str(e)}
+        result["run_dir"] = run_dir
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(review, run_dirs))
+
+
+def update_review(topic: str, run_dir: str, max_papers: int = int(os.getenv('MAX_PAPERS', 1)),
+                  batch: bool = False, source: str = ARXIV_SOURCE) -> Dict[str, Any]:
+    """
+    Refresh a saved review with papers submitted since its last run.
+
+    Only the new papers are uploaded, screened and indexed, and only report
+    sections whose papers changed are rewritten. The outline and criteria of
+    the saved run are kept; in a clustered outline, each new relevant paper is
+    added to its nearest section. Without a saved run this runs a full review.
+
+    Args:
+        topic (str): Main research topic
+        run_dir (str): Directory of the saved run
+        max_papers (int): Maximum number of new papers to retrieve
+        batch (bool): Screen papers with a Gemini batch job instead of interactive calls
+        source (str): Where to search for papers: "api", "local" or "hybrid"
+
+    Returns:
+        dict: Search query, relevant papers, outline, report data and final Markdown report
+    """
+    run = load_run(run_dir)
+    if run is None:
+        print(f"No saved run in {run_dir}, running a full review...")
+        return run_review(topic, max_papers=max_papers, batch=batch, source=source, run_dir=run_dir)
+
+    state = run["state"]
+    papers = run["papers"]
+    since = datetime.fromisoformat(state["last_seen"]) if state.get("last_seen") else None
+
+    # Fetch only papers submitted after the last run
+    print(f"Fetching papers submitted after {state.get('last_seen')}...")
+    known_ids = {base_arxiv_id(paper_id) for paper in papers for paper_id in [paper.id] + (paper.aliases or [])}
+    new_papers = [paper for paper in fetch_new_papers(state["query"], since, max_results=max_papers, source=source)
+                  if base_arxiv_id(paper.id) not in known_ids]
+    new_papers = dedupe_papers(new_papers)
+    print(f"Found {len(new_papers)} new papers")
+
+    if not new_papers:
+        return _review_result(state, papers, run["outline"], run["report"], run["final_report"])
+
+    # Screen and index only the new papers
+    new_papers = upload_papers(new_papers, client)
+    filter_papers(new_papers, topic, state["include"], state["exclude"],
+                  batch_backend=GeminiBatchBackend() if batch else None)
+    new_relevant = [paper for paper in new_papers if paper.is_relevant]
+    print(f"{len(new_relevant)} new papers are relevant")
+
+    papers = papers + new_papers
+    state["last_seen"] = latest_submission(new_papers, state.get("last_seen"))
+
+    outline, report, final_report = run["outline"], run["report"], run["final_report"]
+    if new_relevant:
+        # Sections of a clustered outline only read the papers they list
+        outline = assign_new_papers(outline, papers, new_relevant)
+        if os.path.exists(index_dir(run_dir)):
+            index = load_index(index_dir(run_dir), papers)
+            add_to_index(index, new_relevant)
+        else:
+            index = create_index(papers)
+        # Only sections whose papers changed are rewritten
+        report = generate_full_report(outline, index, previous_report=run["report"])
+        if report != run["report"]:
+            final_report = compile_markdown_report(report)
+        save_index(index, index_dir(run_dir))
+
+    save_run(run_dir, state, papers, outline, report, final_report)
+    return _review_result(state, papers, outline, report, final_report)
@@ -0,0 +1,158 @@
+"""
+Module for reporting the progress of a review as structured events.
+
+Pipeline code calls emit() at each stage and for each paper and section. The
+events go to whatever reporter is installed for the process, such as the queue
+feeding a web client, and are dropped when none is installed. ProgressLog keeps
+a job's numbered events so clients can reconnect and resume after the last
+event they saw.
+"""
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Finished jobs' event logs are kept this many seconds for reconnecting clients
+PROGRESS_RETENTION = int(os.getenv("PROGRESS_RETENTION", 15 * 60))
+
+# Event types after which a job emits nothing more
+FINAL_EVENTS = {"complete", "error"}
+
+_reporter: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+@contextmanager
+def report_progress(reporter: Optional[Callable[[Dict[str, Any]], None]]):
+    """
+    Send events emitted in this process to a reporter while the block runs.
+
+    A review runs one at a time per worker process, so the reporter is process-wide
+    and also receives events emitted from the pipeline's worker threads.
+
+    Args:
+        reporter (Callable): Called with each event dict, or None to drop events
+    """
+    global _reporter
+    previous = _reporter
+    _reporter = reporter
+    try:
+        yield
+    finally:
+        _reporter = previous
+
+
+def emit(event_type: str, **data) -> None:
+    """
+    Report a progress event.
+
+    Args:
+        event_type (str): Event type, e.g. "stage", "paper_screened" or "section_written"
+        **data: JSON-serializable event fields
+    """
+    reporter = _reporter
+    if reporter is None:
+        return
+    try:
+        reporter({"type": event_type, "time": time.time(), **data})
+    except Exception as e:
+        # Progress reporting must never fail a review
+        print(f"Error reporting progress: {e}")
+
+
+class ProgressLog:
+    """
+    Numbered, append-only log of one job's events that readers can wait on.
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[int, Dict[str, Any]]] = []
+        self.finished_at: Optional[float] = None
+        self._condition = threading.Condition()
+
+    def append(self, event: Dict[str, Any]) -> int:
+        """
+        Add an event and wake waiting readers.
+
+        Returns:
+            int: The event's ID
+        """
+        with self._condition:
+            event_id = len(self.events) + 1
+            self.events.append((event_id, event))
+            if event.get("type") in FINAL_EVENTS:
+                self.finished_at = time.time()
+            self._condition.notify_all()
+            return event_id
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def read(self, after_id: int = 0, timeout: Optional[float] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Get the events after an ID, waiting up to timeout seconds for one to arrive.
+
+        Args:
+            after_id (int): ID of the last event the reader has seen
+            timeout (float): Seconds to wait if there are no new events
+
+        Returns:
+            list: (event ID, event) pairs, empty if none arrived in time
+        """
+        with self._condition:
+            if len(self.events) <= after_id and not self.finished:
+                self._condition.wait(timeout)
+            return self.events[after_id:]
+
+
+class ProgressJobs:
+    """
+    Registry of progress logs for running and recently finished jobs.
+
+    Requests for the same key while a job is running share that job, so a
+    resubmitted search follows the existing run instead of starting another.
+    """
+
+    def __init__(self, retention: int = PROGRESS_RETENTION):
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._logs: Dict[str, ProgressLog] = {}
+        self._running: Dict[str, str] = {}
+
+    def start(self, key: str) -> Tuple[str, ProgressLog, bool]:
+        """
+        Get the running job for a key or register a new one.
+
+        Args:
+            key (str): Key identifying equivalent jobs
+
+        Returns:
+            tuple: (job ID, progress log, whether a new job was created)
+        """
+        with self._lock:
+            self._expire()
+            job_id = self._running.get(key)
+            if job_id is not None and not self._logs[job_id].finished:
+                return job_id, self._logs[job_id], False
+            job_id = uuid.uuid4().hex
+            self._logs[job_id] = ProgressLog()
+            self._running[key] = job_id
+            return job_id, self._logs[job_id], True
+
+    def get(self, job_id: str) -> Optional[ProgressLog]:
+        """
+        Get a job's progress log, or None if it is unknown or expired.
+        """
+        with self._lock:
+            self._expire()
+            return self._logs.get(job_id)
+
+    def _expire(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, log in self._logs.items()
+                   if log.finished and now - log.finished_at > self.retention]
+        for job_id in expired:
+            del self._logs[job_id]
+        self._running = {key: job_id for key, job_id in self._running.items() if job_id in self._logs}
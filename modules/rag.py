@@ -1,63 +1,128 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from modules.paper import Paper
 import dotenv
 dotenv.load_dotenv()
 
-from llama_index.core import VectorStoreIndex, Document
+from llama_index.core import VectorStoreIndex, Document, StorageContext, load_index_from_storage
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.retrievers import VectorIndexRetriever
 
-from modules.ai_analyzer import client
+from modules.ai_analyzer import router
+from modules.context_packer import pack_context, citation_keys, CONTEXT_TOKEN_BUDGET
+from modules.bm25 import BM25Index
+from modules.tracing import span
 
 llama_index_api_key = os.getenv("LLAMA_INDEX_API_KEY")
 api_key = os.getenv("GOOGLE_API_KEY")
 
+# Reciprocal rank fusion of dense and BM25 rankings: weight / (RRF_K + rank)
+RETRIEVAL_DENSE_WEIGHT = float(os.getenv("RETRIEVAL_DENSE_WEIGHT", 1.0))
+RETRIEVAL_BM25_WEIGHT = float(os.getenv("RETRIEVAL_BM25_WEIGHT", 1.0))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", 60))
+# Candidates taken from each ranking, as a multiple of top_k
+RETRIEVAL_CANDIDATE_FACTOR = int(os.getenv("RETRIEVAL_CANDIDATE_FACTOR", 3))
+
 
 def create_index(papers: list[Paper]) -> VectorStoreIndex:
-    """Create a vector index from a list of text strings"""
-    # Store the original papers with their IDs for later retrieval
-    paper_dict = {str(i): paper for i, paper in enumerate(papers)}
+    """Create a vector index from the extracted content of a list of papers"""
+    with span("create_index", "index", papers=len(papers)):
+        # Create the index with the documents
+        index = VectorStoreIndex.from_documents(_paper_documents(papers))
+        
+        # Store the papers by ID in the index's extra_info for later retrieval
+        index.extra_info = {"papers": {}, "bm25": BM25Index()}
+        _add_papers(index, papers)
     
-    # Create documents with metadata containing the paper index
-    documents = [
+    return index
+
+def _add_papers(index: VectorStoreIndex, papers: list[Paper]) -> None:
+    """Register papers for retrieval and add them to the keyword index"""
+    for paper in papers:
+        if paper.relevant_content:
+            index.extra_info["papers"][paper.id] = paper
+            index.extra_info["bm25"].add(paper.id, f"{paper.title}\n{paper.abstract}\n{paper.relevant_content}")
+
+def _paper_documents(papers: list[Paper]) -> list[Document]:
+    """Create documents with metadata containing the paper ID"""
+    return [
         Document(
             text=paper.relevant_content, 
-            metadata={"paper_id": str(i)}
-        ) for i, paper in enumerate(papers)
+            metadata={"paper_id": paper.id}
+        ) for paper in papers if paper.relevant_content
     ]
-    
-    # Create the index with the documents
-    index = VectorStoreIndex.from_documents(documents)
-    
-    # Store the paper dictionary in the index's extra_info
-    index.extra_info = {"papers": paper_dict}
-    
+
+def add_to_index(index: VectorStoreIndex, papers: list[Paper]) -> None:
+    """Add papers to an existing index, embedding only the new documents"""
+    with span("add_to_index", "index", papers=len(papers)):
+        for document in _paper_documents(papers):
+            index.insert(document)
+        _add_papers(index, papers)
+
+def save_index(index: VectorStoreIndex, persist_dir: str) -> None:
+    """Persist an index so it can be extended by later runs"""
+    index.storage_context.persist(persist_dir=persist_dir)
+
+def load_index(persist_dir: str, papers: list[Paper]) -> VectorStoreIndex:
+    """Load a persisted index and reattach its papers"""
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+    index = load_index_from_storage(storage_context)
+    index.extra_info = {"papers": {}, "bm25": BM25Index()}
+    _add_papers(index, papers)
     return index
 
-def query_papers(index: VectorStoreIndex, query: str, top_k: int = 3):
-    """Get top k most relevant papers for a query"""
-    retriever = VectorIndexRetriever(index=index, similarity_top_k=top_k)
-    
-    # Retrieve the relevant document nodes
-    retrieved_nodes = retriever.retrieve(query)
-    
-    # Get the papers from the stored dictionary using the metadata paper_id
+def query_papers(index: VectorStoreIndex, query: str, top_k: int = 3,
+                 dense_weight: float = RETRIEVAL_DENSE_WEIGHT, bm25_weight: float = RETRIEVAL_BM25_WEIGHT):
+    """
+    Get the top k most relevant papers for a query, fusing the vector ranking with a
+    BM25 keyword ranking over titles, abstracts and content by reciprocal rank fusion
+    """
     paper_dict = index.extra_info.get("papers", {})
-    retrieved_papers = [paper_dict[node.metadata["paper_id"]] for node in retrieved_nodes]
-    
-    # Return both the papers and a formatted response
-    return retrieved_papers
-
-def write_lit_review_section(index, query, top_k=10):
-    top_papers = query_papers(index, query, top_k=top_k)
-    top_papers_formatted = "\n".join(
-        [f"- {paper.title} by {', '.join(paper.authors)}{f'\n: BibTeX entry: {paper.bibtex}' if hasattr(paper, 'bibtex') and paper.bibtex else ''}: {paper.relevant_content}" for paper in top_papers]
-    )
-    print(f"Top {top_k} papers for query '{query}':")
+    num_candidates = max(top_k * RETRIEVAL_CANDIDATE_FACTOR, top_k)
+    scores = {}
+
+    if dense_weight > 0:
+        retriever = VectorIndexRetriever(index=index, similarity_top_k=num_candidates)
+        
+        # Retrieve the relevant document nodes, keeping each paper's best rank
+        dense_ranking = []
+        for node in retriever.retrieve(query):
+            paper_id = node.metadata["paper_id"]
+            if paper_id in paper_dict and paper_id not in dense_ranking:
+                dense_ranking.append(paper_id)
+        for rank, paper_id in enumerate(dense_ranking, start=1):
+            scores[paper_id] = scores.get(paper_id, 0.0) + dense_weight / (RETRIEVAL_RRF_K + rank)
+
+    bm25 = index.extra_info.get("bm25")
+    if bm25_weight > 0 and bm25 is not None:
+        for rank, (paper_id, _) in enumerate(bm25.search(query, top_k=num_candidates), start=1):
+            if paper_id in paper_dict:
+                scores[paper_id] = scores.get(paper_id, 0.0) + bm25_weight / (RETRIEVAL_RRF_K + rank)
+
+    ranked = sorted(scores, key=lambda paper_id: -scores[paper_id])[:top_k]
+    return [paper_dict[paper_id] for paper_id in ranked]
+
+# Number of papers retrieved for a section question
+SECTION_TOP_K = int(os.getenv("SECTION_TOP_K", 10))
+# Minimum content tokens per paper in one prompt; sections with more papers than
+# the budget allows are written hierarchically
+SECTION_TOKENS_PER_PAPER = int(os.getenv("SECTION_TOKENS_PER_PAPER", 400))
+# Target length of an intermediate synthesis, which sets the fan-in of each merge
+SYNTHESIS_MAX_TOKENS = int(os.getenv("SYNTHESIS_MAX_TOKENS", 800))
+SECTION_CONCURRENCY = int(os.getenv("SECTION_CONCURRENCY", 4))
+
+def build_section_prompt(query, top_papers, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Build the prompt for a literature review section, packing the most relevant content into a token budget"""
+    context, references = pack_context(query, top_papers, token_budget=token_budget)
+    references_formatted = "\n".join(f"[{key}] {reference}" for key, reference in references.items())
     prompt = f"""
-    Write a comprehensive literature review section formatted in Markdown based on the following relevant papers:
+    Write a comprehensive literature review section formatted in Markdown based on the following excerpts from relevant papers.
+    Each paper is labelled with its citation key in square brackets:
+
+    {context}
 
-    {top_papers_formatted}
+    Sources:
+    {references_formatted}
 
     Follow these guidelines:
     1. Synthesize the key findings and arguments from the papers, don't just summarize them individually
@@ -68,7 +133,7 @@ def write_lit_review_section(index, query, top_k=10):
     6. Include in-text citations when discussing specific papers
     7. Ensure logical flow and transitions between ideas
     8. Focus on how the papers relate to and help answer the research question: {query}
-    9. Add inline citations where necessary in a reasonable format.
+    9. Cite papers inline using their citation keys in square brackets, e.g. [{next(iter(references), 'Smith2021')}].
 
     Structure the review section with:
     - Clear topic sentences for each paragraph
@@ -79,14 +144,128 @@ def write_lit_review_section(index, query, top_k=10):
 
     Write the literature review section in a scholarly style while maintaining readability.
     """
+    return prompt, references
+
+def papers_per_prompt(token_budget=CONTEXT_TOKEN_BUDGET):
+    """Number of papers whose content fits in one prompt at the minimum share per paper"""
+    return max(2, token_budget // SECTION_TOKENS_PER_PAPER)
+
+def syntheses_per_merge(token_budget=CONTEXT_TOKEN_BUDGET):
+    """Number of intermediate syntheses merged in one prompt"""
+    return max(2, token_budget // SYNTHESIS_MAX_TOKENS)
+
+def needs_hierarchy(top_papers, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Whether a section has more papers than fit in a single prompt"""
+    return len(top_papers) > papers_per_prompt(token_budget)
+
+def build_synthesis_prompts(query, top_papers, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Build one synthesis prompt per group of papers, with citation keys shared across groups"""
+    keys = citation_keys(top_papers)
+    group_size = papers_per_prompt(token_budget)
+    prompts = []
+    references = {}
+    for start in range(0, len(top_papers), group_size):
+        group = top_papers[start:start + group_size]
+        context, group_references = pack_context(query, group, token_budget=token_budget, keys=keys)
+        if not context:
+            continue
+        references.update(group_references)
+        prompts.append(f"""
+    Synthesize the following excerpts from relevant papers as they bear on the research question: {query}
+    Each paper is labelled with its citation key in square brackets:
+
+    {context}
+
+    Write a dense synthesis of at most {SYNTHESIS_MAX_TOKENS * 3 // 4} words that groups the papers by theme,
+    notes agreements, disagreements and gaps, and cites every claim inline with the citation keys in square brackets.
+    This synthesis will be merged with syntheses of other papers, so do not add an introduction or conclusion.
+    """)
+    return prompts, references
+
+def build_merge_prompt(query, syntheses, final=False):
+    """Build the prompt that merges intermediate syntheses, or writes the section from them if final"""
+    parts = "\n\n".join(f"Synthesis {i + 1}:\n{synthesis}" for i, synthesis in enumerate(syntheses))
+    if not final:
+        return f"""
+    Merge the following partial syntheses of the literature on the research question: {query}
+
+    {parts}
+
+    Write a single synthesis of at most {SYNTHESIS_MAX_TOKENS * 3 // 4} words that combines overlapping themes,
+    keeps the most important findings, agreements, disagreements and gaps, and keeps the inline citation keys
+    in square brackets exactly as they appear. Do not add an introduction or conclusion.
+    """
+    return f"""
+    Write a comprehensive literature review section formatted in Markdown based on the following syntheses
+    of the relevant papers. Claims are cited with citation keys in square brackets:
+
+    {parts}
+
+    Follow these guidelines:
+    1. Synthesize the key findings and arguments across all syntheses, don't just concatenate them
+    2. Identify common themes, agreements, and disagreements between the papers
+    3. Critically analyze the methodologies and results
+    4. Highlight any research gaps or areas needing further investigation
+    5. Use proper academic tone and style
+    6. Keep the inline citations, using the citation keys in square brackets exactly as they appear
+    7. Ensure logical flow and transitions between ideas
+    8. Focus on how the papers relate to and help answer the research question: {query}
+
+    Structure the review section with:
+    - Clear topic sentences for each paragraph
+    - Supporting evidence from the papers
+    - Critical analysis and synthesis
+    - Smooth transitions between ideas
+    - A concluding paragraph that ties the findings together
+
+    Write the literature review section in a scholarly style while maintaining readability.
+    """
+
+def hierarchical_models():
+    """Every model the map-reduce path can route to, since merges escalate by their prompt size"""
+    models = {router.model_for("synthesis")}
+    for task in ("merge", "section"):
+        route = router.route(task)
+        models.update(model for model in (route.model, route.escalate_to) if model)
+    return sorted(models)
+
+def _generate(prompt, task="synthesis"):
+    response = router.generate(task, [{"text": prompt}])
+    return response.text
+
+def write_hierarchical_section(query, synthesis_prompts, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Write a section from many papers by map-reduce: synthesize each group of papers in
+    parallel, merge the syntheses in parallel rounds until they fit in one prompt, then
+    write the section from the remaining syntheses.
+    """
+    fan_in = syntheses_per_merge(token_budget)
+    with ThreadPoolExecutor(max_workers=SECTION_CONCURRENCY) as executor:
+        syntheses = list(executor.map(_generate, synthesis_prompts))
+        depth = 1
+        while len(syntheses) > fan_in:
+            groups = [syntheses[start:start + fan_in] for start in range(0, len(syntheses), fan_in)]
+            print(f"Merging {len(syntheses)} syntheses in {len(groups)} groups for '{query}'")
+            syntheses = list(executor.map(lambda group: _generate(build_merge_prompt(query, group), "merge"), groups))
+            depth += 1
+    print(f"Writing section '{query}' from {len(synthesis_prompts)} paper groups in {depth + 1} levels")
+    return _generate(build_merge_prompt(query, syntheses, final=True), "section")
+
+def write_lit_review_section(index, query, top_k=10, top_papers=None, prompt=None):
+    """Write a literature review section answering a question, retrieving papers and building the prompt unless given"""
+    if prompt is None:
+        if top_papers is None:
+            top_papers = query_papers(index, query, top_k=top_k)
+        print(f"Top {top_k} papers for query '{query}':")
+        if needs_hierarchy(top_papers):
+            prompts, _ = build_synthesis_prompts(query, top_papers)
+            return write_hierarchical_section(query, prompts)
+        prompt, _ = build_section_prompt(query, top_papers)
 
     contents = [{"text": prompt}]
         
     # Generate content with the prompt and PDF
-    response = client.models.generate_content(
-        model="gemini-2.0-flash", 
-        contents=contents
-    )
+    response = router.generate("section", contents)
 
     print(f"Response: {response.text}")
     return response.text
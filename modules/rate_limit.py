@@ -0,0 +1,99 @@
+"""
+Module for sharing one Gemini request budget across every caller in a process.
+
+All modules use the client from ai_analyzer, which wraps the Gemini client so
+that every request it makes (content generation, file uploads and downloads,
+context caches and batch jobs) waits for a turn from a shared limiter.
+Each call is also recorded as a trace span with its model, limiter wait and
+token counts.
+"""
+import os
+import time
+import threading
+from typing import Any, Iterable
+
+from modules.tracing import span, record_usage
+
+# Gemini requests allowed per minute across the process (0 for no limit)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 0))
+
+
+class RateLimiter:
+    """
+    Spaces calls evenly so that at most requests_per_minute start in any minute.
+
+    Args:
+        requests_per_minute (float): Allowed rate, or 0 for no limit
+    """
+
+    def __init__(self, requests_per_minute: float = 0):
+        self._lock = threading.Lock()
+        self._next_request_at = 0.0
+        self.set_rate(requests_per_minute)
+
+    def set_rate(self, requests_per_minute: float) -> None:
+        """
+        Change the allowed rate.
+        """
+        with self._lock:
+            self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+
+    def acquire(self) -> None:
+        """
+        Block until the caller may make its request.
+        """
+        with self._lock:
+            if not self.interval:
+                return
+            now = time.time()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimitedService:
+    """
+    Proxy for a client service (e.g. client.models) that rate-limits the given methods.
+    """
+
+    def __init__(self, service: Any, limiter: RateLimiter, methods: Iterable[str], name: str = ""):
+        self._service = service
+        self._limiter = limiter
+        self._methods = set(methods)
+        self._name = name
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._service, name)
+        if name not in self._methods:
+            return attribute
+
+        def limited(*args, **kwargs):
+            with span(f"gemini.{name}", "gemini", service=self._name, model=kwargs.get("model")) as details:
+                queued_at = time.perf_counter()
+                self._limiter.acquire()
+                details["rate_limit_wait_ms"] = round((time.perf_counter() - queued_at) * 1000, 1)
+                response = attribute(*args, **kwargs)
+                record_usage(details, response)
+                return response
+        return limited
+
+
+class RateLimitedClient:
+    """
+    Proxy for a Gemini client whose requests all share one limiter.
+    """
+
+    def __init__(self, client: Any, limiter: RateLimiter):
+        self._client = client
+        self.limiter = limiter
+        self.models = RateLimitedService(client.models, limiter, ["generate_content"], "models")
+        self.files = RateLimitedService(client.files, limiter, ["upload", "download", "delete"], "files")
+        self.caches = RateLimitedService(client.caches, limiter, ["create", "list", "delete"], "caches")
+        self.batches = RateLimitedService(client.batches, limiter, ["create", "get"], "batches")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+gemini_limiter = RateLimiter(GEMINI_REQUESTS_PER_MINUTE)
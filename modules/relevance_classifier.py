@@ -0,0 +1,402 @@
+"""
+Module for learning screening verdicts locally so that confident cases skip Gemini.
+
+Every Gemini screening verdict is stored with embeddings of the paper's title
+and abstract and of the review's topic and criteria. A logistic regression
+over features of that pair is trained once enough verdicts exist and
+retrained as more arrive. Candidates whose predicted probability is far from
+the decision boundary are decided locally; uncertain ones still go to Gemini.
+
+A random sample of confident candidates is sent to Gemini anyway as an audit.
+Local decisions are only made while both the held-out accuracy of confident
+predictions and the recent audit agreement stay above CLASSIFIER_MIN_ACCURACY.
+"""
+import os
+import time
+import random
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules.paper import Paper
+from modules.embeddings import embed_texts
+
+CLASSIFIER_DB = os.getenv("CLASSIFIER_DB", os.path.join(".cache", "screening_verdicts.sqlite"))
+
+# Whether confident predictions replace Gemini screening (verdicts are recorded either way)
+CLASSIFIER_AUTO_DECIDE = os.getenv("CLASSIFIER_AUTO_DECIDE", "true").lower() == "true"
+# Verdicts needed before the first training, and new verdicts between retrainings
+CLASSIFIER_MIN_EXAMPLES = int(os.getenv("CLASSIFIER_MIN_EXAMPLES", 200))
+CLASSIFIER_RETRAIN_EVERY = int(os.getenv("CLASSIFIER_RETRAIN_EVERY", 50))
+# Predictions at or beyond these probabilities are decided locally
+CLASSIFIER_ACCEPT_PROBABILITY = float(os.getenv("CLASSIFIER_ACCEPT_PROBABILITY", 0.95))
+CLASSIFIER_REJECT_PROBABILITY = float(os.getenv("CLASSIFIER_REJECT_PROBABILITY", 0.05))
+# Share of confident candidates still sent to Gemini, and the accuracy local decisions must keep
+CLASSIFIER_AUDIT_RATE = float(os.getenv("CLASSIFIER_AUDIT_RATE", 0.05))
+CLASSIFIER_MIN_ACCURACY = float(os.getenv("CLASSIFIER_MIN_ACCURACY", 0.95))
+# Most recent audits used to measure agreement
+CLASSIFIER_AUDIT_WINDOW = int(os.getenv("CLASSIFIER_AUDIT_WINDOW", 100))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    paper_id TEXT NOT NULL,
+    criteria TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    paper_vector BLOB NOT NULL,
+    criteria_vector BLOB NOT NULL,
+    relevant INTEGER NOT NULL,
+    predicted REAL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def paper_text(paper: Paper) -> str:
+    return f"{paper.title}\n{paper.abstract}"
+
+
+def criteria_text(topic: str, include_terms: List[str], exclude_terms: List[str]) -> str:
+    return f"{topic}\nInclude: {', '.join(include_terms)}\nExclude: {', '.join(exclude_terms)}"
+
+
+def pair_features(paper_vectors: np.ndarray, criteria_vectors: np.ndarray) -> np.ndarray:
+    """
+    Build features of (paper, criteria) embedding pairs: elementwise product,
+    absolute difference and cosine similarity.
+    """
+    product = paper_vectors * criteria_vectors
+    return np.hstack([product, np.abs(paper_vectors - criteria_vectors), product.sum(axis=1, keepdims=True)])
+
+
+class LogisticRegression:
+    """
+    L2-regularized logistic regression fitted by full-batch gradient descent.
+
+    Args:
+        l2 (float): Regularization strength
+        iterations (int): Gradient steps
+        learning_rate (float): Step size
+    """
+
+    def __init__(self, l2: float = 1e-3, iterations: int = 500, learning_rate: float = 0.5):
+        self.l2 = l2
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.weights: Optional[np.ndarray] = None
+        self.bias = 0.0
+
+    def fit(self, features: np.ndarray, labels: np.ndarray) -> "LogisticRegression":
+        n, dim = features.shape
+        self.weights = np.zeros(dim)
+        # Start from the base rate so early steps only learn the features
+        rate = np.clip(labels.mean(), 1e-3, 1 - 1e-3)
+        self.bias = float(np.log(rate / (1 - rate)))
+        for _ in range(self.iterations):
+            error = self.predict_proba(features) - labels
+            self.weights -= self.learning_rate * (features.T @ error / n + self.l2 * self.weights)
+            self.bias -= self.learning_rate * float(error.mean())
+        return self
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        return 1 / (1 + np.exp(-(features @ self.weights + self.bias)))
+
+
+def calibration_report(probabilities: np.ndarray, labels: np.ndarray, bins: int = 10,
+                       accept: float = CLASSIFIER_ACCEPT_PROBABILITY,
+                       reject: float = CLASSIFIER_REJECT_PROBABILITY) -> Dict[str, Any]:
+    """
+    Summarize how well predicted probabilities match observed verdicts.
+
+    Args:
+        probabilities (np.ndarray): Predicted probabilities of relevance
+        labels (np.ndarray): Observed verdicts (1 relevant, 0 not)
+        bins (int): Number of equal-width probability bins
+        accept (float): Probability at or above which papers are included locally
+        reject (float): Probability at or below which papers are excluded locally
+
+    Returns:
+        dict: Brier score, log loss, accuracy, per-bin reliability, and the
+        coverage and accuracy of confident predictions
+    """
+    if len(labels) == 0:
+        return {"examples": 0}
+    clipped = np.clip(probabilities, 1e-6, 1 - 1e-6)
+    predictions = probabilities >= 0.5
+    confident = (probabilities >= accept) | (probabilities <= reject)
+
+    reliability = []
+    edges = np.linspace(0, 1, bins + 1)
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_bin = (probabilities >= low) & ((probabilities < high) if high < 1 else (probabilities <= high))
+        if in_bin.any():
+            reliability.append({
+                "range": [round(float(low), 2), round(float(high), 2)],
+                "count": int(in_bin.sum()),
+                "mean_predicted": round(float(probabilities[in_bin].mean()), 3),
+                "observed_rate": round(float(labels[in_bin].mean()), 3)
+            })
+
+    return {
+        "examples": int(len(labels)),
+        "brier": round(float(np.mean((probabilities - labels) ** 2)), 4),
+        "log_loss": round(float(-np.mean(labels * np.log(clipped) + (1 - labels) * np.log(1 - clipped))), 4),
+        "accuracy": round(float(np.mean(predictions == labels)), 4),
+        "confident_coverage": round(float(confident.mean()), 4),
+        "confident_accuracy": round(float(np.mean(predictions[confident] == labels[confident])), 4)
+        if confident.any() else None,
+        "reliability": reliability
+    }
+
+
+class VerdictStore:
+    """
+    SQLite table of screening verdicts with the embeddings they were made on.
+    """
+
+    def __init__(self, db_path: str = CLASSIFIER_DB):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA busy_timeout = 30000")
+        return connection
+
+    def add(self, paper_id: str, criteria: str, paper_vector: np.ndarray, criteria_vector: np.ndarray,
+            relevant: bool, predicted: Optional[float] = None) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT INTO verdicts (paper_id, criteria, dim, paper_vector, criteria_vector, relevant, "
+                    "predicted, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (paper_id, criteria, len(paper_vector), paper_vector.astype(np.float32).tobytes(),
+                     criteria_vector.astype(np.float32).tobytes(), int(relevant), predicted, time.time())
+                )
+        finally:
+            connection.close()
+
+    def count(self) -> int:
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        finally:
+            connection.close()
+
+    def load(self, dim: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Load verdicts made with embeddings of one dimension (the latest used by default).
+
+        Returns:
+            tuple: (paper vectors, criteria vectors, labels)
+        """
+        connection = self._connect()
+        try:
+            if dim is None:
+                row = connection.execute("SELECT dim FROM verdicts ORDER BY id DESC LIMIT 1").fetchone()
+                if row is None:
+                    return np.zeros((0, 0)), np.zeros((0, 0)), np.zeros(0)
+                dim = row[0]
+            rows = connection.execute(
+                "SELECT paper_vector, criteria_vector, relevant FROM verdicts WHERE dim = ? ORDER BY id", (dim,)
+            ).fetchall()
+        finally:
+            connection.close()
+        if not rows:
+            return np.zeros((0, dim)), np.zeros((0, dim)), np.zeros(0)
+        paper_vectors = np.stack([np.frombuffer(row[0], dtype=np.float32) for row in rows])
+        criteria_vectors = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        return paper_vectors, criteria_vectors, np.array([row[2] for row in rows], dtype=float)
+
+    def audits(self, accept: float, reject: float, limit: int) -> List[Tuple[float, int]]:
+        """
+        Get the most recent Gemini verdicts for papers the classifier was confident about.
+
+        Returns:
+            list: (predicted probability, verdict) pairs, newest first
+        """
+        connection = self._connect()
+        try:
+            return connection.execute(
+                "SELECT predicted, relevant FROM verdicts WHERE predicted IS NOT NULL "
+                "AND (predicted >= ? OR predicted <= ?) ORDER BY id DESC LIMIT ?",
+                (accept, reject, limit)
+            ).fetchall()
+        finally:
+            connection.close()
+
+
+class RelevanceClassifier:
+    """
+    Local relevance model trained on recorded Gemini screening verdicts.
+
+    Args:
+        store (VerdictStore): Where verdicts are recorded, the local SQLite store by default
+        auto_decide (bool): Whether confident predictions replace Gemini screening
+        audit_rate (float): Share of confident candidates still sent to Gemini
+    """
+
+    def __init__(self, store: Optional[VerdictStore] = None, auto_decide: bool = CLASSIFIER_AUTO_DECIDE,
+                 audit_rate: float = CLASSIFIER_AUDIT_RATE):
+        self._store = store
+        self.auto_decide = auto_decide
+        self.audit_rate = audit_rate
+        self.accept = CLASSIFIER_ACCEPT_PROBABILITY
+        self.reject = CLASSIFIER_REJECT_PROBABILITY
+        self.model: Optional[LogisticRegression] = None
+        self.dim: Optional[int] = None
+        self.holdout_report: Dict[str, Any] = {}
+        self._trained_on = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+        self._random = random.Random()
+
+    @property
+    def store(self) -> VerdictStore:
+        # Created on first use so importing the module doesn't touch the disk
+        if self._store is None:
+            self._store = VerdictStore()
+        return self._store
+
+    def _embed(self, paper: Paper, criteria: str) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = embed_texts([paper_text(paper), criteria])
+        return vectors[0], vectors[1]
+
+    def train(self) -> Dict[str, Any]:
+        """
+        Fit the model on every recorded verdict, reporting calibration on a held-out fifth first.
+
+        Returns:
+            dict: Calibration report on the held-out verdicts, empty if there are too few
+        """
+        paper_vectors, criteria_vectors, labels = self.store.load()
+        with self._lock:
+            self._trained_on = len(labels)
+            self._loaded = True
+        if len(labels) < CLASSIFIER_MIN_EXAMPLES or len(set(labels.tolist())) < 2:
+            return {}
+
+        features = pair_features(paper_vectors, criteria_vectors)
+        order = np.random.default_rng(0).permutation(len(labels))
+        split = len(labels) // 5
+        holdout, train = order[:split], order[split:]
+        holdout_report = calibration_report(
+            LogisticRegression().fit(features[train], labels[train]).predict_proba(features[holdout]),
+            labels[holdout], accept=self.accept, reject=self.reject
+        )
+        model = LogisticRegression().fit(features, labels)
+
+        with self._lock:
+            self.model = model
+            self.dim = paper_vectors.shape[1]
+            self.holdout_report = holdout_report
+        print(f"Trained relevance classifier on {len(labels)} verdicts "
+              f"(held-out confident accuracy {holdout_report.get('confident_accuracy')}, "
+              f"coverage {holdout_report.get('confident_coverage')})")
+        return holdout_report
+
+    def audit_agreement(self) -> Optional[float]:
+        """
+        Share of recent audited confident predictions that agreed with Gemini, or None before any audit.
+        """
+        audits = self.store.audits(self.accept, self.reject, CLASSIFIER_AUDIT_WINDOW)
+        if not audits:
+            return None
+        return float(np.mean([(predicted >= 0.5) == bool(relevant) for predicted, relevant in audits]))
+
+    def trusted(self) -> bool:
+        """
+        Whether the held-out and audit accuracy allow local decisions.
+        """
+        confident_accuracy = self.holdout_report.get("confident_accuracy")
+        if confident_accuracy is None or confident_accuracy < CLASSIFIER_MIN_ACCURACY:
+            return False
+        agreement = self.audit_agreement()
+        return agreement is None or agreement >= CLASSIFIER_MIN_ACCURACY
+
+    def predict(self, paper: Paper, topic: str, include_terms: List[str],
+                exclude_terms: List[str]) -> Optional[float]:
+        """
+        Predict the probability that Gemini would include a paper, or None if there is no model yet.
+        """
+        if not self._loaded:
+            with self._train_lock:
+                if not self._loaded:
+                    self.train()
+        with self._lock:
+            model, dim = self.model, self.dim
+        if model is None:
+            return None
+        paper_vector, criteria_vector = self._embed(paper, criteria_text(topic, include_terms, exclude_terms))
+        if len(paper_vector) != dim:
+            return None
+        return float(model.predict_proba(pair_features(paper_vector[None, :], criteria_vector[None, :]))[0])
+
+    def decide(self, probability: Optional[float]) -> Optional[bool]:
+        """
+        Turn a prediction into a local verdict, or None if the paper should go to Gemini.
+
+        Uncertain predictions, a sampled share of confident ones (the audit), and
+        every prediction while the model isn't trusted go to Gemini.
+        """
+        if probability is None or not self.auto_decide:
+            return None
+        if self.reject < probability < self.accept:
+            return None
+        if self._random.random() < self.audit_rate or not self.trusted():
+            return None
+        return probability >= self.accept
+
+    def record(self, paper: Paper, topic: str, include_terms: List[str], exclude_terms: List[str],
+               relevant: bool, predicted: Optional[float] = None) -> None:
+        """
+        Store a Gemini verdict for training, and retrain once enough new verdicts have arrived.
+
+        Args:
+            paper (Paper): The screened paper
+            topic (str): The main research topic
+            include_terms (list): Inclusion criteria
+            exclude_terms (list): Exclusion criteria
+            relevant (bool): Gemini's verdict
+            predicted (float): The classifier's prediction for the paper, if it made one
+        """
+        criteria = criteria_text(topic, include_terms, exclude_terms)
+        paper_vector, criteria_vector = self._embed(paper, criteria)
+        self.store.add(paper.id, criteria, paper_vector, criteria_vector, relevant, predicted)
+
+        with self._lock:
+            due = self._loaded and self.store.count() - self._trained_on >= CLASSIFIER_RETRAIN_EVERY
+            if due:
+                # Claim the retraining so concurrent recorders don't start another
+                self._trained_on = self.store.count()
+        if due:
+            self.train()
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Report the calibration of the current model on all verdicts, on held-out verdicts, and in audits.
+        """
+        paper_vectors, criteria_vectors, labels = self.store.load()
+        if not self._loaded:
+            self.train()
+        report = {
+            "verdicts": int(len(labels)),
+            "trained": self.model is not None,
+            "holdout": self.holdout_report,
+            "audit_agreement": self.audit_agreement(),
+            "trusted": self.model is not None and self.trusted()
+        }
+        if self.model is not None and len(labels):
+            report["in_sample"] = calibration_report(
+                self.model.predict_proba(pair_features(paper_vectors, criteria_vectors)), labels,
+                accept=self.accept, reject=self.reject
+            )
+        return report
@@ -0,0 +1,148 @@
+"""
+Module for keeping completed reviews in memory and filtering their papers quickly.
+
+Each stored review gets indexes by year, category, author name token and
+relevance when it is added, so filters are answered by intersecting
+precomputed position sets instead of scanning or re-running the review.
+"""
+import os
+import re
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Number of completed reviews kept for filtering, least recently used evicted first
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", 200))
+
+
+def _name_tokens(name: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (name or "").lower())
+
+
+class IndexedResults:
+    """
+    A review's papers with precomputed filter indexes.
+
+    Args:
+        review (dict): Review result with "papers" (included) and optionally "screened" (all screened papers)
+    """
+
+    def __init__(self, review: Dict[str, Any]):
+        self.review = review
+        self.papers: List[Dict[str, Any]] = list(review.get("screened") or review.get("papers") or [])
+        self.all_positions = set(range(len(self.papers)))
+
+        self.by_year: Dict[int, Set[int]] = defaultdict(set)
+        self.by_category: Dict[str, Set[int]] = defaultdict(set)
+        self.by_author_token: Dict[str, Set[int]] = defaultdict(set)
+        self.relevant: Set[int] = set()
+        for position, paper in enumerate(self.papers):
+            if paper.get("year") is not None:
+                self.by_year[int(paper["year"])].add(position)
+            for category in paper.get("categories") or []:
+                self.by_category[category.lower()].add(position)
+            for author in paper.get("authors") or []:
+                for token in _name_tokens(author):
+                    self.by_author_token[token].add(position)
+            if paper.get("relevant", True):
+                self.relevant.add(position)
+        self.years = sorted(self.by_year)
+
+        self.facets = {
+            "years": {year: len(self.by_year[year]) for year in self.years},
+            "categories": {category: len(positions) for category, positions in
+                           sorted(self.by_category.items(), key=lambda item: -len(item[1]))},
+            "relevant": len(self.relevant),
+            "total": len(self.papers)
+        }
+
+    def _year_positions(self, year_from: Optional[int], year_to: Optional[int]) -> Set[int]:
+        start = bisect.bisect_left(self.years, year_from) if year_from is not None else 0
+        end = bisect.bisect_right(self.years, year_to) if year_to is not None else len(self.years)
+        positions = set()
+        for year in self.years[start:end]:
+            positions |= self.by_year[year]
+        return positions
+
+    def _any_of(self, index: Dict[str, Set[int]], keys: Iterable[str]) -> Set[int]:
+        positions = set()
+        for key in keys:
+            positions |= index.get(key.lower(), set())
+        return positions
+
+    def filter(self, year_from: Optional[int] = None, year_to: Optional[int] = None,
+               categories: Optional[List[str]] = None, authors: Optional[List[str]] = None,
+               relevant: Optional[bool] = None, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """
+        Filter and paginate the review's papers.
+
+        Args:
+            year_from (int): Earliest publication year, inclusive
+            year_to (int): Latest publication year, inclusive
+            categories (list): Keep papers in any of these arXiv categories
+            authors (list): Keep papers by any of these authors (every name token must match)
+            relevant (bool): Keep only included (True) or excluded (False) papers
+            page (int): Page number, starting at 1
+            page_size (int): Papers per page
+
+        Returns:
+            dict: Total matches, the requested page of papers in rank order, and facet counts
+        """
+        matches = self.all_positions
+        if year_from is not None or year_to is not None:
+            matches = matches & self._year_positions(year_from, year_to)
+        if categories:
+            matches = matches & self._any_of(self.by_category, categories)
+        if authors:
+            by_author = set()
+            for author in authors:
+                tokens = _name_tokens(author)
+                if tokens:
+                    by_author |= set.intersection(*(self.by_author_token.get(token, set()) for token in tokens))
+            matches = matches & by_author
+        if relevant is not None:
+            matches = matches & self.relevant if relevant else matches - self.relevant
+
+        ordered = sorted(matches)
+        start = (max(page, 1) - 1) * page_size
+        return {
+            "totalResults": len(ordered),
+            "page": max(page, 1),
+            "pageSize": page_size,
+            "results": [self.papers[position] for position in ordered[start:start + page_size]],
+            "facets": self.facets
+        }
+
+
+class ResultStore:
+    """
+    Bounded in-memory store of indexed review results, keyed by result ID.
+    """
+
+    def __init__(self, max_entries: int = RESULT_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, IndexedResults]" = OrderedDict()
+
+    def put(self, result_id: str, review: Dict[str, Any]) -> IndexedResults:
+        """
+        Index a completed review and store it, evicting the least recently used if full.
+        """
+        indexed = IndexedResults(review)
+        with self._lock:
+            self._entries[result_id] = indexed
+            self._entries.move_to_end(result_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return indexed
+
+    def get(self, result_id: str) -> Optional[IndexedResults]:
+        """
+        Get a stored review, or None if it is unknown or was evicted.
+        """
+        with self._lock:
+            indexed = self._entries.get(result_id)
+            if indexed is not None:
+                self._entries.move_to_end(result_id)
+            return indexed
@@ -0,0 +1,133 @@
+"""
+Module for coalescing identical review requests and caching completed reviews.
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Cached reviews expire after this many seconds
+REVIEW_CACHE_TTL = int(os.getenv("REVIEW_CACHE_TTL", 24 * 60 * 60))
+# Eviction bounds for the cache
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", 100))
+REVIEW_CACHE_MAX_BYTES = int(os.getenv("REVIEW_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+
+
+def make_review_key(topic: str, **params) -> str:
+    """
+    Build a cache key from a normalized topic and the review parameters.
+
+    Args:
+        topic (str): Main research topic as submitted by the user
+        **params: Any parameters that change the review output
+
+    Returns:
+        str: Key identifying equivalent review requests
+    """
+    normalized_topic = " ".join(topic.lower().split())
+    return json.dumps({"topic": normalized_topic, "params": params}, sort_keys=True)
+
+
+class ReviewCache:
+    """
+    Single-flight cache for review results.
+
+    Concurrent requests for the same key wait on one in-flight job, and completed
+    results are kept for a TTL with LRU eviction bounded by entry count and size.
+    """
+
+    def __init__(self, ttl: int = REVIEW_CACHE_TTL, max_entries: int = REVIEW_CACHE_MAX_ENTRIES,
+                 max_bytes: int = REVIEW_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (expires_at, size_in_bytes, value), oldest first
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._total_bytes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value if it has not expired.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store a value and evict the least recently used entries over the limits.
+
+        Args:
+            key (str): Cache key
+            value: JSON-serializable value to store
+        """
+        size = len(json.dumps(value, default=str))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (time.time() + self.ttl, size, value)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def get_or_run(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, str]:
+        """
+        Return a cached result, join an identical in-flight job, or run a new one.
+
+        Args:
+            key (str): Cache key, usually from make_review_key
+            fn (Callable): Function producing the result when nothing is available
+
+        Returns:
+            tuple: (result, source) where source is "cache", "coalesced" or "computed"
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "cache"
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result(), "coalesced"
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, result)
+            future.set_result(result)
+            return result, "computed"
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
@@ -0,0 +1,106 @@
+"""
+Module for saving and loading the outputs of a literature review run.
+
+Each topic gets its own directory holding the run state, every screened paper,
+the outline, the generated report and the persisted vector index, so later
+refreshes can build on the previous run instead of starting from scratch.
+"""
+import os
+import re
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from modules.paper import Paper
+
+RUNS_DIR = os.getenv("RUNS_DIR", "runs")
+
+
+def get_run_dir(topic: str, runs_dir: str = RUNS_DIR) -> str:
+    """
+    Get the directory holding the run for a topic.
+
+    Args:
+        topic (str): Main research topic
+        runs_dir (str): Parent directory of all runs
+
+    Returns:
+        str: Path of the topic's run directory
+    """
+    normalized_topic = " ".join(topic.lower().split())
+    slug = re.sub(r"[^a-z0-9]+", "-", normalized_topic).strip("-")[:60]
+    digest = hashlib.sha256(normalized_topic.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(runs_dir, f"{slug}-{digest}")
+
+
+def _write_json(path: str, data: Any) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(temp_path, path)
+
+
+def _read_json(path: str) -> Optional[Any]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_run(run_dir: str, state: Dict[str, Any], papers: List[Paper], outline: Dict[str, Any],
+             report: Dict[str, Any], final_report: str) -> None:
+    """
+    Save the outputs of a run.
+
+    Args:
+        run_dir (str): Directory of the run
+        state (dict): Topic, criteria, query and last-seen submission date
+        papers (List[Paper]): Every paper screened in the run
+        outline (dict): Literature review outline
+        report (dict): Outline with generated section text
+        final_report (str): Compiled Markdown report
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    _write_json(os.path.join(run_dir, "papers.json"), [paper.to_dict() for paper in papers])
+    _write_json(os.path.join(run_dir, "outline.json"), outline)
+    _write_json(os.path.join(run_dir, "report.json"), report)
+    with open(os.path.join(run_dir, "report.md"), "w") as f:
+        f.write(final_report)
+    # Written last so an interrupted save never points past the saved papers
+    _write_json(os.path.join(run_dir, "state.json"), state)
+
+
+def load_run(run_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the outputs of a previous run.
+
+    Args:
+        run_dir (str): Directory of the run
+
+    Returns:
+        dict: state, papers, outline, report and final_report, or None if there is no run
+    """
+    state = _read_json(os.path.join(run_dir, "state.json"))
+    if state is None:
+        return None
+
+    final_report_path = os.path.join(run_dir, "report.md")
+    final_report = None
+    if os.path.exists(final_report_path):
+        with open(final_report_path) as f:
+            final_report = f.read()
+
+    return {
+        "state": state,
+        "papers": [Paper.from_dict(data) for data in _read_json(os.path.join(run_dir, "papers.json")) or []],
+        "outline": _read_json(os.path.join(run_dir, "outline.json")),
+        "report": _read_json(os.path.join(run_dir, "report.json")),
+        "final_report": final_report
+    }
+
+
+def index_dir(run_dir: str) -> str:
+    """
+    Get the directory where the run's vector index is persisted.
+    """
+    return os.path.join(run_dir, "index")
@@ -0,0 +1,156 @@
+"""
+Module for running papers through pipeline stages one at a time instead of in phases.
+
+Each stage has its own worker threads and a bounded input queue, so a paper
+moves to the next stage as soon as it is ready and a slow paper only holds up
+itself. When a stage's queue is full, upstream workers block until it drains.
+"""
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage:
+    """
+    A pipeline stage.
+
+    Args:
+        name (str): Stage name used in logs and timing
+        function (Callable): Takes an item and returns the item to pass on, or None to drop it
+        workers (int): Number of worker threads
+        queue_size (int): Maximum number of items waiting for this stage
+    """
+
+    def __init__(self, name: str, function: Callable[[Any], Any], workers: int = 1, queue_size: int = 8):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class StreamingPipeline:
+    """
+    Runs each item through a chain of stages as soon as the item and a worker are available.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self.finished = {stage.name: threading.Event() for stage in stages}
+        self.busy_seconds = {stage.name: 0.0 for stage in stages}
+        self.processed = {stage.name: 0 for stage in stages}
+        self.results: List[Any] = []
+        self._lock = threading.Lock()
+        self._remaining = [stage.workers for stage in stages]
+        self._threads: List[threading.Thread] = []
+        self._started_at: Optional[float] = None
+
+    def start(self, items: Iterable[Any]) -> None:
+        """
+        Start the stage workers and feed the items into the first stage.
+
+        Args:
+            items (Iterable): Items to process; may be a generator that produces them over time
+        """
+        self._started_at = time.time()
+        for position, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(position,), daemon=True,
+                                          name=f"{stage.name}-worker")
+                thread.start()
+                self._threads.append(thread)
+
+        feeder = threading.Thread(target=self._feed, args=(items,), daemon=True, name="pipeline-source")
+        feeder.start()
+        self._threads.append(feeder)
+
+    def wait_for(self, stage_name: str) -> None:
+        """
+        Block until every item has left the given stage.
+        """
+        self.finished[stage_name].wait()
+
+    def join(self) -> List[Any]:
+        """
+        Wait for all stages to finish.
+
+        Returns:
+            list: Items that came out of the last stage, in completion order
+        """
+        for thread in self._threads:
+            thread.join()
+        self.report()
+        return self.results
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """
+        Process the items through every stage and wait for the results.
+        """
+        self.start(items)
+        return self.join()
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Print and return the number of items and busy time of each stage.
+        """
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        print(f"Pipeline finished in {elapsed:.1f}s")
+        stats = {}
+        for stage in self.stages:
+            stats[stage.name] = {"items": self.processed[stage.name], "busy_seconds": self.busy_seconds[stage.name]}
+            print(f"  {stage.name}: {self.processed[stage.name]} items, "
+                  f"{self.busy_seconds[stage.name]:.1f}s busy across {stage.workers} workers")
+        return stats
+
+    def _feed(self, items: Iterable[Any]) -> None:
+        try:
+            for item in items:
+                self.queues[0].put(item)
+        except Exception as e:
+            print(f"Error producing pipeline items: {e}")
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_DONE)
+
+    def _work(self, position: int) -> None:
+        stage = self.stages[position]
+        inbox = self.queues[position]
+        outbox = self.queues[position + 1] if position + 1 < len(self.stages) else None
+
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+
+            started = time.time()
+            try:
+                result = stage.function(item)
+            except Exception as e:
+                print(f"Error in {stage.name} stage: {e}")
+                result = None
+            with self._lock:
+                self.busy_seconds[stage.name] += time.time() - started
+                self.processed[stage.name] += 1
+
+            if result is None:
+                continue
+            if outbox is not None:
+                # Blocks while the next stage is backed up
+                outbox.put(result)
+            else:
+                with self._lock:
+                    self.results.append(result)
+
+        # The last worker out closes the next stage's input
+        with self._lock:
+            self._remaining[position] -= 1
+            last = self._remaining[position] == 0
+        if last:
+            self.finished[stage.name].set()
+            if outbox is not None:
+                for _ in range(self.stages[position + 1].workers):
+                    outbox.put(_DONE)
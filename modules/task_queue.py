@@ -0,0 +1,504 @@
+"""
+Module for a durable queue of per-paper tasks shared by any number of workers.
+
+Workers lease a task, renew the lease with heartbeats while they work on it,
+and complete it with the updated paper. Completing a task records the paper
+and enqueues its next task in one transaction, and only succeeds while the
+worker still holds the lease, so each result is recorded exactly once even if
+a lease expired and the task was picked up again elsewhere.
+
+The SQLite backend serves worker processes on one host only: it runs in WAL
+mode, which needs shared memory and locking that network filesystems don't
+provide, so the database file must not be shared between hosts. Workers on
+several hosts share a PostgreSQL queue instead, which leases with
+FOR UPDATE SKIP LOCKED and times leases by the database clock. open_task_queue
+picks the backend from a file path or a postgresql:// URL.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from modules.paper import Paper
+
+try:
+    import psycopg
+except ImportError:  # Only needed for a queue shared between hosts
+    psycopg = None
+
+# Path of the SQLite queue, or a postgresql:// URL for a queue shared between hosts
+TASK_QUEUE_DB = os.getenv("TASK_QUEUE_DB", os.path.join(".cache", "task_queue.sqlite"))
+
+# Seconds a lease lasts without a heartbeat, attempts before a task fails, and base retry delay
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", 300))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 3))
+TASK_RETRY_DELAY = int(os.getenv("TASK_RETRY_DELAY", 30))
+
+# Per-paper task kinds, in the order a paper moves through them
+TASK_KINDS = ["download", "upload", "screen", "extract"]
+
+
+@dataclass
+class Task:
+    """
+    A leased task.
+    """
+    id: int
+    run_id: str
+    paper_id: str
+    kind: str
+    attempts: int
+    lease_token: str
+
+
+class TaskQueue:
+    """
+    Interface for durable per-paper task queues.
+    """
+
+    def create_run(self, run_id: str, spec: Dict[str, Any], papers: List[Paper]) -> None:
+        """Record a new run's settings and papers and enqueue the first task of every paper; run IDs are never reused."""
+        raise NotImplementedError
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Return the settings a run was created with."""
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, kinds: Optional[List[str]] = None,
+              lease_seconds: int = TASK_LEASE_SECONDS) -> Optional[Task]:
+        """Lease the next available task, or return None if there is none."""
+        raise NotImplementedError
+
+    def heartbeat(self, task: Task, lease_seconds: int = TASK_LEASE_SECONDS) -> bool:
+        """Extend a lease; returns False if the lease was lost."""
+        raise NotImplementedError
+
+    def complete(self, task: Task, paper: Paper, next_kind: Optional[str] = None) -> bool:
+        """Record the updated paper and enqueue its next task; returns False if the lease was lost."""
+        raise NotImplementedError
+
+    def fail(self, task: Task, error: str) -> None:
+        """Schedule a retry, or mark the task failed after its last attempt."""
+        raise NotImplementedError
+
+    def get_paper(self, run_id: str, paper_id: str) -> Paper:
+        """Return the latest recorded state of a paper."""
+        raise NotImplementedError
+
+    def get_papers(self, run_id: str) -> List[Paper]:
+        """Return every paper of a run in rank order."""
+        raise NotImplementedError
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        """Return the number of tasks of a run by status."""
+        raise NotImplementedError
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS papers (
+    run_id TEXT NOT NULL,
+    paper_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, paper_id)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    paper_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    error TEXT,
+    updated_at REAL,
+    UNIQUE (run_id, paper_id, kind)
+);
+CREATE INDEX IF NOT EXISTS tasks_available ON tasks (status, available_at);
+"""
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    Task queue stored in a SQLite database.
+
+    Args:
+        db_path (str): Path of the queue database
+        max_attempts (int): Attempts before a task is marked failed
+        retry_delay (int): Seconds before the first retry, doubled on each further attempt
+    """
+
+    def __init__(self, db_path: str = TASK_QUEUE_DB, max_attempts: int = TASK_MAX_ATTEMPTS,
+                 retry_delay: int = TASK_RETRY_DELAY):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA busy_timeout = 30000")
+        return connection
+
+    def create_run(self, run_id: str, spec: Dict[str, Any], papers: List[Paper]) -> None:
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("INSERT INTO runs VALUES (?, ?, ?)", (run_id, json.dumps(spec), time.time()))
+            for rank, paper in enumerate(papers):
+                connection.execute(
+                    "INSERT OR IGNORE INTO papers VALUES (?, ?, ?, ?)",
+                    (run_id, paper.id, rank, json.dumps(paper.to_dict()))
+                )
+                connection.execute(
+                    "INSERT OR IGNORE INTO tasks (run_id, paper_id, kind, updated_at) VALUES (?, ?, ?, ?)",
+                    (run_id, paper.id, TASK_KINDS[0], time.time())
+                )
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT spec FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        finally:
+            connection.close()
+        return json.loads(row[0]) if row else None
+
+    def lease(self, worker_id: str, kinds: Optional[List[str]] = None,
+              lease_seconds: int = TASK_LEASE_SECONDS) -> Optional[Task]:
+        kinds = kinds or TASK_KINDS
+        placeholders = ", ".join("?" for _ in kinds)
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            # Expired leases whose worker used the last attempt are not retried
+            connection.execute(
+                "UPDATE tasks SET status = 'failed', error = 'Lease expired', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = connection.execute(
+                f"SELECT id, run_id, paper_id, kind, attempts FROM tasks "
+                f"WHERE kind IN ({placeholders}) AND ((status = 'pending' AND available_at <= ?) "
+                f"OR (status = 'leased' AND lease_expires < ?)) "
+                f"ORDER BY available_at, id LIMIT 1",
+                (*kinds, now, now)
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+
+            token = uuid.uuid4().hex
+            connection.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, lease_owner = ?, lease_token = ?, "
+                "lease_expires = ?, updated_at = ? WHERE id = ?",
+                (worker_id, token, now + lease_seconds, now, row[0])
+            )
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        return Task(id=row[0], run_id=row[1], paper_id=row[2], kind=row[3], attempts=row[4] + 1, lease_token=token)
+
+    def heartbeat(self, task: Task, lease_seconds: int = TASK_LEASE_SECONDS) -> bool:
+        connection = self._connect()
+        try:
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (time.time() + lease_seconds, time.time(), task.id, task.lease_token)
+            )
+            return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def complete(self, task: Task, paper: Paper, next_kind: Optional[str] = None) -> bool:
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            cursor = connection.execute(
+                "UPDATE tasks SET status = 'done', error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (time.time(), task.id, task.lease_token)
+            )
+            if cursor.rowcount != 1:
+                # Another worker took over the task after our lease expired
+                connection.execute("ROLLBACK")
+                return False
+            connection.execute(
+                "UPDATE papers SET data = ? WHERE run_id = ? AND paper_id = ?",
+                (json.dumps(paper.to_dict()), task.run_id, task.paper_id)
+            )
+            if next_kind:
+                connection.execute(
+                    "INSERT OR IGNORE INTO tasks (run_id, paper_id, kind, updated_at) VALUES (?, ?, ?, ?)",
+                    (task.run_id, task.paper_id, next_kind, time.time())
+                )
+            connection.execute("COMMIT")
+            return True
+        finally:
+            connection.close()
+
+    def fail(self, task: Task, error: str) -> None:
+        connection = self._connect()
+        try:
+            if task.attempts >= self.max_attempts:
+                status, available_at = "failed", 0
+            else:
+                status, available_at = "pending", time.time() + self.retry_delay * 2 ** (task.attempts - 1)
+            connection.execute(
+                "UPDATE tasks SET status = ?, available_at = ?, error = ?, lease_token = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (status, available_at, error, time.time(), task.id, task.lease_token)
+            )
+        finally:
+            connection.close()
+
+    def get_paper(self, run_id: str, paper_id: str) -> Paper:
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT data FROM papers WHERE run_id = ? AND paper_id = ?", (run_id, paper_id)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            raise KeyError(f"No paper {paper_id} in run {run_id}")
+        return Paper.from_dict(json.loads(row[0]))
+
+    def get_papers(self, run_id: str) -> List[Paper]:
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT data FROM papers WHERE run_id = ? ORDER BY rank", (run_id,)
+            ).fetchall()
+        finally:
+            connection.close()
+        return [Paper.from_dict(json.loads(row[0])) for row in rows]
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall()
+        finally:
+            connection.close()
+        return dict(rows)
+
+
+POSTGRES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    created_at DOUBLE PRECISION NOT NULL
+);
+CREATE TABLE IF NOT EXISTS papers (
+    run_id TEXT NOT NULL,
+    paper_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, paper_id)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id BIGSERIAL PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    paper_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at DOUBLE PRECISION NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires DOUBLE PRECISION,
+    error TEXT,
+    updated_at DOUBLE PRECISION,
+    UNIQUE (run_id, paper_id, kind)
+);
+CREATE INDEX IF NOT EXISTS tasks_available ON tasks (status, available_at);
+"""
+
+# Advisory lock key serializing schema creation between workers starting together
+POSTGRES_SCHEMA_LOCK = 0x7461736b
+
+
+class PostgresTaskQueue(TaskQueue):
+    """
+    Task queue stored in PostgreSQL, shared by workers on any number of hosts.
+
+    Leases, retry times and expiry are measured with the database clock, so
+    clock skew between hosts doesn't expire leases early.
+
+    Args:
+        dsn (str): PostgreSQL connection URL
+        max_attempts (int): Attempts before a task is marked failed
+        retry_delay (int): Seconds before the first retry, doubled on each further attempt
+    """
+
+    def __init__(self, dsn: str, max_attempts: int = TASK_MAX_ATTEMPTS, retry_delay: int = TASK_RETRY_DELAY):
+        if psycopg is None:
+            raise RuntimeError("A PostgreSQL task queue needs psycopg: pip install psycopg[binary]")
+        self.dsn = dsn
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        with self._connect() as connection:
+            connection.execute("SELECT pg_advisory_xact_lock(%s)", (POSTGRES_SCHEMA_LOCK,))
+            connection.execute(POSTGRES_SCHEMA)
+
+    def _connect(self):
+        # Used as a context manager: one transaction, committed on success and rolled back on error
+        return psycopg.connect(self.dsn)
+
+    @staticmethod
+    def _now(connection) -> float:
+        return connection.execute("SELECT EXTRACT(EPOCH FROM clock_timestamp())::float8").fetchone()[0]
+
+    def create_run(self, run_id: str, spec: Dict[str, Any], papers: List[Paper]) -> None:
+        with self._connect() as connection:
+            now = self._now(connection)
+            connection.execute("INSERT INTO runs VALUES (%s, %s, %s)", (run_id, json.dumps(spec), now))
+            for rank, paper in enumerate(papers):
+                connection.execute(
+                    "INSERT INTO papers VALUES (%s, %s, %s, %s) ON CONFLICT DO NOTHING",
+                    (run_id, paper.id, rank, json.dumps(paper.to_dict()))
+                )
+                connection.execute(
+                    "INSERT INTO tasks (run_id, paper_id, kind, updated_at) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT DO NOTHING",
+                    (run_id, paper.id, TASK_KINDS[0], now)
+                )
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT spec FROM runs WHERE run_id = %s", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lease(self, worker_id: str, kinds: Optional[List[str]] = None,
+              lease_seconds: int = TASK_LEASE_SECONDS) -> Optional[Task]:
+        kinds = kinds or TASK_KINDS
+        token = uuid.uuid4().hex
+        with self._connect() as connection:
+            now = self._now(connection)
+            # Expired leases whose worker used the last attempt are not retried
+            connection.execute(
+                "UPDATE tasks SET status = 'failed', error = 'Lease expired', updated_at = %s "
+                "WHERE status = 'leased' AND lease_expires < %s AND attempts >= %s",
+                (now, now, self.max_attempts)
+            )
+            # Rows locked by another worker's lease are skipped rather than waited for
+            row = connection.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, lease_owner = %s, lease_token = %s, "
+                "lease_expires = %s, updated_at = %s "
+                "WHERE id = (SELECT id FROM tasks "
+                "WHERE kind = ANY(%s) AND ((status = 'pending' AND available_at <= %s) "
+                "OR (status = 'leased' AND lease_expires < %s)) "
+                "ORDER BY available_at, id LIMIT 1 FOR UPDATE SKIP LOCKED) "
+                "RETURNING id, run_id, paper_id, kind, attempts",
+                (worker_id, token, now + lease_seconds, now, list(kinds), now, now)
+            ).fetchone()
+        if row is None:
+            return None
+        return Task(id=row[0], run_id=row[1], paper_id=row[2], kind=row[3], attempts=row[4], lease_token=token)
+
+    def heartbeat(self, task: Task, lease_seconds: int = TASK_LEASE_SECONDS) -> bool:
+        with self._connect() as connection:
+            now = self._now(connection)
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_expires = %s, updated_at = %s "
+                "WHERE id = %s AND status = 'leased' AND lease_token = %s",
+                (now + lease_seconds, now, task.id, task.lease_token)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task: Task, paper: Paper, next_kind: Optional[str] = None) -> bool:
+        with self._connect() as connection:
+            now = self._now(connection)
+            cursor = connection.execute(
+                "UPDATE tasks SET status = 'done', error = NULL, updated_at = %s "
+                "WHERE id = %s AND status = 'leased' AND lease_token = %s",
+                (now, task.id, task.lease_token)
+            )
+            if cursor.rowcount != 1:
+                # Another worker took over the task after our lease expired
+                return False
+            connection.execute(
+                "UPDATE papers SET data = %s WHERE run_id = %s AND paper_id = %s",
+                (json.dumps(paper.to_dict()), task.run_id, task.paper_id)
+            )
+            if next_kind:
+                connection.execute(
+                    "INSERT INTO tasks (run_id, paper_id, kind, updated_at) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT DO NOTHING",
+                    (task.run_id, task.paper_id, next_kind, now)
+                )
+            return True
+
+    def fail(self, task: Task, error: str) -> None:
+        with self._connect() as connection:
+            now = self._now(connection)
+            if task.attempts >= self.max_attempts:
+                status, available_at = "failed", 0
+            else:
+                status, available_at = "pending", now + self.retry_delay * 2 ** (task.attempts - 1)
+            connection.execute(
+                "UPDATE tasks SET status = %s, available_at = %s, error = %s, lease_token = NULL, updated_at = %s "
+                "WHERE id = %s AND status = 'leased' AND lease_token = %s",
+                (status, available_at, error, now, task.id, task.lease_token)
+            )
+
+    def get_paper(self, run_id: str, paper_id: str) -> Paper:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT data FROM papers WHERE run_id = %s AND paper_id = %s", (run_id, paper_id)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"No paper {paper_id} in run {run_id}")
+        return Paper.from_dict(json.loads(row[0]))
+
+    def get_papers(self, run_id: str) -> List[Paper]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT data FROM papers WHERE run_id = %s ORDER BY rank", (run_id,)
+            ).fetchall()
+        return [Paper.from_dict(json.loads(row[0])) for row in rows]
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE run_id = %s GROUP BY status", (run_id,)
+            ).fetchall()
+        return dict(rows)
+
+
+def open_task_queue(location: str = TASK_QUEUE_DB) -> TaskQueue:
+    """
+    Open the task queue at a location.
+
+    Args:
+        location (str): Path of a SQLite queue, or a postgresql:// URL for a queue shared between hosts
+
+    Returns:
+        TaskQueue: The queue
+    """
+    if location.startswith(("postgres://", "postgresql://")):
+        return PostgresTaskQueue(location)
+    return SQLiteTaskQueue(location)
@@ -0,0 +1,154 @@
+"""
+Module for recording a timeline of a review's work as Chrome trace events.
+
+Code wraps units of work such as downloads, uploads, Gemini calls, index
+builds and section writes in span(). While a trace is recorded with
+record_trace(), each span becomes one complete event on its thread's track,
+so concurrent stages show up side by side; otherwise span() only passes its
+arguments through. The written file opens in chrome://tracing or Perfetto.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Events kept per trace; later spans are counted but dropped to bound memory
+TRACE_MAX_EVENTS = int(os.getenv("TRACE_MAX_EVENTS", 200000))
+
+
+class Tracer:
+    """
+    Collects spans from every thread of the process.
+
+    Args:
+        max_events (int): Events kept before further spans are dropped
+    """
+
+    def __init__(self, max_events: int = TRACE_MAX_EVENTS):
+        self.max_events = max_events
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.thread_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, category: str, start: float, end: float, args: Dict[str, Any]) -> None:
+        """
+        Record a finished span; start and end are time.perf_counter() values.
+        """
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.origin) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": self.pid,
+            "tid": thread.ident,
+            "args": args
+        }
+        with self._lock:
+            if len(self.events) >= self.max_events:
+                self.dropped += 1
+                return
+            self.events.append(event)
+            self.thread_names.setdefault(thread.ident, thread.name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the recorded spans in Chrome trace-event format.
+        """
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+            dropped = self.dropped
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "litreview"}}]
+        metadata += [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        return {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"droppedEvents": dropped}
+        }
+
+    def write(self, path: str) -> None:
+        """
+        Write the trace to a JSON file.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, default=str)
+
+
+_tracer: Optional[Tracer] = None
+
+
+@contextmanager
+def record_trace(path: Optional[str]):
+    """
+    Record spans from every thread while the block runs and write them to a file.
+
+    Args:
+        path (str): Trace file to write, or None to record nothing
+    """
+    global _tracer
+    if path is None:
+        yield None
+        return
+    previous = _tracer
+    tracer = _tracer = Tracer()
+    try:
+        yield tracer
+    finally:
+        _tracer = previous
+        tracer.write(path)
+        print(f"Wrote {len(tracer.events)} trace events to {path}")
+
+
+@contextmanager
+def span(name: str, category: str = "", **args):
+    """
+    Time a unit of work as a span of the current trace.
+
+    The yielded dict holds the span's arguments; add to it inside the block to
+    record results such as token counts. Errors raised in the block are
+    recorded on the span and re-raised.
+
+    Args:
+        name (str): Span name, e.g. "download" or "gemini.generate_content"
+        category (str): Span category used to filter the trace viewer
+        **args: JSON-serializable details such as paper_id or model
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+    start = time.perf_counter()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = str(e)
+        raise
+    finally:
+        tracer.add(name, category, start, time.perf_counter(), args)
+
+
+def record_usage(args: Dict[str, Any], response: Any) -> None:
+    """
+    Add a Gemini response's token counts to a span's arguments.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for field, key in (("prompt_token_count", "prompt_tokens"),
+                       ("candidates_token_count", "output_tokens"),
+                       ("cached_content_token_count", "cached_tokens")):
+        value = getattr(usage, field, None)
+        if value is not None:
+            args[key] = value
@@ -0,0 +1,122 @@
+"""
+Module for running literature reviews in long-lived warm worker processes.
+
+Each worker imports the pipeline once, so the Gemini client, LlamaIndex and any
+module-level caches stay warm between jobs. Workers are recycled after a
+configurable number of jobs to bound memory growth.
+"""
+import os
+import time
+import queue
+import multiprocessing
+from typing import Callable, Dict, Any, Optional
+
+# Number of worker processes and jobs each one serves before being replaced
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 2))
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", 20))
+
+_pool = None
+_manager = None
+
+
+def _warm_up():
+    """
+    Initialize a worker process by importing the pipeline and its clients.
+    """
+    import dotenv
+    dotenv.load_dotenv()
+
+    import modules.pipeline  # noqa: F401
+    print(f"Worker {os.getpid()} ready")
+
+
+def _run_job(topic: str, max_papers: int, progress_queue=None) -> Dict[str, Any]:
+    """
+    Run a single literature review inside a worker process, forwarding progress
+    events to the queue if one is given.
+    """
+    from modules.pipeline import run_review
+    from modules.progress import report_progress
+    with report_progress(progress_queue.put if progress_queue is not None else None):
+        return run_review(topic, max_papers=max_papers)
+
+
+def get_pool():
+    """
+    Get the shared worker pool, starting it on first use.
+
+    Returns:
+        multiprocessing.pool.Pool: Pool of warm worker processes
+    """
+    global _pool
+    if _pool is None:
+        # Spawn keeps workers independent of the parent's threads (e.g. Flask)
+        context = multiprocessing.get_context("spawn")
+        _pool = context.Pool(
+            processes=WORKER_PROCESSES,
+            initializer=_warm_up,
+            maxtasksperchild=WORKER_MAX_JOBS
+        )
+    return _pool
+
+
+def get_manager():
+    """
+    Get the shared manager process that carries progress queues between processes.
+    """
+    global _manager
+    if _manager is None:
+        _manager = multiprocessing.get_context("spawn").Manager()
+    return _manager
+
+
+def submit_review(topic: str, max_papers: int = int(os.getenv('MAX_PAPERS', 1)), timeout: Optional[float] = None,
+                  on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run a literature review on a warm worker and wait for the result.
+
+    Args:
+        topic (str): Main research topic
+        max_papers (int): Maximum number of papers to retrieve
+        timeout (float): Seconds to wait for the result, or None to wait indefinitely
+        on_progress (Callable): Called in this process with each progress event of the review
+
+    Returns:
+        dict: Review results as returned by run_review
+    """
+    if on_progress is None:
+        job = get_pool().apply_async(_run_job, (topic, max_papers))
+        return job.get(timeout)
+
+    progress_queue = get_manager().Queue()
+    job = get_pool().apply_async(_run_job, (topic, max_papers, progress_queue))
+
+    def drain(wait):
+        while True:
+            try:
+                on_progress(progress_queue.get(timeout=wait))
+            except queue.Empty:
+                return
+
+    # Relay events while the job runs, then any still queued when it finishes
+    deadline = time.time() + timeout if timeout is not None else None
+    while not job.ready():
+        if deadline is not None and time.time() > deadline:
+            raise multiprocessing.TimeoutError()
+        drain(0.5)
+    drain(0)
+    return job.get(timeout)
+
+
+def shutdown():
+    """
+    Stop the worker pool, letting running jobs finish.
+    """
+    global _pool, _manager
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None